@@ -6,6 +6,7 @@ Email: geyaolin@gmail.com
 Date: 2023-09-02
 """
 from Planner.Myopic2D.Myopic2D import Myopic2D
+from GRF.ScenarioContext import ScenarioContext
 from AUVSimulator.AUVSimulator import AUVSimulator
 from Visualiser.AgentPlotMyopic import AgentPlotMyopic
 from Config import Config
@@ -13,6 +14,7 @@ from usr_func.checkfolder import checkfolder
 from scipy.stats import norm
 from sklearn.metrics import mean_squared_error
 from scipy.stats import wasserstein_distance
+from typing import Callable
 import numpy as np
 import os
 from time import time
@@ -20,9 +22,10 @@ from time import time
 
 class Agent:
     def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1., random_seed: int = 1,
-                 debug=False, name: str = "Equal") -> None:
+                 debug=False, name: str = "Equal", context: 'ScenarioContext' = None) -> None:
         """
         Set up the planning strategies and the AUV simulator for the operation.
+        The planning strategies share the prior of the scenario context if it is given.
         """
         self.__config = Config()
         self.__num_steps = self.__config.get_num_steps()
@@ -34,7 +37,7 @@ class Agent:
         # self.ctd = CTD(loc_start=self.loc_start, random_seed=random_seed, sigma=sigma, nugget=nugget)
 
         # s1: set up planning strategies
-        self.myopic = Myopic2D(weight_eibv=weight_eibv, weight_ivr=weight_ivr)
+        self.myopic = Myopic2D(weight_eibv=weight_eibv, weight_ivr=weight_ivr, context=context)
         self.cv = self.myopic.getCostValley()
         self.grf = self.cv.get_grf_model()
         self.threshold = self.grf.get_threshold()
@@ -45,9 +48,12 @@ class Agent:
         checkfolder(figpath)
         self.ap = AgentPlotMyopic(self, figpath)
 
-    def run(self) -> None:
+    def run(self, record: Callable = None) -> None:
         """
         Run the autonomous operation according to Sense, Plan, Act philosophy.
+        With record, the metrics of every step are passed to record(step, **metrics) with the keys traj, ibv, rmse, vr,
+        mu, sigma, truth and cov, e.g. to append them to a result store, instead of being kept in memory. Only the
+        trajectory and the scalar metrics are kept then.
         """
         # start logging the data.
         self.trajectory = np.empty([0, 2])
@@ -56,13 +62,15 @@ class Agent:
         self.ibv = np.empty([self.__num_steps, ])
         self.rmse = np.empty([self.__num_steps, ])
         self.vr = np.empty([self.__num_steps, ])
-        self.mu_data = np.empty([self.__num_steps, N])
-        if self.__num_steps > 15:
-            self.cov_data = np.empty([self.__num_steps // 15, N, N])
-        else:
-            self.cov_data = np.empty([1, N, N])
-        self.sigma_data = np.empty([self.__num_steps, N])
-        self.mu_truth_data = np.empty([self.__num_steps, N])
+        self.mu_data = self.cov_data = self.sigma_data = self.mu_truth_data = None
+        if record is None:
+            self.mu_data = np.empty([self.__num_steps, N])
+            if self.__num_steps > 15:
+                self.cov_data = np.empty([self.__num_steps // 15, N, N])
+            else:
+                self.cov_data = np.empty([1, N, N])
+            self.sigma_data = np.empty([self.__num_steps, N])
+            self.mu_truth_data = np.empty([self.__num_steps, N])
 
         t0 = time()
         for i in range(self.__num_steps):
@@ -75,11 +83,12 @@ class Agent:
             self.ibv[i] = ibv
             self.rmse[i] = rmse
             self.vr[i] = vr
-            self.mu_data[i, :] = mu.flatten()
-            if i % 15 == 0:
-                self.cov_data[i // 15, :, :] = cov
-            self.sigma_data[i, :] = sigma_diag.flatten()
-            self.mu_truth_data[i, :] = mu_truth.flatten()
+            if record is None:
+                self.mu_data[i, :] = mu.flatten()
+                if i % 15 == 0:
+                    self.cov_data[i // 15, :, :] = cov
+                self.sigma_data[i, :] = sigma_diag.flatten()
+                self.mu_truth_data[i, :] = mu_truth.flatten()
 
             if self.debug:
                 # self.ap.plot_agent()
@@ -88,6 +97,8 @@ class Agent:
             # p1: parallel move AUV to the first location
             wp_next = self.myopic.get_next_waypoint()
             self.trajectory = np.append(self.trajectory, wp_next.reshape(1, -1), axis=0)
+            if record is not None:
+                record(i, traj=wp_next, ibv=ibv, rmse=rmse, vr=vr, mu=mu, sigma=sigma_diag, truth=mu_truth, cov=cov)
 
             # s2: obtain CTD data
             self.auv.move_to_location(wp_next)
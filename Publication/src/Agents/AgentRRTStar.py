@@ -6,12 +6,14 @@ Email: geyaolin@gmail.com
 Date: 2023-08-24
 """
 from Planner.Planner import Planner
+from GRF.ScenarioContext import ScenarioContext
 from Config import Config
 from AUVSimulator.AUVSimulator import AUVSimulator
 from Visualiser.AgentPlotRRTStar import AgentPlotRRTStar
 from usr_func.checkfolder import checkfolder
 from scipy.stats import norm
 from sklearn.metrics import mean_squared_error
+from typing import Callable
 import numpy as np
 import os
 from time import time
@@ -19,9 +21,10 @@ from time import time
 
 class Agent:
     def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1., random_seed: int = 1, debug: bool = False,
-                 name: str = "Equal") -> None:
+                 name: str = "Equal", context: 'ScenarioContext' = None) -> None:
         """
         Set up the planning strategies and the AUV simulator for the operation.
+        The planning strategies share the prior of the scenario context if it is given.
         """
         # s0: load parameters
         self.config = Config()
@@ -37,7 +40,8 @@ class Agent:
         # self.ctd = CTD(loc_start=self.loc_start, random_seed=random_seed, sigma=sigma, nugget=nugget)
 
         # s3: set up planning strategies
-        self.planner = Planner(weight_eibv=weight_eibv, weight_ivr=weight_ivr)
+        self.planner = Planner(weight_eibv=weight_eibv, weight_ivr=weight_ivr, context=context,
+                               random_seed=random_seed)
         self.rrtstarcv = self.planner.get_rrtstarcv()
         self.cv = self.rrtstarcv.get_CostValley()
         self.grf = self.cv.get_grf_model()
@@ -50,9 +54,12 @@ class Agent:
         checkfolder(figpath)
         self.ap = AgentPlotRRTStar(self, figpath)
 
-    def run(self) -> None:
+    def run(self, record: Callable = None) -> None:
         """
         Run the autonomous operation according to Sense, Plan, Act philosophy.
+        With record, the metrics of every step are passed to record(step, **metrics) with the keys traj, ibv, rmse, vr,
+        mu, sigma, truth and cov, e.g. to append them to a result store, instead of being kept in memory. Only the
+        trajectory and the scalar metrics are kept then.
         """
         # start logging the data.
         self.trajectory = np.empty([0, 2])
@@ -61,13 +68,15 @@ class Agent:
         self.ibv = np.empty([self.num_steps, ])
         self.rmse = np.empty([self.num_steps, ])
         self.vr = np.empty([self.num_steps, ])
-        self.mu_data = np.empty([self.num_steps, N])
-        if self.num_steps > 15:
-            self.cov_data = np.empty([self.num_steps // 15, N, N])
-        else:
-            self.cov_data = np.empty([1, N, N])
-        self.sigma_data = np.empty([self.num_steps, N])
-        self.mu_truth_data = np.empty([self.num_steps, N])
+        self.mu_data = self.cov_data = self.sigma_data = self.mu_truth_data = None
+        if record is None:
+            self.mu_data = np.empty([self.num_steps, N])
+            if self.num_steps > 15:
+                self.cov_data = np.empty([self.num_steps // 15, N, N])
+            else:
+                self.cov_data = np.empty([1, N, N])
+            self.sigma_data = np.empty([self.num_steps, N])
+            self.mu_truth_data = np.empty([self.num_steps, N])
 
         t0 = time()
         for i in range(self.num_steps):
@@ -80,11 +89,12 @@ class Agent:
             self.ibv[i] = ibv
             self.rmse[i] = rmse
             self.vr[i] = vr
-            self.mu_data[i, :] = mu.flatten()
-            if i % 15 == 0:
-                self.cov_data[i // 15, :, :] = cov
-            self.sigma_data[i, :] = sigma_diag.flatten()
-            self.mu_truth_data[i, :] = mu_truth.flatten()
+            if record is None:
+                self.mu_data[i, :] = mu.flatten()
+                if i % 15 == 0:
+                    self.cov_data[i // 15, :, :] = cov
+                self.sigma_data[i, :] = sigma_diag.flatten()
+                self.mu_truth_data[i, :] = mu_truth.flatten()
 
             if self.debug:
                 # self.ap.plot_agent()
@@ -93,6 +103,8 @@ class Agent:
             # s0, get the current waypoint
             wp_now = self.planner.get_current_waypoint()
             self.trajectory = np.append(self.trajectory, wp_now.reshape(1, -1), axis=0)
+            if record is not None:
+                record(i, traj=wp_now, ibv=ibv, rmse=rmse, vr=vr, mu=mu, sigma=sigma_diag, truth=mu_truth, cov=cov)
 
             # s1: update the waypoint trackers
             self.planner.update_planning_trackers()
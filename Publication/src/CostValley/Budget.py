@@ -18,7 +18,7 @@ This module has two main functions:
 from Config import Config
 import numpy as np
 from matplotlib.patches import Ellipse
-from shapely.geometry import Polygon, LineString, Point
+from shapely.geometry import Polygon, LineString
 import math
 
 
@@ -61,23 +61,11 @@ class Budget:
                        (self.__y_now - self.__y_prev)**2)
         self.__budget -= dist
         self.__update_budget_ellipse()
-        self.__budget_field = np.zeros_like(self.__grid[:, 0])
 
-        xg = self.__grid[:, 0] - self.__ellipse_middle_x
-        yg = self.__grid[:, 1] - self.__ellipse_middle_y
-        xr = xg * np.cos(self.__ellipse_angle) - yg * np.sin(self.__ellipse_angle)
-        yr = xg * np.sin(self.__ellipse_angle) + yg * np.cos(self.__ellipse_angle)
-        if not self.__go_home:
-            u = (xr / self.__ellipse_b) ** 2 + (yr / self.__ellipse_a) ** 2
-        else:
-            u = np.ones_like(xr) * np.inf
-
-        for i in range(self.__grid.shape[0]):
-            point = Point(self.__grid[i, 0], self.__grid[i, 1])
-            if self.__polygon_ellipse.contains(point):
-                self.__budget_field[i] = 0
-            else:
-                self.__budget_field[i] = u[i] ** 2
+        # inside the ellipse is u <= 1, so no polygon test is needed, the polygon is only kept for plotting.
+        u = self.get_ellipse_u(self.__grid)
+        penalty = np.ones_like(u) * np.inf if self.__go_home else u ** 2
+        self.__budget_field = np.where(u <= 1, 0, penalty)
 
         if np.amax(self.__budget_field) > 1:  # update border warning so to generate trees within ellipse.
             self.__border_warning = True
@@ -86,6 +74,21 @@ class Budget:
         self.__y_prev = self.__y_now
         return self.__budget_field
 
+    def get_ellipse_u(self, locs: np.ndarray) -> np.ndarray:
+        """
+        Return the normalised ellipse coordinate u = (xr / b) ** 2 + (yr / a) ** 2 for each location, where (xr, yr)
+        is the location in the rotated ellipse frame. u <= 1 is inside the budget ellipse. A collapsed ellipse
+        (b = 0) contains no location.
+        """
+        locs = np.asarray(locs).reshape(-1, 2)
+        xg = locs[:, 0] - self.__ellipse_middle_x
+        yg = locs[:, 1] - self.__ellipse_middle_y
+        xr = xg * np.cos(self.__ellipse_angle) - yg * np.sin(self.__ellipse_angle)
+        yr = xg * np.sin(self.__ellipse_angle) + yg * np.cos(self.__ellipse_angle)
+        if self.__ellipse_b <= 0:
+            return np.ones_like(xr) * np.inf
+        return (xr / self.__ellipse_b) ** 2 + (yr / self.__ellipse_a) ** 2
+
     def __update_budget_ellipse(self):
         self.__ellipse_middle_x = (self.__x_now + self.__goal[0]) / 2
         self.__ellipse_middle_y = (self.__y_now + self.__goal[1]) / 2
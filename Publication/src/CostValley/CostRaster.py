@@ -0,0 +1,180 @@
+"""
+CostRaster resamples the cost field onto a regular raster so it can be interpolated and integrated along paths in
+array operations.
+
+The cost field lives on the staggered hexagonal grid of the GRF field, where each lookup used to be a nearest-node
+KD-tree query. Since the grid never changes, the resampling is linear in the cost values:
+- raster cells inside the grid hull take the barycentric interpolation over their Delaunay triangle.
+- raster cells outside the hull take the value of their nearest grid node.
+The weights are assembled once into a sparse (raster cells x grid nodes) matrix, so refreshing the raster after the
+cost valley updates is a single sparse product. Values in between the raster cells are interpolated bilinearly.
+
+Path costs are integrated with the trapezoid rule over n_samples equally spaced points on each segment, all the
+segments in one batch. RRT* batches are only a handful of edges, where the overhead of the numpy calls is several times
+the arithmetic, so the integral is compiled with numba if it is installed, and falls back to map_coordinates otherwise.
+
+The raster can be moved into shared memory with share, so planners in processes forked afterwards read every update
+in place instead of receiving a copy. Only the owning process writes to it.
+"""
+from scipy.spatial import Delaunay, cKDTree
+from scipy.ndimage import map_coordinates
+from scipy.sparse import csr_matrix
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+class CostRaster:
+    """
+    Regular raster of the cost field with bilinear interpolation.
+    """
+    __MAX_VALUE = np.finfo(np.float64).max / 1e6  # inf costs are capped, so zero interpolation weights never give nan.
+
+    def __init__(self, grid: np.ndarray, resolution: float = 25.) -> None:
+        self.__grid = np.asarray(grid, dtype=np.float64)
+        self.__resolution = float(resolution)
+        xmin, ymin = np.amin(self.__grid, axis=0) - self.__resolution
+        xmax, ymax = np.amax(self.__grid, axis=0) + self.__resolution
+        self.__gx = np.arange(xmin, xmax + self.__resolution, self.__resolution)
+        self.__gy = np.arange(ymin, ymax + self.__resolution, self.__resolution)
+        self.__nx, self.__ny = len(self.__gx), len(self.__gy)
+        self.__origin = np.array([self.__gx[0], self.__gy[0]])
+        self.__weights = self.__get_interpolation_weights()
+        self.__raster = np.zeros([self.__nx, self.__ny])
+        self.__shared_memory = None
+        self.__trapezoid = dict()  # n_samples -> (sample positions, trapezoid weights)
+
+    def __get_interpolation_weights(self) -> 'csr_matrix':
+        """ Assemble the sparse matrix mapping the values on the grid nodes to the raster cells. """
+        xx, yy = np.meshgrid(self.__gx, self.__gy, indexing="ij")
+        cells = np.stack((xx.flatten(), yy.flatten()), axis=1)
+        n = len(cells)
+
+        # s1: barycentric coordinates of the cells inside the hull.
+        delaunay = Delaunay(self.__grid)
+        simplex = delaunay.find_simplex(cells)
+        inside = simplex >= 0
+        transform = delaunay.transform[simplex[inside]]
+        b = np.einsum("ijk,ik->ij", transform[:, :2, :], cells[inside] - transform[:, 2, :])
+        barycentric = np.hstack((b, 1 - np.sum(b, axis=1, keepdims=True)))
+        rows = np.repeat(np.where(inside)[0], 3)
+        cols = delaunay.simplices[simplex[inside]].flatten()
+        values = barycentric.flatten()
+
+        # s2: nearest node for the cells outside the hull.
+        outside = np.where(~inside)[0]
+        *_, ind_nearest = cKDTree(self.__grid).query(cells[outside])
+        rows = np.append(rows, outside)
+        cols = np.append(cols, ind_nearest)
+        values = np.append(values, np.ones(len(outside)))
+        return csr_matrix((values, (rows, cols)), shape=(n, len(self.__grid)))
+
+    def set_values(self, values: np.ndarray) -> None:
+        """ Resample the values on the grid nodes onto the raster. """
+        values = np.minimum(np.asarray(values, dtype=np.float64).flatten(), self.__MAX_VALUE)
+        self.__raster[:] = (self.__weights @ values).reshape(self.__nx, self.__ny)
+
+    def get_values(self, locs: np.ndarray) -> np.ndarray:
+        """ Return the bilinearly interpolated values at locations, locs: (..., 2) array. """
+        locs = np.asarray(locs, dtype=np.float64)
+        pixels = (locs.reshape(-1, 2) - self.__origin) / self.__resolution
+        return self.__interpolate(pixels).reshape(locs.shape[:-1])
+
+    def __interpolate(self, pixels: np.ndarray) -> np.ndarray:
+        """ Bilinear interpolation at the (M, 2) raster coordinates, clamped to the raster. """
+        return map_coordinates(self.__raster, pixels.T, order=1, mode="nearest")
+
+    def get_cost_along_paths(self, starts: np.ndarray, ends: np.ndarray, n_samples: int = 5) -> np.ndarray:
+        """
+        Integrate the raster along the segments from starts to ends with the trapezoid rule.
+
+        Args:
+            starts: (N, 2) segment start locations.
+            ends: (N, 2) segment end locations, or a single end location shared by all the segments.
+            n_samples: number of equally spaced samples on each segment, both ends included, at least 2.
+
+        Returns:
+            cost: (N, ) integrated cost of each segment.
+        """
+        # s1: segments in raster coordinates, so the samples are the lookup coordinates.
+        starts = (np.asarray(starts, dtype=np.float64).reshape(-1, 2) - self.__origin) / self.__resolution
+        steps = (np.asarray(ends, dtype=np.float64).reshape(-1, 2) - self.__origin) / self.__resolution - starts
+        t, w = self.__get_trapezoid(n_samples)
+        if _integrate_fast is not None:
+            return _integrate_fast(self.__raster, starts, steps, t.ravel(), w) * self.__resolution
+
+        # s2: mean value over the samples times the segment length.
+        pixels = starts[:, np.newaxis, :] + t * steps[:, np.newaxis, :]
+        values = self.__interpolate(pixels.reshape(-1, 2)).reshape(len(pixels), -1)
+        return (values @ w) * np.sqrt(np.einsum("ij,ij->i", steps, steps)) * self.__resolution
+
+    def __get_trapezoid(self, n_samples: int) -> tuple:
+        """ Return the sample positions along a unit segment and the trapezoid weights giving the mean value. """
+        n_samples = max(int(n_samples), 2)
+        if n_samples not in self.__trapezoid:
+            w = np.full(n_samples, 1. / (n_samples - 1))
+            w[[0, -1]] /= 2
+            self.__trapezoid[n_samples] = (np.linspace(0, 1, n_samples).reshape(-1, 1), w)
+        return self.__trapezoid[n_samples]
+
+    def share(self) -> None:
+        """ Move the raster into shared memory, processes forked from now on see its updates. """
+        if self.__shared_memory is not None:
+            return
+        self.__shared_memory = SharedMemory(create=True, size=self.__raster.nbytes)
+        raster = np.ndarray(self.__raster.shape, dtype=np.float64, buffer=self.__shared_memory.buf)
+        raster[:] = self.__raster
+        self.__raster = raster
+
+    def release(self) -> None:
+        """ Move the raster back into private memory and free the shared memory. """
+        if self.__shared_memory is None:
+            return
+        self.__raster = self.__raster.copy()
+        self.__shared_memory.close()
+        self.__shared_memory.unlink()
+        self.__shared_memory = None
+
+    def is_shared(self) -> bool:
+        """ Return True if the raster is in shared memory. """
+        return self.__shared_memory is not None
+
+    def get_raster(self) -> np.ndarray:
+        """ Return the raster, (nx, ny) array over the axes from get_axes. """
+        return self.__raster
+
+    def get_axes(self) -> tuple:
+        """ Return the x and y coordinates of the raster cells. """
+        return self.__gx, self.__gy
+
+    def get_resolution(self) -> float:
+        """ Return the raster resolution. """
+        return self.__resolution
+
+
+def _integrate(raster: np.ndarray, starts: np.ndarray, steps: np.ndarray, t: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """
+    Integrate the raster bilinearly along the segments starts + t * steps in raster coordinates, clamped to the
+    raster like map_coordinates with mode nearest. Returns the weighted sum over the samples times the segment length.
+    """
+    nx, ny = raster.shape
+    cost = np.empty(len(starts))
+    for i in range(len(starts)):
+        total = 0.
+        for j in range(len(t)):
+            x = min(max(starts[i, 0] + t[j] * steps[i, 0], 0.), nx - 1.)
+            y = min(max(starts[i, 1] + t[j] * steps[i, 1], 0.), ny - 1.)
+            ix = min(int(x), nx - 2)
+            iy = min(int(y), ny - 2)
+            fx = x - ix
+            fy = y - iy
+            total += w[j] * ((raster[ix, iy] * (1 - fx) + raster[ix + 1, iy] * fx) * (1 - fy) +
+                             (raster[ix, iy + 1] * (1 - fx) + raster[ix + 1, iy + 1] * fx) * fy)
+        cost[i] = total * np.sqrt(steps[i, 0] ** 2 + steps[i, 1] ** 2)
+    return cost
+
+
+_integrate_fast = njit(cache=True)(_integrate) if njit is not None else None
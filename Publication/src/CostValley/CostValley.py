@@ -18,7 +18,9 @@ Email: geyaolin@gmail.com
 Date: 2023-08-24
 """
 from CostValley.Budget import Budget
+from CostValley.CostRaster import CostRaster
 from GRF.GRF import GRF
+from GRF.ScenarioContext import ScenarioContext
 from Config import Config
 import numpy as np
 import time
@@ -26,17 +28,21 @@ import time
 
 class CostValley:
     """ Cost fields construction. """
-    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1.) -> None:
+    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1., context: 'ScenarioContext' = None) -> None:
+        """ The GRF kernel is built on the scenario context if it is given, see ScenarioContext. """
         self.__config = Config()
 
         """ Budget mode """
         self.__budget_mode = self.__config.get_budget_mode()
 
         """ GRF """
-        self.__grf = GRF()
+        self.__grf = GRF(context=context)
         self.__field = self.__grf.field
         self.__grid = self.__field.get_grid()
 
+        """ Version, increased on every update so a planner improving in the background can tell it is stale """
+        self.__version = 0
+
         """ Weights """
         self.__weight_eibv = weight_eibv
         self.__weight_ivr = weight_ivr
@@ -55,6 +61,10 @@ class CostValley:
         else:
             self.__cost_field = (self.__eibv_field * self.__weight_eibv + self.__ivr_field * self.__weight_ivr)
 
+        """ Interpolated cost raster for path integrals """
+        self.__cost_raster = CostRaster(self.__grid, resolution=self.__field.get_neighbour_distance() / 4)
+        self.__cost_raster.set_values(self.__cost_field)
+
     def update_cost_valley(self, loc_now: np.ndarray = np.array([0, 0])) -> None:
         # t1 = time.time()
         self.__eibv_field, self.__ivr_field = self.__grf.get_ei_field()
@@ -65,9 +75,15 @@ class CostValley:
                                  self.__budget_field)
         else:
             self.__cost_field = (self.__eibv_field * self.__weight_eibv + self.__ivr_field * self.__weight_ivr)
+        self.__cost_raster.set_values(self.__cost_field)
+        self.__version += 1
         # t2 = time.time()
         # print("Update cost valley takes: ", t2 - t1)
 
+    def get_version(self) -> int:
+        """ Return the number of updates of the cost valley so far. """
+        return self.__version
+
     def get_cost_field(self) -> np.ndarray:
         return self.__cost_field
 
@@ -94,6 +110,11 @@ class CostValley:
         ind = self.__field.get_ind_from_location(loc)
         return self.__cost_field[ind]
 
+    def get_cost_at_locations(self, locs: np.ndarray) -> np.ndarray:
+        """ Return costs associated with a batch of locations, locs: (N, 2) array, in one nearest node query. """
+        ind = self.__field.get_ind_from_location(np.asarray(locs).reshape(-1, 2))
+        return self.__cost_field[ind]
+
     def get_cost_along_path(self, loc_start: np.ndarray, loc_end: np.ndarray) -> float:
         """ Return cost associated with a path. """
         dx = loc_start[0] - loc_end[0]
@@ -104,11 +125,32 @@ class CostValley:
         ct = ((c1 + c2) / 2 * dist)
         return ct
 
+    def get_cost_along_paths(self, starts: np.ndarray, ends: np.ndarray, n_samples: int = 5) -> np.ndarray:
+        """
+        Return costs associated with a batch of paths, integrated over the interpolated cost raster.
+        Args:
+            starts: (N, 2) path start locations.
+            ends: (N, 2) path end locations, or a single end location shared by all the paths.
+            n_samples: number of samples along each path, both ends included.
+        """
+        return self.__cost_raster.get_cost_along_paths(starts, ends, n_samples)
+
+    def get_cost_raster(self) -> 'CostRaster':
+        return self.__cost_raster
+
     def get_minimum_cost_location(self) -> np.ndarray:
         """ Return minimum cost location. """
         ind = np.argmin(self.__cost_field)
         return self.__grid[ind]
 
+    def set_incremental(self, value: bool, tolerance: float = None) -> None:
+        """ Update the EIBV field incrementally, only for the candidates affected by the assimilated data. """
+        self.__grf.set_incremental_ei(value, tolerance)
+
+    def get_recomputed_fraction(self) -> float:
+        """ Return the fraction of the EIBV field recomputed in the last update. """
+        return self.__grf.get_recomputed_fraction()
+
     def set_weight_eibv(self, value: float) -> None:
         """ Set weight for EIBV field. """
         self.__weight_eibv = value
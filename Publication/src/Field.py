@@ -9,9 +9,10 @@ Email: geyaolin@gmail.com
 Date: 2023-08-22
 """
 from Config import Config
+from LegalityMap import LegalityMap
 import numpy as np
-from shapely.geometry import Point, LineString
-from scipy.spatial.distance import cdist
+from shapely.geometry import LineString
+from scipy.spatial import cKDTree
 from math import cos, sin, radians
 from typing import Union
 from pykdtree.kdtree import KDTree
@@ -21,6 +22,9 @@ class Field:
     """
     Field handles everything with regarding to the field element.
     """
+    __grid_cache = dict()  # (polygon_border, polygon_obstacle, neighbour_distance) -> grid
+    __neighbour_cache = dict()  # (polygon_border, polygon_obstacle, neighbour_distance) -> (indptr, indices)
+
     def __init__(self, neighbour_distance: float = 120):
         # config element
         self.__config = Config()
@@ -35,7 +39,10 @@ class Field:
         self.__polygon_obstacle = self.__config.get_polygon_obstacle()
         self.__polygon_obstacle_shapely = self.__config.get_polygon_obstacle_shapely()
         self.__line_obstacle_shapely = LineString(self.__polygon_obstacle)
-        
+
+        # legality element, rasterized border and obstacle shared by all fields in the process.
+        self.__legality_map = LegalityMap(self.__polygon_border, self.__polygon_obstacle)
+
         """ Get the xy limits and gaps for the bigger box """
         xb = self.__polygon_border[:, 0]
         yb = self.__polygon_border[:, 1]
@@ -51,11 +58,9 @@ class Field:
         self.__construct_grid()
         self.__grid_tree = KDTree(self.__grid)
 
-        # neighbour element
-        self.__neighbour_hash_table = dict()
-
-        # neighbour element
-        self.__neighbour_hash_table = dict()
+        # neighbour element, CSR table: neighbours of node i are indices[indptr[i]:indptr[i + 1]].
+        self.__neighbour_indptr = np.zeros(1, dtype=int)
+        self.__neighbour_indices = np.empty(0, dtype=int)
         self.__construct_hash_neighbours()
 
     def set_neighbour_distance(self, value: float) -> None:
@@ -64,29 +69,35 @@ class Field:
 
     def border_contains(self, loc: np.ndarray) -> bool:
         """ Test if point is within the border polygon """
-        x, y = loc
-        point = Point(x, y)
-        return self.__polygon_border_shapely.contains(point)
+        return self.__legality_map.border_contains(loc)
 
     def obstacle_contains(self, loc: np.ndarray) -> bool:
         """ Test if obstacle contains the point. """
-        x, y = loc
-        point = Point(x, y)
-        return self.__polygon_obstacle_shapely.contains(point)
+        return self.__legality_map.obstacle_contains(loc)
 
     def is_border_in_the_way(self, loc_start: np.ndarray, loc_end: np.ndarray) -> bool:
         """ Check if border is in the way between loc_start and loc_end. """
-        xs, ys = loc_start
-        xe, ye = loc_end
-        line = LineString([(xs, ys), (xe, ye)])
-        return self.__line_border_shapely.intersects(line)
+        return self.__legality_map.is_border_in_the_way(loc_start, loc_end)
 
     def is_obstacle_in_the_way(self, loc_start: np.ndarray, loc_end: np.ndarray) -> bool:
         """ Check if border is in the way between loc_start and loc_end. """
-        xs, ys = loc_start
-        xe, ye = loc_end
-        line = LineString([(xs, ys), (xe, ye)])
-        return self.__line_obstacle_shapely.intersects(line)
+        return self.__legality_map.is_obstacle_in_the_way(loc_start, loc_end)
+
+    def border_contains_many(self, points: np.ndarray) -> np.ndarray:
+        """ Test if each point is within the border polygon, points: (N, 2) array. """
+        return self.__legality_map.border_contains_many(points)
+
+    def obstacle_contains_many(self, points: np.ndarray) -> np.ndarray:
+        """ Test if obstacle contains each point, points: (N, 2) array. """
+        return self.__legality_map.obstacle_contains_many(points)
+
+    def contains_many(self, points: np.ndarray) -> np.ndarray:
+        """ Test if each point is within the border and outside the obstacle, points: (N, 2) array. """
+        return self.__legality_map.is_location_legal_many(points)
+
+    def segments_intersect_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Check if border or obstacle is in the way of each segment, starts, ends: (N, 2) arrays. """
+        return ~self.__legality_map.is_path_legal_many(starts, ends)
 
     def __construct_grid(self) -> None:
         """ Construct the field grid based on the instruction given above.
@@ -100,48 +111,67 @@ class Field:
         .  .  .  .
         - Then remove illegal locations.
         - Then add the depth layers.
+        The lattice is generated with array arithmetic and filtered in one batch, and the resulting grid is cached per
+        (polygons, neighbour_distance) so the same field is only constructed once in each process.
         """
-        gx = np.arange(self.__xmin, self.__xmax, self.__xgap)  # get [0, x_gap, 2*x_gap, ..., (n-1)*x_gap]
-        gy = np.arange(self.__ymin, self.__ymax, self.__ygap)
-        grid2d = []
-        counter_grid2d = 0
-        for i in range(len(gx)):
-            for j in range(len(gy)):
-                if i % 2 == 0:
-                    y = gy[j] + self.__ygap / 2
-                    x = gx[i]
-                else:
-                    y = gy[j]
-                    x = gx[i]
-                loc = np.array([x, y])
-                if self.border_contains(loc) and not self.obstacle_contains(loc):
-                    grid2d.append([x, y])
-                    counter_grid2d += 1
-        self.__grid = np.array(grid2d)
+        key = (self.__polygon_border.tobytes(), self.__polygon_obstacle.tobytes(), float(self.__neighbour_distance))
+        if key not in Field.__grid_cache:
+            gx = np.arange(self.__xmin, self.__xmax, self.__xgap)  # get [0, x_gap, 2*x_gap, ..., (n-1)*x_gap]
+            gy = np.arange(self.__ymin, self.__ymax, self.__ygap)
+            xx, yy = np.meshgrid(gx, gy, indexing="ij")  # same order as looping over gx and then gy.
+            yy[::2, :] += self.__ygap / 2  # move the even rows.
+            grid2d = np.stack((xx.ravel(), yy.ravel()), axis=1)
+            Field.__grid_cache[key] = grid2d[self.contains_many(grid2d)]
+        self.__grid = np.array(Field.__grid_cache[key])
         
     def __construct_hash_neighbours(self) -> None:
         """ Construct the hash table for containing neighbour indices around each waypoint.
         - Directly use the neighbouring radius to determine the neighbouring indices.
+        - All the pairs within the neighbouring radius come from one sparse distance pass over a KD-tree, and the
+        table is stored as CSR arrays (indptr, indices) with the indices of each node in ascending order.
         """
-        no_grid = self.__grid.shape[0]
-        ERROR_BUFFER = .01 * self.__neighbour_distance
-        for i in range(no_grid):
-            xy_c = self.__grid[i].reshape(1, -1)
-            dist = cdist(self.__grid, xy_c)
-            ind_n = np.where((dist <= self.__neighbour_distance + ERROR_BUFFER) *
-                             (dist >= self.__neighbour_distance - ERROR_BUFFER))[0]
-            self.__neighbour_hash_table[i] = ind_n
+        key = (self.__polygon_border.tobytes(), self.__polygon_obstacle.tobytes(), float(self.__neighbour_distance))
+        if key not in Field.__neighbour_cache:
+            ERROR_BUFFER = .01 * self.__neighbour_distance
+            tree = cKDTree(self.__grid)
+            dist = tree.sparse_distance_matrix(tree, self.__neighbour_distance + ERROR_BUFFER,
+                                               output_type="coo_matrix").tocsr()
+            dist.data[dist.data < self.__neighbour_distance - ERROR_BUFFER] = 0
+            dist.eliminate_zeros()
+            dist.sort_indices()
+            indptr = dist.indptr.astype(int)
+            indices = dist.indices.astype(int)
+            indptr.setflags(write=False)
+            indices.setflags(write=False)
+            Field.__neighbour_cache[key] = (indptr, indices)
+        self.__neighbour_indptr, self.__neighbour_indices = Field.__neighbour_cache[key]
 
     def get_neighbour_indices(self, ind_now: Union[int, np.ndarray]) -> np.ndarray:
         """ Return neighbouring indices according to given current index. """
-        if type(ind_now) == np.int64:
-            return self.__neighbour_hash_table[ind_now]
+        if isinstance(ind_now, (int, np.integer)):
+            return self.__neighbour_indices[self.__neighbour_indptr[ind_now]:self.__neighbour_indptr[ind_now + 1]]
         else:
-            neighbours = np.empty([0])
-            for i in range(len(ind_now)):
-                idnn = self.__neighbour_hash_table[ind_now[i]]
-                neighbours = np.append(neighbours, idnn)
-            return np.unique(neighbours.astype(int))
+            ind_now = np.asarray(ind_now, dtype=int).ravel()
+            starts = self.__neighbour_indptr[ind_now]
+            counts = self.__neighbour_indptr[ind_now + 1] - starts
+            # positions of all the neighbours in the indices array, gathered without a python loop.
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            return np.unique(self.__neighbour_indices[offsets + np.arange(np.sum(counts))])
+
+    def get_neighbour_edges(self, ind_now: np.ndarray) -> tuple:
+        """
+        Return all the edges from the nodes ind_now to their neighbours, without merging shared neighbours.
+
+        Returns:
+            pos: positions in ind_now where each edge starts.
+            ind_neighbours: neighbour index where each edge ends.
+        """
+        ind_now = np.asarray(ind_now, dtype=int).ravel()
+        starts = self.__neighbour_indptr[ind_now]
+        counts = self.__neighbour_indptr[ind_now + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        pos = np.repeat(np.arange(len(ind_now)), counts)
+        return pos, self.__neighbour_indices[offsets + np.arange(np.sum(counts))]
 
     def get_grid(self) -> np.ndarray:
         """
@@ -0,0 +1,193 @@
+"""
+EIField computes the expected information fields (EIBV and IVR) for all the candidate locations in one batch.
+
+For a candidate location i, assimilating one noisy measurement reduces the variance at node j by
+    vr[j, i] = Sigma[j, i] ** 2 / (Sigma[i, i] + nugget),
+so the posterior variance diagonal is sigma_diag[j, i] = Sigma[j, j] - vr[j, i]. Column i of both matrices
+therefore holds exactly what the per-node loop used to extract from the full N x N outer product, and all
+candidates can be evaluated with array operations instead.
+
+Incremental mode:
+The EIBV of candidate i is a sum of per-node terms t[j, i], which only differ from the no-sampling term g[j] where
+vr[j, i] is non-negligible, i.e. within a few lateral ranges of node i. It is split into
+    eibv[i] = sum_j g[j] + sum_j (t[j, i] - g[j]),
+where the first sum is cheap and recomputed every time, and the second one, the correction, is cached per candidate.
+Between two updates, the correction of candidate i is only recomputed if its covariance column changed beyond the
+tolerance, or if the mean or the variance changed at a node it reaches with vr[j, i] above the tolerance. The
+snapshots are only moved for the changed nodes, so small changes accumulate until they are caught.
+"""
+from GRF.CDFTable import CDFTable
+from usr_func.calculate_analytical_ebv import calculate_analytical_ebv
+from scipy.stats import norm
+import numpy as np
+
+
+class EIField:
+    """
+    Batched EIBV/IVR engine.
+    """
+    def __init__(self, threshold: float, nugget: float, approximate_eibv: bool = False,
+                 fast_eibv: bool = True) -> None:
+        self.__threshold = threshold
+        self.__nugget = nugget
+        self.__approximate_eibv = approximate_eibv
+        self.__fast_eibv = fast_eibv
+        self.__cdf_table = None
+
+        # incremental mode
+        self.__incremental = False
+        self.__tolerance = 1e-5
+        self.__Sigma_last = None
+        self.__mu_last = None
+        self.__eibv_correction = None
+        self.__recomputed_fraction = 1.
+
+    def set_cdf_table(self, cdf_table: 'CDFTable') -> None:
+        """ Set the tabulated bivariate cdf used by the fast analytical EIBV. """
+        self.__cdf_table = cdf_table
+        self.reset()
+
+    def get_variance_reduction(self, Sigma: np.ndarray) -> np.ndarray:
+        """
+        Return the variance reduction diagonals for all candidates.
+
+        Returns:
+            vr: (N, N) array, column i is the variance reduction diagonal when sampling node i.
+        """
+        return Sigma ** 2 / (np.diag(Sigma) + self.__nugget)
+
+    def get_ei_field(self, mu: np.ndarray, Sigma: np.ndarray) -> tuple:
+        """
+        Compute the EIBV and IVR for every grid node as a candidate sampling location.
+
+        Args:
+            mu: (N, 1) mean vector.
+            Sigma: (N, N) covariance matrix.
+
+        Returns:
+            eibv_field: (N, ) unnormalised EIBV for each candidate.
+            ivr_field: (N, ) unnormalised integrated variance reduction for each candidate.
+        """
+        vr = self.get_variance_reduction(Sigma)
+        ivr_field = np.sum(vr, axis=0)
+        if self.__incremental:
+            return self.__get_eibv_incremental(mu, Sigma, vr), ivr_field
+        sigma_diag = np.diag(Sigma).reshape(-1, 1) - vr
+        eibv_field = self.get_eibv(mu, sigma_diag, vr)
+        self.__recomputed_fraction = 1.
+        return eibv_field, ivr_field
+
+    def __get_eibv_incremental(self, mu: np.ndarray, Sigma: np.ndarray, vr: np.ndarray) -> np.ndarray:
+        """ Compute EIBV for all candidates, recomputing the cached corrections only where the field changed. """
+        mu = mu.reshape(-1, 1)
+        diag = np.diag(Sigma).reshape(-1, 1)
+        N = Sigma.shape[0]
+
+        # s1: find the changed nodes and the candidates reaching them.
+        if self.__Sigma_last is None or self.__Sigma_last.shape != Sigma.shape:
+            self.__Sigma_last = np.array(Sigma)
+            self.__mu_last = np.array(mu)
+            self.__eibv_correction = np.zeros(N)
+            ind_dirty = np.arange(N)
+        else:
+            column_changed = np.amax(np.abs(Sigma - self.__Sigma_last), axis=0) > self.__tolerance
+            node_changed = column_changed | (np.abs(mu - self.__mu_last).flatten() > self.__tolerance)
+            dirty = column_changed | np.any(vr[node_changed, :] > self.__tolerance, axis=0)
+            ind_dirty = np.where(dirty)[0]
+            self.__Sigma_last[:, column_changed] = Sigma[:, column_changed]
+            self.__mu_last[node_changed] = mu[node_changed]
+
+        # s2: no-sampling terms for all nodes, and the corrections for the dirty candidates only.
+        eibv_none = self.get_eibv_terms(mu, diag, np.zeros_like(diag)).flatten()
+        if len(ind_dirty) > 0:
+            vr_dirty = vr[:, ind_dirty]
+            eibv_dirty = self.get_eibv(mu, diag - vr_dirty, vr_dirty)
+            self.__eibv_correction[ind_dirty] = eibv_dirty - np.sum(eibv_none)
+        self.__recomputed_fraction = len(ind_dirty) / N
+        return np.sum(eibv_none) + self.__eibv_correction
+
+    def get_eibv(self, mu: np.ndarray, sigma_diag: np.ndarray, vr: np.ndarray) -> np.ndarray:
+        """
+        Compute EIBV for the candidates given by the columns of sigma_diag and vr.
+
+        Args:
+            mu: (N, 1) mean vector.
+            sigma_diag: (N, M) posterior variance diagonals, one column per candidate.
+            vr: (N, M) variance reduction diagonals, one column per candidate.
+
+        Returns:
+            eibv: (M, ) EIBV for each candidate.
+        """
+        return np.sum(self.get_eibv_terms(mu, sigma_diag, vr), axis=0)
+
+    def get_eibv_terms(self, mu: np.ndarray, sigma_diag: np.ndarray, vr: np.ndarray) -> np.ndarray:
+        """
+        Compute the per-node EIBV terms, get_eibv sums them over the nodes.
+
+        Returns:
+            terms: (N, M) EIBV term of node j for candidate i.
+        """
+        mu = mu.reshape(-1, 1)
+        if self.__approximate_eibv:
+            p = norm.cdf(self.__threshold, mu, np.sqrt(sigma_diag))
+            return p * (1 - p)
+
+        sn2 = sigma_diag
+        mur = (self.__threshold - mu) / np.sqrt(sn2)
+        sig2r_1 = sn2 + vr
+        if self.__fast_eibv:
+            rho = -vr / sig2r_1
+            return self.__cdf_table.lookup(mur, -mur, rho)
+
+        terms = np.zeros(sigma_diag.shape)
+        for i in range(sigma_diag.shape[1]):
+            for j in range(sigma_diag.shape[0]):
+                terms[j, i] = calculate_analytical_ebv(np.array([mur[j, i], sig2r_1[j, i], vr[j, i]]))
+        return terms
+
+    def reset(self) -> None:
+        """ Drop the cached corrections, the next incremental update recomputes all candidates. """
+        self.__Sigma_last = None
+        self.__mu_last = None
+        self.__eibv_correction = None
+
+    def set_incremental(self, value: bool, tolerance: float = None) -> None:
+        """
+        Only recompute the EIBV of the candidates affected by the changes since the last update.
+
+        Args:
+            value: True to switch the incremental mode on.
+            tolerance: changes in the covariance, the mean and the variance reduction below it are ignored.
+        """
+        self.__incremental = value
+        if tolerance is not None:
+            self.__tolerance = tolerance
+        self.reset()
+
+    def get_incremental(self) -> bool:
+        """ Return if the incremental mode is used. """
+        return self.__incremental
+
+    def get_recomputed_fraction(self) -> float:
+        """ Return the fraction of candidates whose EIBV was recomputed in the last update. """
+        return self.__recomputed_fraction
+
+    def set_approximate_eibv(self, value: bool) -> None:
+        """ Use the approximate EIBV based on the posterior marginals. """
+        self.__approximate_eibv = value
+        self.reset()
+
+    def set_fast_eibv(self, value: bool) -> None:
+        """ Use the tabulated cdf for the analytical EIBV. """
+        self.__fast_eibv = value
+        self.reset()
+
+    def set_threshold(self, value: float) -> None:
+        """ Set threshold. """
+        self.__threshold = value
+        self.reset()
+
+    def set_nugget(self, value: float) -> None:
+        """ Set nugget. """
+        self.__nugget = value
+        self.reset()
@@ -8,19 +8,15 @@ Author: Yaolin Ge
 Email: geyaolin@gmail.com
 Date: 2023-08-22
 """
-from Field import Field
-from SINMOD import SINMOD
-from usr_func.vectorize import vectorize
+from GRF.ScenarioContext import ScenarioContext
+from GRF.EIField import EIField
+from GRF.CDFTable import CDFTable
 from usr_func.checkfolder import checkfolder
 from usr_func.normalize import normalize
 from usr_func.calculate_analytical_ebv import calculate_analytical_ebv
-from scipy.spatial.distance import cdist
+from scipy.linalg import cholesky, solve_triangular
 import numpy as np
-from scipy.stats import norm, multivariate_normal
-from numba import jit
 from joblib import Parallel, delayed
-from pykdtree.kdtree import KDTree
-from datetime import datetime
 import time
 import pandas as pd
 import os
@@ -30,7 +26,14 @@ class GRF:
     """
     GRF kernel
     """
-    def __init__(self, filepath_prior: str = os.getcwd() + "/../sinmod/samples_2022.05.11.nc") -> None:
+    def __init__(self, filepath_prior: str = os.getcwd() + "/../sinmod/samples_2022.05.11.nc",
+                 context: 'ScenarioContext' = None) -> None:
+        """
+        Set up the kernel on the prior of the scenario context. Without a context, a new one is built from
+        filepath_prior, so the kernel owns its prior. With a context, the prior state is shared with every other
+        kernel built on it and only the conditional field is allocated here.
+        """
+        self.__context = context if context is not None else ScenarioContext(filepath_prior)
         self.__ar1_coef = .965  # AR1 coef, timestep is 10 mins.
         self.__ar1_corr_range = 600   # [sec], AR1 correlation time range.
         self.__approximate_eibv = False
@@ -38,14 +41,14 @@ class GRF:
 
         """ Empirical parameters """
         # spatial variability
-        self.__sigma = .5
+        self.__sigma = self.__context.get_sigma()
 
         # spatial correlation
         # self.__lateral_range = 200  # 680 in the experiment
-        self.__lateral_range = 700  # 680 in the experiment
+        self.__lateral_range = self.__context.get_lateral_range()  # 680 in the experiment
 
         # measurement noise
-        self.__nugget = .1
+        self.__nugget = self.__context.get_nugget()
 
         # threshold
         self.__threshold = 26.81189868
@@ -66,50 +69,26 @@ class GRF:
         self.__eibv_field = None
         self.__ivr_field = None
 
-        # s0: construct grf covariance matrix.
-        self.field = Field(neighbour_distance=100)
-        self.grid = self.field.get_grid()
-        self.grid_kdtree = KDTree(self.grid)
+        # s0: grid from the scenario context.
+        self.field = self.__context.get_field()
+        self.grid = self.__context.get_grid()
+        self.grid_kdtree = self.__context.get_grid_kdtree()
         self.Ngrid = len(self.grid)
-        self.__Fgrf = np.ones([1, self.Ngrid])
-        self.__xg = vectorize(self.grid[:, 0])
-        self.__yg = vectorize(self.grid[:, 1])
-        self.__distance_matrix = None
-        self.__construct_grf_field()
-        self.__Sigma_prior = self.__Sigma
-
-        # s1: update prior mean
-        datestring = filepath_prior.split("/")[-1].split("_")[-1][:-3].replace('.', '-') + " 10:00:00"
-        timestamp_prior = np.array([datetime.strptime(datestring, "%Y-%m-%d %H:%M:%S").timestamp()])
-        self.__sinmod = SINMOD(filepath_prior)
-        self.__salinity_sinmod = self.__sinmod.get_salinity()[:, 0, :, :]
-        x, y, *_ = self.__sinmod.get_coordinates()
-        self.__grid_sinmod = np.stack((x.flatten(), y.flatten()), axis=1)
-        self.__grid_sinmod_tree = KDTree(self.__grid_sinmod)
-        *_, self.__ind_sinmod4grid = self.__grid_sinmod_tree.query(self.grid)
-        self.__timestamp_sinmod = self.__sinmod.get_timestamp()
-        self.__timestamp_sinmod_tree = KDTree(self.__timestamp_sinmod)
-        *_, ind_prior_time = self.__timestamp_sinmod_tree.query(timestamp_prior)
-        self.__mu = self.__salinity_sinmod[ind_prior_time, :, :].flatten()[self.__ind_sinmod4grid].reshape(-1, 1)
-
-        # s2: load cdf table
-        self.__load_cdf_table()
-
-    def __construct_grf_field(self) -> None:
-        """ Construct distance matrix and thus Covariance matrix for the kernel. """
-        self.__distance_matrix = cdist(self.grid, self.grid)
-        self.__Sigma = self.__sigma ** 2 * ((1 + self.__eta * self.__distance_matrix) *
-                                            np.exp(-self.__eta * self.__distance_matrix))
-
-    def __load_cdf_table(self) -> None:
-        """
-        Load cdf table for the analytical solution.
-        """
-        table = np.load("./../prior/cdf.npz")
-        self.__cdf_z1 = table["z1"]
-        self.__cdf_z2 = table["z2"]
-        self.__cdf_rho = table["rho"]
-        self.__cdf_table = table["cdf"]
+
+        # s1: the prior covariance and the SINMOD data on grid are read-only and shared through the context.
+        self.__Sigma_prior = self.__context.get_prior_covariance_matrix()
+        self.__Sigma = np.array(self.__Sigma_prior)  # posterior is updated in place, prior stays read-only.
+        self.__Sigma_buffer = np.empty(self.__Sigma.shape)  # preallocated N x N workspace for the downdates.
+        self.__ar1_weight = 1.  # pending AR1 blend, Sigma is w * Sigma + (1 - w) * Sigma_prior once materialised.
+
+        # s2: prior mean
+        self.__mu = np.array(self.__context.get_mu_prior())
+
+        # s3: set up the batched EI engine with the cdf table
+        self.__ei_engine = EIField(threshold=self.__threshold, nugget=self.__nugget,
+                                   approximate_eibv=self.__approximate_eibv, fast_eibv=self.__fast_eibv)
+        self.__cdf_table = CDFTable(*self.__context.get_cdf_arrays())
+        self.__ei_engine.set_cdf_table(self.__cdf_table)
 
     def assimilate_data(self, dataset: np.ndarray) -> None:
         """
@@ -135,14 +114,29 @@ class GRF:
         :param ind_measured: indices where the data is assimilated.
         :param salinity_measured: measurements at sampeld locations, dimension: m x 1
         """
-        msamples = salinity_measured.shape[0]
-        F = np.zeros([msamples, self.Ngrid])
-        for i in range(msamples):
-            F[i, ind_measured[i]] = True
-        R = np.eye(msamples) * self.__tau ** 2
-        C = F @ self.__Sigma @ F.T + R
-        self.__mu = self.__mu + self.__Sigma @ F.T @ np.linalg.solve(C, (salinity_measured - F @ self.__mu))
-        self.__Sigma = self.__Sigma - self.__Sigma @ F.T @ np.linalg.solve(C, F @ self.__Sigma)
+        self.__assimilate(ind_measured, salinity_measured)
+
+    def __assimilate(self, ind_measured: np.ndarray, salinity_measured: np.ndarray) -> None:
+        """
+        Rank-m update of the conditional field in place.
+        The sampling matrix F only selects rows, so Sigma @ F.T is Sigma[:, ind] and F @ Sigma @ F.T is
+        Sigma[ind, ind]. The m x m system C = Sigma[ind, ind] + R is factorised as C = L @ L.T, and with
+        W = L^-1 @ Sigma[ind, :] the update becomes
+            mu = mu + W.T @ L^-1 @ (y - mu[ind])
+            Sigma = Sigma - W.T @ W
+        where W.T @ W is written to the preallocated buffer, so no other N x N temporaries are allocated.
+        """
+        self.__materialize_covariance()
+        ind_measured = np.asarray(ind_measured, dtype=int).flatten()
+        msamples = len(ind_measured)
+        SF = self.__Sigma[:, ind_measured]
+        C = SF[ind_measured, :] + np.eye(msamples) * self.__tau ** 2
+        L = cholesky(C, lower=True)
+        W = solve_triangular(L, SF.T, lower=True)
+        residual = solve_triangular(L, salinity_measured.reshape(-1, 1) - self.__mu[ind_measured], lower=True)
+        self.__mu = self.__mu + W.T @ residual
+        np.matmul(W.T, W, out=self.__Sigma_buffer)
+        self.__Sigma -= self.__Sigma_buffer
 
     def assimilate_temporal_data(self, dataset: np.ndarray) -> tuple:
         """
@@ -177,126 +171,52 @@ class GRF:
         timestep here can only be 1, no larger than 1, if it is larger than 1, then the data assimilation needs to be
         properly adjusted to make sure that they correspond with each other.
         """
-        #s0, create sampling index matrix
-        msamples = salinity_measured.shape[0]
-        F = np.zeros([msamples, self.Ngrid])
-        for i in range(msamples):
-            F[i, ind_measured[i]] = True
-        R = np.eye(msamples) * self.__tau ** 2
-
         # s1, get timestamped prior mean from SINMOD
-        *_, ind_time = self.__timestamp_sinmod_tree.query(timestamp)
-        salinity_sinmod = self.__salinity_sinmod[ind_time, :, :].flatten()
-        mu_prior = salinity_sinmod[self.__ind_sinmod4grid].reshape(-1, 1)
+        mu_prior = self.__context.get_salinity_at_timestamp(timestamp)
 
         t1 = time.time()
-        # propagate
-        mt0 = mu_prior + self.__ar1_coef * (self.__mu - mu_prior)
-        St0 = self.__ar1_coef ** 2 * self.__Sigma + (1 - self.__ar1_coef ** 2) * self.__Sigma_prior
-        mts = mt0
-        Sts = St0
-        for s in range(timestep):
-            mts = mu_prior + self.__ar1_coef * (mts - mu_prior)
-            Sts = self.__ar1_coef**2 * Sts + (1 - self.__ar1_coef**2) * self.__Sigma_prior
-
-        self.__mu = mts + Sts @ F.T @ np.linalg.solve(F @ Sts @ F.T + R, salinity_measured - F @ mts)
-        self.__Sigma = Sts - Sts @ F.T @ np.linalg.solve(F @ Sts @ F.T + R, F @ Sts)
+        # s2, propagate timestep + 1 AR1 steps in closed form.
+        self.__propagate_ar1(timestep + 1, mu_prior)
+
+        # s3, assimilate
+        self.__assimilate(ind_measured, salinity_measured)
         t2 = time.time()
         # print("GRF-AR1 model updates takes: ", t2 - t1)
 
+    def __propagate_ar1(self, ksteps: int, mu_prior: np.ndarray) -> None:
+        """
+        Propagate the AR1 process ksteps ahead in closed form.
+            mu = mu_prior + a^k * (mu - mu_prior)
+            Sigma = a^2k * Sigma + (1 - a^2k) * Sigma_prior
+        The mean is updated directly. The covariance blend is only recorded in the pending weight and composes
+        multiplicatively, so it costs the same for any gap and is materialised once the posterior is needed.
+        """
+        self.__mu = mu_prior + self.__ar1_coef ** ksteps * (self.__mu - mu_prior)
+        self.__ar1_weight *= self.__ar1_coef ** (2 * ksteps)
+
+    def __materialize_covariance(self) -> None:
+        """ Apply the pending AR1 blend to the covariance matrix in place. """
+        if self.__ar1_weight == 1.:
+            return
+        np.multiply(self.__Sigma_prior, 1 - self.__ar1_weight, out=self.__Sigma_buffer)
+        self.__Sigma *= self.__ar1_weight
+        self.__Sigma += self.__Sigma_buffer
+        self.__ar1_weight = 1.
+
     def get_ei_field(self) -> tuple:
+        """
+        Compute the normalised EIBV and IVR fields with every grid node as a candidate sampling location.
+        All candidates are evaluated in one batch, see EIField.
+        """
         t1 = time.time()
-        eibv_field = np.zeros([self.Ngrid])
-        ivr_field = np.zeros([self.Ngrid])
-        for i in range(self.Ngrid):
-            SF = self.__Sigma[:, i].reshape(-1, 1)
-            MD = 1 / (self.__Sigma[i, i] + self.__nugget)
-            VR = SF @ SF.T * MD
-            SP = self.__Sigma - VR
-            sigma_diag = np.diag(SP).reshape(-1, 1)
-            if self.__approximate_eibv:
-                eibv_field[i] = self.__get_eibv_approximate(self.__mu, sigma_diag)
-            else:
-                vr_diag = np.diag(VR).reshape(-1, 1)
-                if self.__fast_eibv:
-                    eibv_field[i] = self.__get_eibv_analytical_fast(mu=self.__mu, sigma_diag=sigma_diag, vr_diag=vr_diag,
-                                                                    threshold=self.__threshold, cdf_z1=self.__cdf_z1,
-                                                                    cdf_z2=self.__cdf_z2, cdf_rho=self.__cdf_rho,
-                                                                    cdf_table=self.__cdf_table)
-                else:
-                    eibv_field[i] = self.__get_eibv_analytical(self.__mu, sigma_diag, vr_diag)
-            ivr_field[i] = np.sum(np.diag(VR))
+        self.__materialize_covariance()
+        eibv_field, ivr_field = self.__ei_engine.get_ei_field(self.__mu, self.__Sigma)
         self.__eibv_field = normalize(eibv_field)
         self.__ivr_field = 1 - normalize(ivr_field)
         t2 = time.time()
         print("EI field takes: ", t2 - t1, " seconds.")
         return self.__eibv_field, self.__ivr_field
 
-    def __get_eibv_approximate(self, mu: np.ndarray, sigma_diag: np.ndarray) -> np.ndarray:
-        """ !!! Be careful with dimensions, it can lead to serious problems.
-        !!! Be careful with standard deviation is not variance, so it does not cause significant issues tho.
-        :param mu: n x 1 dimension
-        :param sigma_diag: n x 1 dimension
-        :return:
-        """
-        p = norm.cdf(self.__threshold, mu, np.sqrt(sigma_diag))
-        bv = p * (1 - p)
-        ibv = np.sum(bv)
-        return ibv
-
-    def __get_eibv_analytical(self, mu: np.ndarray, sigma_diag: np.ndarray, vr_diag: np.ndarray) -> float:
-        """
-        Calculate the eibv using the analytical formula with a bivariate cumulative dentisty function.
-        """
-        eibv = .0
-        for i in range(len(mu)):
-            sn2 = sigma_diag[i]
-            vn2 = vr_diag[i]
-
-            sn = np.sqrt(sn2)
-            m = mu[i]
-
-            mur = (self.__threshold - m) / sn
-
-            sig2r_1 = sn2 + vn2
-            sig2r = vn2
-
-            eibv += multivariate_normal.cdf(np.array([0, 0]), np.array([-mur, mur]).squeeze(),
-                                            np.array([[sig2r_1, -sig2r],
-                                                      [-sig2r, sig2r_1]]).squeeze())
-        return eibv
-
-    @staticmethod
-    @jit
-    def __get_eibv_analytical_fast(mu: np.ndarray, sigma_diag: np.ndarray, vr_diag: np.ndarray,
-                                   threshold: float, cdf_z1: np.ndarray, cdf_z2: np.ndarray,
-                                   cdf_rho: np.ndarray, cdf_table: np.ndarray) -> float:
-        """
-        Calculate the eibv using the analytical formula but using a loaded cdf dataset.
-        """
-        eibv = .0
-        for i in range(len(mu)):
-            sn2 = sigma_diag[i]
-            vn2 = vr_diag[i]
-
-            sn = np.sqrt(sn2)
-            m = mu[i]
-
-            mur = (threshold - m) / sn
-
-            sig2r_1 = sn2 + vn2
-            sig2r = vn2
-
-            z1 = mur
-            z2 = -mur
-            rho = -sig2r / sig2r_1
-
-            ind1 = np.argmin(np.abs(z1 - cdf_z1))
-            ind2 = np.argmin(np.abs(z2 - cdf_z2))
-            ind3 = np.argmin(np.abs(rho - cdf_rho))
-            eibv += cdf_table[ind1][ind2][ind3]
-        return eibv
-
     def __get_eibv_analytical_para(self, mu: np.ndarray, sigma_diag: np.ndarray, vr_diag: np.ndarray) -> float:
         """
         Calculate the eibv using the analytical formula with a bivariate cumulative dentisty function.
@@ -347,10 +267,25 @@ class GRF:
     def set_nugget(self, value: float) -> None:
         """ Set nugget. """
         self.__nugget = value
+        self.__ei_engine.set_nugget(value)
 
     def set_threshold(self, value: float) -> None:
         """ Set threshold. """
         self.__threshold = value
+        self.__ei_engine.set_threshold(value)
+
+    def set_cdf_interpolation(self, value: bool) -> None:
+        """ Use trilinear interpolation in the cdf table instead of the nearest entry. """
+        self.__cdf_table.set_interpolate(value)
+        self.__ei_engine.reset()
+
+    def set_incremental_ei(self, value: bool, tolerance: float = None) -> None:
+        """ Only recompute the EIBV of the candidates affected by the assimilated data, see EIField. """
+        self.__ei_engine.set_incremental(value, tolerance)
+
+    def get_recomputed_fraction(self) -> float:
+        """ Return the fraction of candidates whose EIBV was recomputed in the last EI field update. """
+        return self.__ei_engine.get_recomputed_fraction()
 
     def set_mu(self, value: np.ndarray) -> None:
         """ Set mean of the field. """
@@ -378,8 +313,21 @@ class GRF:
 
     def get_covariance_matrix(self) -> np.ndarray:
         """ Return Covariance. """
+        self.__materialize_covariance()
         return self.__Sigma
 
+    def get_prior_covariance_matrix(self) -> np.ndarray:
+        """ Return the prior covariance, read-only. """
+        return self.__Sigma_prior
+
+    def get_cholesky_prior(self) -> np.ndarray:
+        """ Return the lower Cholesky factor of the prior covariance, computed once and kept in the cache. """
+        return self.__context.get_cholesky_prior()
+
+    def get_context(self) -> 'ScenarioContext':
+        """ Return the scenario context holding the prior. """
+        return self.__context
+
     def get_eibv_field(self) -> np.ndarray:
         """ Return the computed eibv field, given which method to be called. """
         return self.__eibv_field
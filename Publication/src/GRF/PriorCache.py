@@ -0,0 +1,118 @@
+"""
+PriorCache stores the expensive prior artifacts of the GRF kernel on disk so they are only computed once.
+
+Every GRF construction used to recompute the distance matrix, the Matern covariance and the SINMOD-to-grid mapping,
+and it read the whole netCDF file through SINMOD. These artifacts only depend on
+    (grid, sigma, lateral_range, nugget, SINMOD file content),
+so they are stored in a content-addressed folder named by the hash of those inputs:
+    prior/cache/<key>/Sigma_prior.npy
+    prior/cache/<key>/ind_sinmod4grid.npy
+    ...
+
+Arrays are plain .npy files loaded with mmap_mode="r", so a warm start only maps the files and all the joblib workers
+on the same machine share the same physical pages. The loaded arrays are read-only, anything that needs to be
+modified has to be copied first.
+"""
+from usr_func.checkfolder import checkfolder
+from typing import Union
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+class PriorCache:
+    """
+    Content-addressed artifact cache for the prior field.
+    """
+    __VERSION = 1  # bump when the content of the artifacts changes.
+
+    def __init__(self, folder: str = os.getcwd() + "/../prior/cache/") -> None:
+        self.__folder = folder
+        checkfolder(self.__folder)
+
+    def get_key(self, grid: np.ndarray, sigma: float, lateral_range: float, nugget: float, filepath: str) -> str:
+        """
+        Return the cache key for the given kernel setup.
+        """
+        sha = hashlib.sha1()
+        sha.update(str(self.__VERSION).encode())
+        sha.update(np.ascontiguousarray(grid, dtype=np.float64).tobytes())
+        sha.update(repr((float(sigma), float(lateral_range), float(nugget))).encode())
+        sha.update(self.get_file_hash(filepath).encode())
+        return sha.hexdigest()
+
+    def get_file_hash(self, filepath: str) -> str:
+        """
+        Return the sha1 of the file content.
+        Hashing a large netCDF file is slow, so the hash is remembered by (path, size, mtime) in the cache folder.
+        """
+        stat = os.stat(filepath)
+        file_id = "{:s}|{:d}|{:d}".format(os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+        filepath_index = self.__folder + "file_hashes.json"
+        index = dict()
+        if os.path.exists(filepath_index):
+            try:
+                with open(filepath_index, "r") as f:
+                    index = json.load(f)
+            except ValueError:
+                index = dict()
+        if file_id in index:
+            return index[file_id]
+
+        sha = hashlib.sha1()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        index[file_id] = sha.hexdigest()
+        self.__write_atomic(filepath_index, json.dumps(index, indent=1))
+        return index[file_id]
+
+    def load(self, key: str) -> Union[dict, None]:
+        """
+        Return the cached artifacts as read-only memory maps, or None if the key is not cached.
+        """
+        folder = self.__folder + key + "/"
+        if not os.path.isdir(folder):
+            return None
+        artifacts = dict()
+        for filename in os.listdir(folder):
+            if filename.endswith(".npy"):
+                artifacts[filename[:-4]] = np.load(folder + filename, mmap_mode="r")
+        return artifacts
+
+    def save(self, key: str, artifacts: dict) -> None:
+        """
+        Save artifacts under key.
+        Files are written to a temporary folder first and then moved in place, so concurrent workers never read
+        a half written cache entry.
+        """
+        folder = self.__folder + key + "/"
+        if not os.path.isdir(folder):
+            folder_tmp = tempfile.mkdtemp(dir=self.__folder)
+            for name, value in artifacts.items():
+                np.save(folder_tmp + "/" + name + ".npy", value)
+            try:
+                os.rename(folder_tmp, folder)
+                return
+            except OSError:  # another worker got there first, add the missing artifacts instead.
+                shutil.rmtree(folder_tmp, ignore_errors=True)
+        for name, value in artifacts.items():
+            if not os.path.exists(folder + name + ".npy"):
+                fd, filepath_tmp = tempfile.mkstemp(dir=folder, suffix=".npy")
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, value)
+                os.replace(filepath_tmp, folder + name + ".npy")
+
+    @staticmethod
+    def __write_atomic(filepath: str, content: str) -> None:
+        fd, filepath_tmp = tempfile.mkstemp(dir=os.path.dirname(filepath))
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(filepath_tmp, filepath)
+
+    def get_folder(self) -> str:
+        """ Return the cache folder. """
+        return self.__folder
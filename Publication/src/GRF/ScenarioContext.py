@@ -0,0 +1,158 @@
+"""
+ScenarioContext holds the immutable prior state of a simulation scenario, built once and shared by all the agents.
+
+Every agent used to build its own chain Planner/Myopic2D -> CostValley -> GRF -> Field -> SINMOD, so each of them
+constructed the grid, the prior covariance, the SINMOD timeseries on grid and the cdf table on its own. None of these
+change during a mission, only the conditional mean and covariance do. The context keeps
+- the field, the grid and its kd-tree,
+- the prior mean, the prior covariance and its Cholesky factor,
+- the SINMOD salinity timeseries on grid and its timestamps,
+- the cdf table arrays,
+and the GRF kernels built with it only allocate their own posterior. The arrays are read-only, and when the replicate
+workers are forked after the context is built, they reference the same physical pages until someone writes to them.
+
+The truth field of a replicate is drawn from the same prior, see get_truth.
+"""
+from Field import Field
+from SINMOD import SINMOD
+from GRF.PriorCache import PriorCache
+from scipy.spatial.distance import cdist
+from pykdtree.kdtree import KDTree
+from datetime import datetime
+import numpy as np
+import os
+
+
+class ScenarioContext:
+    """
+    Shared read-only prior state of a scenario.
+    """
+    def __init__(self, filepath_prior: str = os.getcwd() + "/../sinmod/samples_2022.05.11.nc",
+                 sigma: float = .5, lateral_range: float = 700, nugget: float = .1,
+                 neighbour_distance: float = 100) -> None:
+        self.__filepath_prior = filepath_prior
+        self.__sigma = sigma
+        self.__lateral_range = lateral_range
+        self.__nugget = nugget
+        self.__eta = 4.5 / self.__lateral_range  # decay factor
+
+        # s0: construct the grid.
+        self.__field = Field(neighbour_distance=neighbour_distance)
+        self.__grid = self.__field.get_grid()
+        self.__grid_kdtree = KDTree(self.__grid)
+
+        # s1: load prior covariance and SINMOD data on grid, from the artifact cache if it is there.
+        self.__prior_cache = PriorCache()
+        self.__L_prior = None
+        self.__load_prior()
+
+        # s2: prior mean at the time of the prior SINMOD file.
+        datestring = filepath_prior.split("/")[-1].split("_")[-1][:-3].replace('.', '-') + " 10:00:00"
+        timestamp_prior = np.array([datetime.strptime(datestring, "%Y-%m-%d %H:%M:%S").timestamp()])
+        self.__timestamp_sinmod_tree = KDTree(np.asarray(self.__timestamp_sinmod).reshape(-1, 1))
+        self.__mu_prior = self.get_salinity_at_timestamp(timestamp_prior)
+        self.__mu_prior.flags.writeable = False
+
+        # s3: load the cdf table for the analytical eibv.
+        table = np.load("./../prior/cdf.npz")
+        self.__cdf_arrays = tuple(np.array(table[name]) for name in ["z1", "z2", "rho", "cdf"])
+        for value in self.__cdf_arrays:
+            value.flags.writeable = False
+
+    def __load_prior(self) -> None:
+        """
+        Load the prior covariance, the SINMOD-to-grid index map and the SINMOD salinity on grid from the cache.
+        On a cache miss, they are computed from the SINMOD file and saved for the next construction.
+        """
+        key = self.__prior_cache.get_key(self.__grid, self.__sigma, self.__lateral_range, self.__nugget,
+                                         self.__filepath_prior)
+        self.__prior_key = key
+        artifacts = self.__prior_cache.load(key)
+        if artifacts is None:
+            sinmod = SINMOD(self.__filepath_prior)
+            salinity_sinmod = sinmod.get_salinity()[:, 0, :, :]
+            x, y, *_ = sinmod.get_coordinates()
+            grid_sinmod = np.stack((x.flatten(), y.flatten()), axis=1)
+            *_, ind_sinmod4grid = KDTree(grid_sinmod).query(self.__grid)
+            self.__prior_cache.save(key, {
+                "Sigma_prior": self.__construct_covariance(),
+                "ind_sinmod4grid": ind_sinmod4grid,
+                "salinity_sinmod4grid": salinity_sinmod.reshape(salinity_sinmod.shape[0], -1)[:, ind_sinmod4grid],
+                "timestamp_sinmod": sinmod.get_timestamp(),
+            })
+            artifacts = self.__prior_cache.load(key)
+        self.__Sigma_prior = artifacts["Sigma_prior"]
+        self.__ind_sinmod4grid = artifacts["ind_sinmod4grid"]
+        self.__salinity_sinmod4grid = artifacts["salinity_sinmod4grid"]
+        self.__timestamp_sinmod = artifacts["timestamp_sinmod"]
+        if "L_prior" in artifacts:
+            self.__L_prior = artifacts["L_prior"]
+
+    def __construct_covariance(self) -> np.ndarray:
+        """ Construct distance matrix and thus the Matern covariance matrix of the prior. """
+        distance_matrix = cdist(self.__grid, self.__grid)
+        return self.__sigma ** 2 * ((1 + self.__eta * distance_matrix) * np.exp(-self.__eta * distance_matrix))
+
+    def get_salinity_at_timestamp(self, timestamp: np.ndarray) -> np.ndarray:
+        """ Return the SINMOD salinity on grid closest in time to timestamp, as a new N x 1 array. """
+        *_, ind_time = self.__timestamp_sinmod_tree.query(np.asarray(timestamp, dtype=np.float64).reshape(-1, 1))
+        return np.array(self.__salinity_sinmod4grid[ind_time, :]).reshape(-1, 1)
+
+    def get_truth(self, random_seed: int = 0) -> np.ndarray:
+        """
+        Return a truth field drawn from the prior, mu_prior + L_prior @ z. The draw only depends on random_seed,
+        so every agent of a replicate sees the same truth, and the global random state is left untouched.
+        """
+        z = np.random.RandomState(random_seed).randn(len(self.__mu_prior)).reshape(-1, 1)
+        return self.__mu_prior + self.get_cholesky_prior() @ z
+
+    def get_cholesky_prior(self) -> np.ndarray:
+        """ Return the lower Cholesky factor of the prior covariance, computed once and kept in the cache. """
+        if self.__L_prior is None:
+            self.__prior_cache.save(self.__prior_key, {"L_prior": np.linalg.cholesky(self.__Sigma_prior)})
+            self.__L_prior = self.__prior_cache.load(self.__prior_key)["L_prior"]
+        return self.__L_prior
+
+    def get_field(self) -> 'Field':
+        return self.__field
+
+    def get_grid(self) -> np.ndarray:
+        return self.__grid
+
+    def get_grid_kdtree(self) -> 'KDTree':
+        return self.__grid_kdtree
+
+    def get_mu_prior(self) -> np.ndarray:
+        """ Return the prior mean, read-only. """
+        return self.__mu_prior
+
+    def get_prior_covariance_matrix(self) -> np.ndarray:
+        """ Return the prior covariance, read-only. """
+        return self.__Sigma_prior
+
+    def get_salinity_sinmod4grid(self) -> np.ndarray:
+        """ Return the SINMOD salinity timeseries on grid, (timesteps, N), read-only. """
+        return self.__salinity_sinmod4grid
+
+    def get_timestamp_sinmod(self) -> np.ndarray:
+        return self.__timestamp_sinmod
+
+    def get_cdf_arrays(self) -> tuple:
+        """ Return the cdf table (z1, z2, rho, cdf), read-only. """
+        return self.__cdf_arrays
+
+    def get_sigma(self) -> float:
+        return self.__sigma
+
+    def get_lateral_range(self) -> float:
+        return self.__lateral_range
+
+    def get_nugget(self) -> float:
+        return self.__nugget
+
+    def get_filepath_prior(self) -> str:
+        return self.__filepath_prior
+
+
+if __name__ == "__main__":
+    s = ScenarioContext()
@@ -0,0 +1,220 @@
+"""
+LegalityMap answers the point and segment legality queries against the operational area with array lookups.
+
+The planners used to build a shapely Point or LineString for every single query and run the polygon predicates on
+the full border and obstacle polygons, thousands of times per waypoint. Instead, each polygon is rasterized once
+at a given resolution into:
+- inside: whether each cell centre is inside the polygon.
+- clearance: a lower bound of the distance from each cell centre to the polygon outline.
+
+The clearance is computed with a distance transform over the cells holding the outline densified at half the
+resolution, minus the discretization error, so it is a true lower bound and never an estimate.
+For a query point p in the cell with centre c, the outline is at least
+    clearance[c] - |p - c|
+away from p. If this is positive, p is on the same side as c and the raster answer is exact. Otherwise the point is
+close to the outline and the exact shapely predicate is used, so all the answers are identical to shapely.
+
+Segments are checked in three stages:
+- a disk around the segment midpoint that covers the segment and has no outline in it: no intersection.
+- samples along the segment that are all clear of the outline by half the sampling step: no intersection.
+  samples certainly on both sides of the outline: intersection.
+- otherwise the exact shapely intersects.
+
+The rasters are memoized per (polygon, resolution) at class level, so the planners and fields in one process share
+them.
+"""
+from shapely.geometry import Polygon, LineString, Point
+from scipy.ndimage import distance_transform_edt
+from math import sqrt, ceil
+import numpy as np
+import shapely
+
+
+class PolygonRaster:
+    """
+    Rasterized polygon with exact fallback near its outline.
+    """
+    __cache = dict()
+
+    def __init__(self, polygon: np.ndarray, resolution: float = 10.) -> None:
+        self.__polygon = np.asarray(polygon, dtype=np.float64)
+        self.__resolution = float(resolution)
+        self.__polygon_shapely = Polygon(self.__polygon)
+        self.__line_shapely = LineString(self.__polygon)
+        shapely.prepare(self.__polygon_shapely)
+        shapely.prepare(self.__line_shapely)
+        # crossing from inside to outside only implies touching the line if the line is the closed outline.
+        self.__is_closed = np.array_equal(self.__polygon[0], self.__polygon[-1])
+
+        key = (self.__polygon.tobytes(), float(resolution))
+        if key not in PolygonRaster.__cache:
+            PolygonRaster.__cache[key] = self.__rasterize()
+        self.__x0, self.__y0, self.__inside, self.__clearance, self.__inside_list, self.__clearance_list = \
+            PolygonRaster.__cache[key]
+        self.__nx, self.__ny = self.__inside.shape
+
+    def __rasterize(self) -> tuple:
+        """ Compute the inside flags and the outline clearance at all the cell centres. """
+        res = self.__resolution
+        xmin, ymin = np.amin(self.__polygon, axis=0) - 2 * res
+        xmax, ymax = np.amax(self.__polygon, axis=0) + 2 * res
+        gx = np.arange(xmin, xmax + res, res)
+        gy = np.arange(ymin, ymax + res, res)
+        xx, yy = np.meshgrid(gx, gy, indexing="ij")
+        inside = shapely.contains_xy(self.__polygon_shapely, xx, yy)
+
+        # s1: densify the closed outline so that every point on it is within spacing / 2 of a densified point.
+        spacing = res / 2
+        vertices = np.vstack((self.__polygon, self.__polygon[:1]))
+        points = [vertices[-1:]]
+        for v1, v2 in zip(vertices[:-1], vertices[1:]):
+            n = max(int(ceil(np.linalg.norm(v2 - v1) / spacing)), 1)
+            t = np.arange(n).reshape(-1, 1) / n
+            points.append(v1 + t * (v2 - v1))
+        points = np.vstack(points)
+
+        # s2: exact distance transform to the cells holding the densified points. Each outline point is within
+        # spacing / 2 of a densified point, which is within half a cell diagonal of its cell centre, so subtracting
+        # both gives a lower bound of the outline distance.
+        mask = np.ones(xx.shape, dtype=bool)
+        i = np.rint((points[:, 0] - gx[0]) / res).astype(int)
+        j = np.rint((points[:, 1] - gy[0]) / res).astype(int)
+        mask[i, j] = False
+        dist = distance_transform_edt(mask) * res
+        clearance = np.maximum(dist - spacing / 2 - res * sqrt(2) / 2, 0)
+
+        # s3: python floats and flat lists are much faster than numpy scalars and indexing for single queries.
+        return float(gx[0]), float(gy[0]), inside, clearance, inside.ravel().tolist(), clearance.ravel().tolist()
+
+    def __get_cells(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """ Return the nearest cell indices and the lower bound of the outline distance for arrays of points. """
+        i = np.clip(np.rint((x - self.__x0) / self.__resolution), 0, self.__nx - 1).astype(int)
+        j = np.clip(np.rint((y - self.__y0) / self.__resolution), 0, self.__ny - 1).astype(int)
+        dx = x - (self.__x0 + i * self.__resolution)
+        dy = y - (self.__y0 + j * self.__resolution)
+        return i, j, self.__clearance[i, j] - np.sqrt(dx ** 2 + dy ** 2)
+
+    def __get_clearance(self, x: float, y: float) -> tuple:
+        """ Scalar version of __get_cells, return the flat cell index and the outline distance lower bound. """
+        i = min(max(int(round((x - self.__x0) / self.__resolution)), 0), self.__nx - 1)
+        j = min(max(int(round((y - self.__y0) / self.__resolution)), 0), self.__ny - 1)
+        dx = x - (self.__x0 + i * self.__resolution)
+        dy = y - (self.__y0 + j * self.__resolution)
+        k = i * self.__ny + j
+        return k, self.__clearance_list[k] - sqrt(dx * dx + dy * dy)
+
+    def contains(self, loc: np.ndarray) -> bool:
+        """ Test if the polygon contains the point, same as Polygon.contains(Point(loc)). """
+        x, y = float(loc[0]), float(loc[1])
+        k, clearance = self.__get_clearance(x, y)
+        if clearance > 0:
+            return self.__inside_list[k]
+        return self.__polygon_shapely.contains(Point(x, y))
+
+    def contains_many(self, points: np.ndarray) -> np.ndarray:
+        """ Test if the polygon contains each of the points, points: (N, 2) array. """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        i, j, clearance = self.__get_cells(points[:, 0], points[:, 1])
+        result = self.__inside[i, j]
+        ind = np.where(clearance <= 0)[0]
+        if len(ind) > 0:
+            result[ind] = shapely.contains_xy(self.__polygon_shapely, points[ind, 0], points[ind, 1])
+        return result
+
+    def intersects(self, loc_start: np.ndarray, loc_end: np.ndarray) -> bool:
+        """ Test if the segment touches the outline, same as LineString(polygon).intersects(segment). """
+        xs, ys = float(loc_start[0]), float(loc_start[1])
+        xe, ye = float(loc_end[0]), float(loc_end[1])
+        length = sqrt((xe - xs) ** 2 + (ye - ys) ** 2)
+        if self.__get_clearance((xs + xe) / 2, (ys + ye) / 2)[1] > length / 2:
+            return False
+        return self.__line_shapely.intersects(LineString([(xs, ys), (xe, ye)]))
+
+    def intersects_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Test if each segment from starts to ends touches the outline, starts, ends: (N, 2) arrays. """
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        result = np.zeros(len(starts), dtype=bool)
+        if len(starts) == 0:
+            return result
+        length = np.sqrt(np.sum((ends - starts) ** 2, axis=1))
+
+        # s1: midpoint disk test.
+        mid = (starts + ends) / 2
+        clearance = self.__get_cells(mid[:, 0], mid[:, 1])[2]
+        ind = np.where(clearance <= length / 2)[0]
+        if len(ind) == 0:
+            return result
+
+        # s2: sample all the remaining segments with the same number of points, no further apart than resolution.
+        n = int(ceil(np.amax(length[ind]) / self.__resolution)) + 1
+        t = np.linspace(0, 1, n)
+        xs = starts[ind, 0:1] + t * (ends[ind, 0:1] - starts[ind, 0:1])
+        ys = starts[ind, 1:2] + t * (ends[ind, 1:2] - starts[ind, 1:2])
+        i, j, clearance = self.__get_cells(xs, ys)
+        step = length[ind] / max(n - 1, 1)
+        is_clear = np.all(clearance > step.reshape(-1, 1) / 2, axis=1)
+        is_certain = clearance > 0
+        inside = self.__inside[i, j]
+        is_crossing = np.any(is_certain & inside, axis=1) & np.any(is_certain & ~inside, axis=1) & self.__is_closed
+        result[ind[is_crossing]] = True
+
+        # s3: exact check for the undecided segments.
+        ind_exact = ind[~is_clear & ~is_crossing]
+        if len(ind_exact) > 0:
+            lines = shapely.linestrings(np.stack((starts[ind_exact], ends[ind_exact]), axis=1))
+            result[ind_exact] = shapely.intersects(self.__line_shapely, lines)
+        return result
+
+    def get_resolution(self) -> float:
+        """ Return the raster resolution. """
+        return self.__resolution
+
+
+class LegalityMap:
+    """
+    Border and obstacle legality queries for the operational area.
+    """
+    def __init__(self, polygon_border: np.ndarray, polygon_obstacle: np.ndarray, resolution: float = 10.) -> None:
+        self.__border = PolygonRaster(polygon_border, resolution)
+        self.__obstacle = PolygonRaster(polygon_obstacle, resolution)
+
+    def border_contains(self, loc: np.ndarray) -> bool:
+        """ Test if point is within the border polygon """
+        return self.__border.contains(loc)
+
+    def obstacle_contains(self, loc: np.ndarray) -> bool:
+        """ Test if obstacle contains the point. """
+        return self.__obstacle.contains(loc)
+
+    def is_border_in_the_way(self, loc_start: np.ndarray, loc_end: np.ndarray) -> bool:
+        """ Check if border is in the way between loc_start and loc_end. """
+        return self.__border.intersects(loc_start, loc_end)
+
+    def is_obstacle_in_the_way(self, loc_start: np.ndarray, loc_end: np.ndarray) -> bool:
+        """ Check if obstacle is in the way between loc_start and loc_end. """
+        return self.__obstacle.intersects(loc_start, loc_end)
+
+    def border_contains_many(self, points: np.ndarray) -> np.ndarray:
+        """ Batch version of border_contains, points: (N, 2) array. """
+        return self.__border.contains_many(points)
+
+    def obstacle_contains_many(self, points: np.ndarray) -> np.ndarray:
+        """ Batch version of obstacle_contains, points: (N, 2) array. """
+        return self.__obstacle.contains_many(points)
+
+    def is_border_in_the_way_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Batch version of is_border_in_the_way, starts, ends: (N, 2) arrays. """
+        return self.__border.intersects_many(starts, ends)
+
+    def is_obstacle_in_the_way_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Batch version of is_obstacle_in_the_way, starts, ends: (N, 2) arrays. """
+        return self.__obstacle.intersects_many(starts, ends)
+
+    def is_location_legal_many(self, points: np.ndarray) -> np.ndarray:
+        """ Test if each point is inside the border and outside the obstacle. """
+        return self.border_contains_many(points) & ~self.obstacle_contains_many(points)
+
+    def is_path_legal_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Test if each segment crosses neither the border nor the obstacle. """
+        return ~self.is_border_in_the_way_many(starts, ends) & ~self.is_obstacle_in_the_way_many(starts, ends)
@@ -0,0 +1,134 @@
+"""
+AsyncPlanner runs the Planner in a worker thread, so the pioneer waypoint is planned while the vehicle transits to the
+next waypoint instead of blocking the agent in between.
+
+The sense, plan, act loop becomes:
+- On arrival at the next waypoint, update_planning_trackers takes the pioneer waypoint and moves the trackers ahead.
+- The CTD data of the finished leg is then submitted. submit returns at once with a future, while data assimilation,
+the cost valley update and rrt* run in the worker. The results are handed over in memory.
+
+If the plan is not ready on arrival, a stale but valid waypoint is used instead: the latest waypoint published by
+anytime rrt* for this plan if any, else the fallback computed at submission, one legal step from the next waypoint
+towards the minimum cost location of the previous cost valley. Rrt* is then cancelled, so the late plan finishes
+early. Its result is discarded, but the assimilated data is kept.
+"""
+from Planner.Planner import Planner
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError, CancelledError
+import numpy as np
+
+
+class AsyncPlanner:
+    """ Planner running in a background thread. """
+    def __init__(self, planner: 'Planner' = None) -> None:
+        self.__planner = planner if planner is not None else Planner()
+        self.__rrtstarcv = self.__planner.get_rrtstarcv()
+        self.__cost_valley = self.__rrtstarcv.get_CostValley()
+        self.__executor = ThreadPoolExecutor(max_workers=1)
+        self.__future = None
+        self.__num_published_submitted = 0  # waypoints published by anytime rrt* when the current plan was submitted.
+        self.__wp_fallback = self.__planner.get_pioneer_waypoint()
+        self.__num_fallbacks = 0
+
+    def submit(self, ctd_data: np.ndarray) -> 'Future':
+        """
+        Plan the pioneer waypoint from the data of the finished leg in the worker.
+
+        Args:
+            ctd_data: (t, x, y, sal)
+
+        Returns:
+            future of the pioneer waypoint.
+        """
+        self.__wait()
+        self.__rrtstarcv.stop_improvement()
+        self.__wp_fallback = self.__get_fallback_waypoint()
+        self.__num_published_submitted = self.__planner.get_num_published()
+        self.__future = self.__executor.submit(self.__plan, ctd_data)
+        return self.__future
+
+    def __plan(self, ctd_data: np.ndarray) -> np.ndarray:
+        self.__planner.update_pioneer_waypoint(ctd_data)
+        return self.__planner.get_pioneer_waypoint()
+
+    def get_pioneer_waypoint(self, timeout: float = None) -> np.ndarray:
+        """
+        Return the pioneer waypoint, waiting at most timeout seconds for the plan, None to wait until it is ready.
+        If it is not ready by then, return the latest waypoint published by anytime rrt* or else the fallback.
+        """
+        if self.__future is None:
+            return self.__planner.get_pioneer_waypoint()
+        try:
+            self.__future.result(timeout)
+            return self.__planner.get_pioneer_waypoint()  # also picks up the background improvements.
+        except (TimeoutError, CancelledError):
+            # while the plan runs, the pioneer waypoint is only replaced by the waypoints anytime rrt* publishes.
+            if self.__planner.get_num_published() > self.__num_published_submitted:
+                return self.__planner.get_pioneer_waypoint()
+            return self.__wp_fallback
+
+    def update_planning_trackers(self, timeout: float = None) -> np.ndarray:
+        """
+        Take the pioneer waypoint, waiting at most timeout seconds for the plan, and move the trackers one step ahead.
+        A late plan is cancelled and its waypoint is replaced by the stale one. Return the pioneer waypoint taken.
+        """
+        wp = self.get_pioneer_waypoint(timeout)
+        if self.__future is not None and not self.__future.done():
+            self.__num_fallbacks += 1
+            self.__rrtstarcv.set_cancelled(True)
+        self.__wait()
+        self.__rrtstarcv.set_cancelled(False)
+        self.__rrtstarcv.stop_improvement()
+        self.__planner.set_pioneer_waypoint(wp)
+        self.__planner.update_planning_trackers()
+        return wp
+
+    def cancel(self) -> None:
+        """
+        Cancel the current plan. If it has not started, its data is never assimilated. If it is running, rrt* stops
+        at once and the call returns once the worker is idle.
+        """
+        if self.__future is None or self.__future.cancel():
+            return
+        self.__rrtstarcv.set_cancelled(True)
+        self.__wait()
+        self.__rrtstarcv.set_cancelled(False)
+
+    def shutdown(self) -> None:
+        """ Cancel the current plan and stop the worker. """
+        self.cancel()
+        self.__rrtstarcv.stop_improvement()
+        self.__executor.shutdown()
+
+    def __wait(self) -> None:
+        """ Wait for the worker to finish the current plan, errors in the plan are raised here. """
+        if self.__future is not None and not self.__future.cancelled():
+            self.__future.result()
+
+    def __get_fallback_waypoint(self) -> np.ndarray:
+        """
+        Return one step from the next waypoint towards the current minimum cost location, or the first legal heading
+        around it, or the next waypoint itself if there is none.
+        """
+        loc = self.__planner.get_next_waypoint()
+        loc_target = self.__cost_valley.get_minimum_cost_location()
+        stepsize = self.__rrtstarcv.get_stepsize()
+        heading = np.arctan2(loc_target[0] - loc[0], loc_target[1] - loc[1])
+        angles = heading + np.linspace(0, 2 * np.pi, 60, endpoint=False)
+        locs = loc + stepsize * np.stack((np.sin(angles), np.cos(angles)), axis=1)
+        legal = (self.__rrtstarcv.is_location_legal_many(locs) &
+                 self.__rrtstarcv.is_path_legal_many(np.tile(loc, (len(locs), 1)), locs))
+        return locs[np.argmax(legal)] if np.any(legal) else loc
+
+    def is_ready(self) -> bool:
+        """ Return True if the current plan is finished. """
+        return self.__future is None or self.__future.done()
+
+    def get_fallback_waypoint(self) -> np.ndarray:
+        return self.__wp_fallback
+
+    def get_num_fallbacks(self) -> int:
+        """ Return the number of times the plan was late and a stale waypoint was taken. """
+        return self.__num_fallbacks
+
+    def get_planner(self) -> 'Planner':
+        return self.__planner
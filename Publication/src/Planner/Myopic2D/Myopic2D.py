@@ -6,11 +6,17 @@ It utilizes the three-waypoint system to smooth out the planned trajectory.
 - Previous waypoint: the previous location.
 - Current waypoint: contains the current location, used to filter illegal next waypoints.
 - Next waypoint: contains the next waypoint, and the AUV should go to next waypoint once it arrives at the current one.
+
+The candidates are scored in one batched cost valley lookup. With a lookahead depth d > 1, each candidate is instead
+scored by the cheapest path of d waypoints starting with it, where the later waypoints follow the hexagonal waypoint
+graph with the waypoint distance as spacing. The paths are expanded one level at a time for all of them at once,
+either exhaustively or keeping only the beam_width cheapest ones at each level. A path never revisits a node.
 """
 from CostValley.CostValley import CostValley
+from GRF.ScenarioContext import ScenarioContext
 from Config import Config
+from Field import Field
 from usr_func.is_list_empty import is_list_empty
-from shapely.geometry import Point, LineString
 import numpy as np
 import os
 
@@ -19,17 +25,20 @@ class Myopic2D:
     """
     Myopic2D planner determines the next waypoint according to minimum EIBV criterion.
     """
-    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1.) -> None:
+    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1., context: 'ScenarioContext' = None) -> None:
         # set the directional penalty
         self.__config = Config()
         self.__directional_penalty = False
         print("Directional penalty: ", self.__directional_penalty)
 
         # s0: set up default environment
-        self.__cost_valley = CostValley(weight_eibv=weight_eibv, weight_ivr=weight_ivr)
+        self.__cost_valley = CostValley(weight_eibv=weight_eibv, weight_ivr=weight_ivr, context=context)
         self.__grf = self.__cost_valley.get_grf_model()
         self.__waypoint_distance = self.__config.get_waypoint_distance()
         self.__candidates_angle = np.linspace(0, 2 * np.pi, 7)
+        self.__lookahead_depth = 1  # waypoints scored per candidate path, 1 is the plain myopic strategy.
+        self.__beam_width = None  # paths kept per lookahead level, None to expand all of them.
+        self.__waypoint_graph = None  # hexagonal graph for the lookahead, built when it is first needed.
 
         # s1: add polygon border and polygon obstacles.
         self.__polygon_border = self.__config.get_polygon_border()
@@ -38,6 +47,7 @@ class Myopic2D:
         self.__polygon_obstacle = self.__config.get_polygon_obstacle()
         self.__polygon_obstacle_shapely = self.__config.get_polygon_obstacle_shapely()
         self.__line_obstacle_shapely = self.__config.get_line_obstacle_shapely()
+        self.__field = self.__cost_valley.get_field()
 
         # s2: set up trackers
         self.__wp_curr = self.__config.get_loc_start()
@@ -69,17 +79,20 @@ class Myopic2D:
 
         if not is_list_empty(wp_smooth):
             # get cost associated with those valid candidate locations.
-            costs = []
             self.__loc_cand = wp_smooth
-            for loc in self.__loc_cand:
-                costs.append(self.__cost_valley.get_cost_at_location(loc))
+            costs = np.full(len(wp_smooth), np.inf)
+            if self.__lookahead_depth > 1:
+                costs = self.get_lookahead_costs(np.array(wp_smooth))
+            if not np.any(np.isfinite(costs)):
+                costs = self.__cost_valley.get_cost_at_locations(np.array(wp_smooth))
             wp_next = wp_smooth[np.argmin(costs)]
         else:
             angles = np.linspace(0, 2 * np.pi, 61)
-            for angle in angles:
-                wp_next = self.__wp_curr + self.__waypoint_distance * np.array([np.sin(angle), np.cos(angle)])
-                if self.is_location_legal(wp_next) and self.is_path_legal(self.__wp_curr, wp_next):
-                    break
+            wp_candidates = self.get_waypoints_around(self.__wp_curr, angles)
+            legal = self.is_location_legal_many(wp_candidates) & \
+                self.is_path_legal_many(self.__wp_curr, wp_candidates)
+            # first legal one, or the last one if none of them is legal.
+            wp_next = wp_candidates[np.argmax(legal)] if np.any(legal) else wp_candidates[-1]
 
         self.__wp_next = wp_next
         self.__wp_prev = self.__wp_curr
@@ -111,21 +124,57 @@ class Myopic2D:
         vec1 = self.get_vector_between_two_waypoints(self.__wp_prev, self.__wp_curr)
 
         # s2: get all neighbour waypoints
-        wp_neighbours = []
-        wp_smooth = []
-        for angle in self.__candidates_angle:
-            wp_temp = self.__wp_curr + self.__waypoint_distance * np.array([np.sin(angle), np.cos(angle)])
-            # s3: filter out illegal locations
-            if self.is_location_legal(wp_temp) and self.is_path_legal(self.__wp_curr, wp_temp):
-                wp_neighbours.append(wp_temp)
-                vec2 = self.get_vector_between_two_waypoints(self.__wp_curr, wp_temp)
-                if self.__directional_penalty:
-                    if vec1.T @ vec2 >= 0:
-                        wp_smooth.append(wp_temp)
-                else:
-                    wp_smooth.append(wp_temp)
+        wp_candidates = self.get_waypoints_around(self.__wp_curr, self.__candidates_angle)
+
+        # s3: filter out illegal locations
+        legal = self.is_location_legal_many(wp_candidates) & self.is_path_legal_many(self.__wp_curr, wp_candidates)
+        wp_neighbours = list(wp_candidates[legal])
+        if self.__directional_penalty:
+            vec2 = wp_candidates[legal] - self.__wp_curr
+            wp_smooth = list(wp_candidates[legal][vec2 @ vec1.flatten() >= 0])
+        else:
+            wp_smooth = list(wp_neighbours)
         return wp_smooth, wp_neighbours
 
+    def get_lookahead_costs(self, wp_candidates: np.ndarray) -> np.ndarray:
+        """
+        Return the cost of the cheapest path of lookahead_depth waypoints starting with each candidate, the sum of the
+        costs at its waypoints. Candidates whose paths are all cut off by the border, obstacles or the beam get inf.
+        """
+        # s0: cost at every node of the waypoint graph, in one lookup.
+        graph = self.__waypoint_graph
+        locs_graph = graph.get_grid()
+        cost_graph = self.__cost_valley.get_cost_at_locations(locs_graph)
+
+        # s1: the paths start with the candidates, snapped to the graph for the following steps.
+        cost = self.__cost_valley.get_cost_at_locations(wp_candidates)
+        origin = np.arange(len(wp_candidates))  # candidate each path starts with.
+        locs = wp_candidates
+        visited = graph.get_ind_from_location(wp_candidates).reshape(-1, 1)
+
+        # s2: extend all the paths by one waypoint per level.
+        for i in range(self.__lookahead_depth - 1):
+            pos, ind = graph.get_neighbour_edges(visited[:, -1])
+            legal = ~self.__field.segments_intersect_many(locs[pos], locs_graph[ind])
+            legal &= ~np.any(visited[pos] == ind.reshape(-1, 1), axis=1)
+            pos, ind = pos[legal], ind[legal]
+            cost = cost[pos] + cost_graph[ind]
+            if self.__beam_width is not None and len(cost) > self.__beam_width:
+                beam = np.argpartition(cost, self.__beam_width)[:self.__beam_width]
+                pos, ind, cost = pos[beam], ind[beam], cost[beam]
+            origin = origin[pos]
+            visited = np.hstack((visited[pos], ind.reshape(-1, 1)))
+            locs = locs_graph[ind]
+
+        # s3: the cheapest path of each candidate.
+        costs = np.full(len(wp_candidates), np.inf)
+        np.minimum.at(costs, origin, cost)
+        return costs
+
+    def get_waypoints_around(self, loc: np.ndarray, angles: np.ndarray) -> np.ndarray:
+        """ Return the waypoints one waypoint distance away from loc at the given angles, (N, 2) array. """
+        return loc + self.__waypoint_distance * np.stack((np.sin(angles), np.cos(angles)), axis=1)
+
     def is_location_legal(self, loc: np.ndarray) -> bool:
         """
         Check if the location is legal.
@@ -135,9 +184,8 @@ class Myopic2D:
         Returns:
             True if legal, False if illegal.
         """
-        point = Point(loc[0], loc[1])
-        if self.__polygon_border_shapely.contains(point) and \
-                not self.__polygon_obstacle_shapely.contains(point):
+        if self.__field.border_contains(loc) and \
+                not self.__field.obstacle_contains(loc):
             return True
         else:
             return False
@@ -152,12 +200,35 @@ class Myopic2D:
         Returns:
             True if legal, False if illegal.
         """
-        line = LineString([loc_start, loc_end])
-        if self.__line_border_shapely.intersects(line) or self.__line_obstacle_shapely.intersects(line):
+        if self.__field.is_border_in_the_way(loc_start, loc_end) or \
+                self.__field.is_obstacle_in_the_way(loc_start, loc_end):
             return False
         else:
             return True
 
+    def is_location_legal_many(self, locs: np.ndarray) -> np.ndarray:
+        """ Batch version of is_location_legal, locs: (N, 2) array. """
+        return self.__field.contains_many(locs)
+
+    def is_path_legal_many(self, loc_start: np.ndarray, loc_ends: np.ndarray) -> np.ndarray:
+        """ Batch version of is_path_legal for paths from loc_start to each of loc_ends, (N, 2) array. """
+        loc_ends = np.asarray(loc_ends).reshape(-1, 2)
+        loc_starts = np.tile(np.asarray(loc_start).reshape(1, 2), (len(loc_ends), 1))
+        return ~self.__field.segments_intersect_many(loc_starts, loc_ends)
+
+    def set_lookahead(self, depth: int, beam_width: int = None) -> None:
+        """ Set the lookahead depth in waypoints and the beam width, None to expand all the paths. """
+        self.__lookahead_depth = depth
+        self.__beam_width = beam_width
+        if depth > 1 and self.__waypoint_graph is None:
+            self.__waypoint_graph = Field(neighbour_distance=self.__waypoint_distance)
+
+    def get_lookahead_depth(self) -> int:
+        return self.__lookahead_depth
+
+    def get_beam_width(self) -> int:
+        return self.__beam_width
+
     def get_previous_waypoint(self) -> np.ndarray:
         """ Previous waypoint. """
         return self.__wp_prev
@@ -19,13 +19,17 @@ Date: 2023-08-24
 from Config import Config
 from Planner.RRTSCV.RRTStarCV import RRTStarCV
 from Planner.StraightLinePathPlanner import StraightLinePathPlanner
+from GRF.ScenarioContext import ScenarioContext
 import numpy as np
 
 
 class Planner:
 
-    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1.) -> None:
+    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1., context: 'ScenarioContext' = None,
+                 random_seed: int = None) -> None:
         """ Initial phase
+        - Set up the planners on the shared prior of the scenario context if it is given.
+        - Seed the random locations of RRT* with random_seed.
         - Update the starting location to be loc.
         - Update current waypoint to be starting location.
         - Calculate two steps ahead in the pioneer planning.
@@ -34,7 +38,10 @@ class Planner:
         self.__budget_mode = self.__config.get_budget_mode()
 
         # s1: set up path planning strategies
-        self.__rrtstarcv = RRTStarCV(weight_eibv=weight_eibv, weight_ivr=weight_ivr)
+        self.__rrtstarcv = RRTStarCV(weight_eibv=weight_eibv, weight_ivr=weight_ivr, context=context,
+                                     random_seed=random_seed)
+        self.__rrtstarcv.set_waypoint_callback(self.__set_pioneer_waypoint)  # improvements from anytime rrt*.
+        self.__num_published = 0  # pioneer waypoints published by anytime rrt* so far.
         self.__stepsize = self.__rrtstarcv.get_stepsize()
         self.__slpp = StraightLinePathPlanner()
 
@@ -69,6 +76,7 @@ class Planner:
 
     def update_planning_trackers(self) -> None:
         """ Move the pointer one step ahead. """
+        self.__rrtstarcv.stop_improvement()
         self.__wp_now = self.__wp_next
         self.__wp_next = self.__wp_pion
         self.__trajectory.append([self.__wp_now[0], self.__wp_now[1]])
@@ -85,6 +93,7 @@ class Planner:
             ctd_data: (t, x, y, sal)
         """
         # s1: assimilate data to the kernel.
+        self.__rrtstarcv.stop_improvement()
         self.__grf.assimilate_temporal_data(ctd_data)
 
         # s2: update cost valley
@@ -102,9 +111,22 @@ class Planner:
         else:
             self.__wp_pion = self.__rrtstarcv.get_next_waypoint(self.__wp_next, self.__wp_min_cv)
 
+    def __set_pioneer_waypoint(self, wp: np.ndarray, cost: float) -> None:
+        """ Take the pioneer waypoint from anytime rrt* every time it finds a cheaper trajectory. """
+        self.__wp_pion = wp
+        self.__num_published += 1
+
+    def set_pioneer_waypoint(self, wp: np.ndarray) -> None:
+        """ Override the pioneer waypoint, e.g. with a fallback when the planning is late. """
+        self.__wp_pion = wp
+
     def get_pioneer_waypoint(self) -> np.ndarray:
         return self.__wp_pion
 
+    def get_num_published(self) -> int:
+        """ Return the number of pioneer waypoints published by anytime rrt* so far. """
+        return self.__num_published
+
     def get_next_waypoint(self) -> np.ndarray:
         return self.__wp_next
 
@@ -0,0 +1,146 @@
+"""
+MultiTreeRRTStarCV grows several independent RRT* trees in parallel and keeps the cheapest trajectory.
+
+RRT* results vary a lot with the random draw of the sampling locations, and one tree only uses one core. Here K trees
+are grown from different seeds, one per worker process, within the same time budget as a single tree.
+- The workers are forked from the planner, so each of them starts with its own copy of it.
+- The cost valley raster is moved into shared memory before forking, so the workers read the updated cost valley in
+place. Only the locations, the seed, the budget and the iteration settings are sent with every call.
+- Each worker seeds the draw of RRT_Random_Locations.npy with its own seed.
+"""
+from Planner.RRTSCV.RRTStarCV import RRTStarCV
+from Config import Config
+from multiprocessing import get_context
+from time import time
+import numpy as np
+import os
+
+
+_planner = None  # planner in the worker processes, inherited when the pool is forked.
+
+
+def _init_worker() -> None:
+    """ Workers only return their trajectories, they do not expand in the background or publish waypoints. """
+    _planner.set_background_improvement(False)
+    _planner.set_waypoint_callback(None)
+
+
+def _grow_tree(task: tuple) -> tuple:
+    """ Grow one tree in a worker and return its waypoint, trajectory, cost and number of iterations. """
+    loc_start, loc_target, seed, budget, time_budget, max_expansion_iteration = task
+    if budget is not None:
+        _planner.set_Budget(budget)
+    _planner.set_time_budget(time_budget)
+    _planner.set_max_expansion_iteraions(max_expansion_iteration)
+    _planner.set_random_seed(seed)
+    wp = _planner.get_next_waypoint(loc_start, loc_target)
+    log = _planner.get_planning_log()[-1]
+    return wp, _planner.get_trajectory(), log["cost"], log["iterations"]
+
+
+class MultiTreeRRTStarCV:
+    """ Best of K RRT* trees grown in a process pool. """
+    def __init__(self, rrtstar: 'RRTStarCV' = None, num_trees: int = None) -> None:
+        self.__config = Config()
+        self.__budget_mode = self.__config.get_budget_mode()
+        self.__rrtstar = rrtstar if rrtstar is not None else RRTStarCV()
+        self.__num_trees = num_trees if num_trees is not None else os.cpu_count()
+        self.__pool = None
+        self.__seed = 0  # seed of the first tree in the next call, the trees use consecutive seeds.
+        self.__costs = np.empty(0)  # trajectory costs of all the trees in the last call.
+        self.__iterations = np.empty(0)  # iterations of all the trees in the last call.
+        self.__trajectory = np.empty([0, 2])
+        self.__cost_trajectory = np.inf
+        self.__planning_log = []  # time, iterations and cost spread per call.
+
+    def start(self) -> None:
+        """
+        Share the cost valley raster and fork the workers. The planner settings are copied to the workers at this
+        point, except for the time budget and the iterations, which are sent with every call.
+        The background improvement of the planner is stopped first, so no thread is expanding the tree at the fork.
+        """
+        global _planner
+        if self.__pool is not None:
+            return
+        self.__rrtstar.stop_improvement()
+        self.__rrtstar.get_CostValley().get_cost_raster().share()
+        _planner = self.__rrtstar
+        self.__pool = get_context("fork").Pool(self.__num_trees, initializer=_init_worker)
+
+    def close(self) -> None:
+        """ Stop the workers and free the shared raster. """
+        global _planner
+        if self.__pool is None:
+            return
+        self.__pool.terminate()
+        self.__pool.join()
+        self.__pool = None
+        _planner = None
+        self.__rrtstar.get_CostValley().get_cost_raster().release()
+
+    def get_next_waypoint(self, loc_start: np.ndarray, loc_target: np.ndarray) -> np.ndarray:
+        """
+        Grow num_trees trees from loc_start to loc_target and return the next waypoint of the cheapest trajectory.
+        The cost valley must not be updated while the trees grow.
+
+        The time budget of the planner applies to each tree, not to the first call, which also forks the workers
+        and, with numba, compiles the path integral in each of them, about 4.5 s more. Call start beforehand to
+        keep that out of the first plan.
+        """
+        t_start = time()
+        self.start()
+
+        # s1: grow the trees in parallel from consecutive seeds.
+        budget = self.__rrtstar.get_CostValley().get_Budget() if self.__budget_mode else None
+        tasks = [(loc_start, loc_target, self.__seed + i, budget, self.__rrtstar.get_time_budget(),
+                  self.__rrtstar.get_max_expansion_iteraions()) for i in range(self.__num_trees)]
+        self.__seed += self.__num_trees
+        results = self.__pool.map(_grow_tree, tasks)
+
+        # s2: keep the cheapest trajectory.
+        self.__costs = np.array([result[2] for result in results])
+        self.__iterations = np.array([result[3] for result in results])
+        ind = int(np.argmin(self.__costs))
+        wp_next, self.__trajectory, self.__cost_trajectory = results[ind][:3]
+        cost_min, cost_median, cost_max = self.get_cost_spread()
+        self.__planning_log.append({"time": time() - t_start, "iterations": int(np.sum(self.__iterations)),
+                                    "cost": float(cost_min), "cost_median": float(cost_median),
+                                    "cost_max": float(cost_max)})
+        return wp_next
+
+    def set_num_trees(self, value: int) -> None:
+        """ Set the number of trees, the workers are forked again on the next call. """
+        self.close()
+        self.__num_trees = value
+
+    def set_seed(self, value: int) -> None:
+        """ Set the seed of the first tree in the next call. """
+        self.__seed = value
+
+    def get_num_trees(self) -> int:
+        return self.__num_trees
+
+    def get_costs(self) -> np.ndarray:
+        """ Return the trajectory costs of all the trees in the last call, inf for trees that missed the target. """
+        return self.__costs
+
+    def get_iterations(self) -> np.ndarray:
+        """ Return the expansion iterations of all the trees in the last call. """
+        return self.__iterations
+
+    def get_cost_spread(self) -> tuple:
+        """ Return the minimum, median and maximum trajectory cost of the last call. """
+        return np.amin(self.__costs), np.median(self.__costs), np.amax(self.__costs)
+
+    def get_planning_log(self) -> list:
+        """ Return time, iterations over all the trees, and minimum, median and maximum trajectory cost per call. """
+        return self.__planning_log
+
+    def get_trajectory(self) -> np.ndarray:
+        return self.__trajectory
+
+    def get_cost_along_trajectory(self) -> float:
+        return self.__cost_trajectory
+
+    def get_rrtstarcv(self) -> 'RRTStarCV':
+        return self.__rrtstar
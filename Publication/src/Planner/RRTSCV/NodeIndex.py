@@ -0,0 +1,86 @@
+"""
+NodeIndex answers nearest-node and radius queries for the RRT* tree in sub-linear time.
+
+Tree nodes are only ever appended and never move, so the index is a KD-tree built over the first part of the nodes
+plus a small unindexed tail of the latest ones:
+- queries go to the KD-tree and a brute-force pass over the tail.
+- once the tail grows beyond a fraction of the indexed part, the KD-tree is rebuilt over all nodes.
+The geometric rebuild policy keeps the total rebuild cost at O(n log n) for n insertions.
+
+Every node is added with an integer id, its insertion index by default, and queries return these ids.
+"""
+from scipy.spatial import cKDTree
+import numpy as np
+
+
+class NodeIndex:
+    """
+    Incremental spatial index over 2D node locations.
+    """
+    def __init__(self, capacity: int = 2048, rebuild_ratio: float = .25, min_tail: int = 64) -> None:
+        self.__locations = np.empty([capacity, 2])
+        self.__ids = np.empty(capacity, dtype=int)
+        self.__size = 0
+        self.__rebuild_ratio = rebuild_ratio
+        self.__min_tail = min_tail
+        self.__tree = None
+        self.__size_indexed = 0
+
+    def clear(self) -> None:
+        """ Remove all nodes from the index. """
+        self.__size = 0
+        self.__tree = None
+        self.__size_indexed = 0
+
+    def add(self, loc: np.ndarray, ind: int = None) -> int:
+        """ Add a node location with id ind and return its id. """
+        if self.__size == self.__locations.shape[0]:
+            locations = np.empty([2 * self.__locations.shape[0], 2])
+            locations[:self.__size] = self.__locations[:self.__size]
+            self.__locations = locations
+            ids = np.empty(2 * self.__ids.shape[0], dtype=int)
+            ids[:self.__size] = self.__ids[:self.__size]
+            self.__ids = ids
+        self.__locations[self.__size] = loc
+        self.__ids[self.__size] = self.__size if ind is None else ind
+        self.__size += 1
+        if self.__size - self.__size_indexed > max(self.__min_tail, self.__rebuild_ratio * self.__size_indexed):
+            self.__tree = cKDTree(self.__locations[:self.__size])
+            self.__size_indexed = self.__size
+        return int(self.__ids[self.__size - 1])
+
+    def get_nearest(self, loc: np.ndarray) -> int:
+        """ Return the id of the node closest to loc. """
+        ind_best = -1
+        dist_best = np.inf
+        if self.__tree is not None:
+            dist_best, ind_best = self.__tree.query(loc)
+        if self.__size > self.__size_indexed:
+            tail = self.__locations[self.__size_indexed:self.__size]
+            dist = np.sqrt((tail[:, 0] - loc[0]) ** 2 + (tail[:, 1] - loc[1]) ** 2)
+            ind_tail = np.argmin(dist)
+            if dist[ind_tail] < dist_best:
+                ind_best = self.__size_indexed + ind_tail
+        return int(self.__ids[ind_best])
+
+    def get_within(self, loc: np.ndarray, radius: float) -> np.ndarray:
+        """ Return the ids of the nodes within radius of loc, in insertion order. """
+        ind = np.empty(0, dtype=int)
+        if self.__tree is not None:
+            ind = np.asarray(self.__tree.query_ball_point(loc, radius, return_sorted=True), dtype=int)
+        if self.__size > self.__size_indexed:
+            tail = self.__locations[self.__size_indexed:self.__size]
+            dist = np.sqrt((tail[:, 0] - loc[0]) ** 2 + (tail[:, 1] - loc[1]) ** 2)
+            ind = np.append(ind, self.__size_indexed + np.where(dist <= radius)[0])
+        return self.__ids[ind]
+
+    def get_locations(self) -> np.ndarray:
+        """ Return the locations of all the nodes in the index. """
+        return self.__locations[:self.__size]
+
+    def get_ids(self) -> np.ndarray:
+        """ Return the ids of all the nodes in the index, in insertion order. """
+        return self.__ids[:self.__size]
+
+    def __len__(self) -> int:
+        return self.__size
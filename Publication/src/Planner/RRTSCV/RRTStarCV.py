@@ -7,21 +7,27 @@ Author: Yaolin Ge
 Email: geyaolin@gmail.com
 Date: 2023-08-24
 """
-from Planner.RRTSCV.TreeNode import TreeNode
+from Planner.RRTSCV.TreeStore import TreeStore, TreeNodeView
+from Planner.RRTSCV.NodeIndex import NodeIndex
 from Field import Field
 from Config import Config
 from CostValley.CostValley import CostValley
+from GRF.ScenarioContext import ScenarioContext
 import numpy as np
 import os
 from time import time
+from threading import Thread, Event
 from shapely.geometry import Polygon, Point, LineString
+import shapely
 
 
 class RRTStarCV:
     """ RRT* CV planning strategy """
-    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1.) -> None:
+    def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1., context: 'ScenarioContext' = None,
+                 random_seed: int = None) -> None:
         """
-        Initialize the planner.
+        Initialize the planner, on the shared prior of the scenario context if it is given.
+        The random locations are drawn from the planner's own generators seeded with random_seed, see set_random_seed.
         """
         self.__config = Config()
         self.__budget_mode = self.__config.get_budget_mode()
@@ -33,9 +39,12 @@ class RRTStarCV:
         self.__random_locations = np.load(self.__filepath + "RRT_Random_Locations.npy")
         self.__goal_indices = np.load(self.__filepath + "Goal_indices.npy")
         self.__N_random_locations = len(self.__random_locations)
+        self.__rng = None  # draws of the planning calls.
+        self.__rng_background = None  # draws of the background improvement, so they never shift the planning calls.
+        self.set_random_seed(random_seed)
 
         """ Cost valley """
-        self.__cost_valley = CostValley(weight_eibv=weight_eibv, weight_ivr=weight_ivr)
+        self.__cost_valley = CostValley(weight_eibv=weight_eibv, weight_ivr=weight_ivr, context=context)
 
         # loc
         loc_start = self.__config.get_loc_start()
@@ -44,7 +53,8 @@ class RRTStarCV:
         self.__loc_new = loc_start
 
         # tree
-        self.__nodes = []  # all nodes in the tree.
+        self.__tree = TreeStore()  # all nodes in the tree, each node is a row index into the store.
+        self.__node_index = NodeIndex()  # spatial index over the nodes that new nodes can connect to.
         self.__trajectory = np.empty([0, 2])  # to save trajectory.
         self.__cost_trajectory = .0  # cost along the trajectory.
         self.__distance_trajectory = .0  # distance along the trajectory.
@@ -53,6 +63,20 @@ class RRTStarCV:
         self.__stepsize = self.__field.get_neighbour_distance() * 1  # hard-coded values, need to be checked.
         self.__home_radius = self.__stepsize * .8
         self.__rrtstar_neighbour_radius = self.__stepsize * 1.12
+        self.__cost_propagation = True  # push rewiring cost changes down to the descendants.
+        self.__edge_cost_samples = 5  # samples along each edge for the cost valley path integral.
+        self.__informed_sampling = False  # sample inside the informed ellipse once the target is reached.
+        self.__cost_rate_min = .0  # lower bound of the cost per metre of any path, for the informed ellipse.
+        self.__warm_start = False  # reuse the previous tree instead of growing a new one for every waypoint.
+        self.__warm_start_iteration = self.__max_expansion_iteration // 4  # expansion iterations on a reused tree.
+        self.__time_budget = None  # anytime mode: seconds per call to stop expanding after, None for no deadline.
+        self.__background_improvement = True  # anytime mode: keep expanding after the deadline until stopped.
+        self.__waypoint_callback = None  # called with (waypoint, cost) every time the anytime planner improves.
+        self.__improvement = None  # background improvement thread.
+        self.__stop = Event()  # set to stop the background improvement.
+        self.__cancelled = Event()  # set to stop any expansion, foreground included, until it is cleared.
+        self.__planning_log = []  # iterations and cost per call.
+        self.__cost_published = np.inf  # cost of the last trajectory passed to the waypoint callback.
 
         # polygons and lines
         self.__polygon_border_shapely = self.__config.get_polygon_border_shapely()
@@ -63,13 +87,12 @@ class RRTStarCV:
 
         self.__polygon_ellipse_shapely = None  # budget
         self.__line_ellipse_shapely = None
-
-        # nodes
-        self.__starting_node = TreeNode(self.__loc_start)
-        self.__target_node = TreeNode(self.__loc_target)
+        # nodes, as indices in the tree store.
+        self.__starting_node = 0
+        self.__target_node = 1
         self.__nearest_node = None
         self.__new_node = None
-        self.__neighbour_nodes = []
+        self.__neighbour_nodes = np.empty(0, dtype=int)
 
         # field
         self.__xlim, self.__ylim = self.__field.get_border_limits()
@@ -84,29 +107,65 @@ class RRTStarCV:
         :param loc_target: minimum cost location, np.array([x, y])
         :param cost_valley: cost valley contains the cost field.
         :return next waypoint: np.array([x, y])
+
+        In anytime mode, see set_time_budget, the tree is expanded until the deadline or the iterations run out,
+        whichever comes first, and the best trajectory so far is used. The target keeps its cheapest connection, and
+        every improvement is published to the waypoint callback. Any iterations left are run in the background until
+        they run out, stop_improvement is called, or the cost valley is updated.
         """
         t_start = time()
-        # s0: clean all nodes
-        self.__nodes = []
-
-        # s1: set starting location and target location in rrt*.
-        self.__loc_start = loc_start
-        self.__loc_target = loc_target
-        self.__starting_node = TreeNode(self.__loc_start)
-        self.__target_node = TreeNode(self.__loc_target)
+        self.stop_improvement()
+        deadline = t_start + self.__time_budget if self.__time_budget is not None else None
+        self.__cost_published = np.inf
+        cost_valley_min = np.amin(self.__cost_valley.get_cost_raster().get_raster())
+        self.__cost_rate_min = 1 / self.__stepsize + max(cost_valley_min, 0)  # bounds the informed ellipse.
 
-        # s12: update budget properties.
+        # s0: update budget properties.
         if self.__budget_mode:
             self.__polygon_ellipse_shapely = self.__Budget.get_polygon_ellipse()
             self.__line_ellipse_shapely = self.__Budget.get_line_ellipse()
+            shapely.prepare(self.__polygon_ellipse_shapely)
+            shapely.prepare(self.__line_ellipse_shapely)
+
+        # s1: set starting location and target location in rrt*, on the previous tree if it can be reused.
+        self.__loc_start = loc_start
+        self.__loc_target = loc_target
+        if self.__warm_start and self.__reuse_tree():
+            max_expansion_iteration = self.__warm_start_iteration
+        else:
+            self.__tree.clear()
+            self.__node_index.clear()
+            self.__starting_node = self.__tree.add(self.__loc_start)
+            self.__target_node = self.__tree.add(self.__loc_target)
+            self.__node_index.add(self.__loc_start, self.__starting_node)
+            max_expansion_iteration = self.__max_expansion_iteration
 
         # s2: expand the trees.
-        self.__expand_trees()
+        num_iterations = self.__expand_trees(max_expansion_iteration, deadline=deadline)
 
         # s3: get shortest trajectory.
         self.__get_shortest_trajectory()
 
-        # s4: get the next possible waypoint out of trajectory.
+        # s4: get the next waypoint.
+        wp_next = self.__get_waypoint()
+        t_end = time()
+        cost = self.__cost_trajectory if self.__tree.get_parent()[self.__target_node] >= 0 else np.inf
+        self.__planning_log.append({"time": t_end - t_start, "iterations": num_iterations,
+                                    "iterations_background": 0, "cost": float(cost)})
+        print("RRT* time: ", t_end - t_start, "s, iterations: ", num_iterations, ", cost: ", cost)
+
+        # s5: keep improving in the background with the iterations left.
+        if (deadline is not None and self.__background_improvement and num_iterations < max_expansion_iteration and
+                not self.__cancelled.is_set()):
+            self.__improvement = Thread(target=self.__improve, daemon=True,
+                                        args=(max_expansion_iteration - num_iterations, self.__planning_log[-1]))
+            self.__improvement.start()
+        return wp_next
+
+    def __get_waypoint(self) -> np.ndarray:
+        """ Get the next waypoint one step along the trajectory from the starting location. """
+        # s1: get the next possible waypoint out of trajectory.
+        loc_start = self.__loc_start
         path_mc = np.array(self.__trajectory)
         if len(path_mc) <= 2:
             loc_next = self.__loc_target
@@ -118,134 +177,318 @@ class RRTStarCV:
         x = loc_start[0] + self.__stepsize * np.sin(angle)
         wp_next = np.array([x, y])
 
-        # s5: final check legal condition, if not produce a random next location.
+        # s2: final check legal condition, if not produce a random next location.
         if not self.is_location_legal(wp_next) or not self.is_path_legal(loc_start, wp_next):
             angles = np.linspace(0, 2 * np.pi, 60)
-            for angle in angles:
-                x_next = loc_start[0] + self.__stepsize * np.cos(angle)
-                y_next = loc_start[1] + self.__stepsize * np.sin(angle)
-                ln = np.array([x_next, y_next])
-                if self.is_location_legal(ln) and self.is_path_legal(loc_start, ln):
-                    wp_next = ln
-                    break
-        t_end = time()
-        print("RRT* time: ", t_end - t_start, "s")
+            x_next = loc_start[0] + self.__stepsize * np.cos(angles)
+            y_next = loc_start[1] + self.__stepsize * np.sin(angles)
+            ln = np.stack((x_next, y_next), axis=1)
+            legal = self.is_location_legal_many(ln) & self.is_path_legal_many(np.tile(loc_start, (len(ln), 1)), ln)
+            if np.any(legal):
+                wp_next = ln[np.argmax(legal)]
         return wp_next
 
-    def __expand_trees(self):
-        # start by appending the starting node to the nodes list.
-        self.__nodes.append(self.__starting_node)
+    def __improve(self, max_expansion_iteration: int, record: dict) -> None:
+        """ Expand the tree in the background on the cost valley it was planned on. """
+        record["iterations_background"] = self.__expand_trees(max_expansion_iteration,
+                                                              version=self.__cost_valley.get_version(),
+                                                              rng=self.__rng_background)
+        record["cost_background"] = self.__cost_published
+
+    def stop_improvement(self) -> None:
+        """ Stop the background improvement if it is running, and wait for it to finish. """
+        if self.__improvement is not None:
+            self.__stop.set()
+            self.__improvement.join()
+            self.__improvement = None
+        self.__stop.clear()
+
+    def __publish_waypoint(self) -> None:
+        """
+        Once the target is reached at a lower cost, by a new connection or by rewiring upstream, update the trajectory
+        and pass its waypoint to the callback.
+        """
+        if self.__tree.get_parent()[self.__target_node] < 0:
+            return
+        if self.__tree.get_cost()[self.__target_node] < self.__cost_published:
+            self.__get_shortest_trajectory()
+            self.__cost_published = float(self.__cost_trajectory)
+            if self.__waypoint_callback is not None:
+                self.__waypoint_callback(self.__get_waypoint(), self.__cost_published)
+
+    def __reuse_tree(self) -> bool:
+        """
+        Warm start from the tree of the previous waypoint.
+        - Re-root the previous tree at its node nearest to the new starting location, by reversing the parents on
+        the path to the old root, and hang it below the new starting node.
+        - Prune the nodes that are illegal or out of budget now, or whose edge to their parent is, together with
+        their subtrees. The old target node is dropped.
+        - Compact the remaining nodes in breadth first order, at most max_expansion_iteration of them, and recompute
+        their costs against the updated cost valley one tree level at a time.
+        - Connect the new target to the cheapest node within the home radius, if any.
+        Return False if there is no tree to reuse or the new starting location cannot reach it.
+        """
+        if len(self.__node_index) < 2:
+            return False
+        x, y = np.array(self.__tree.get_x()), np.array(self.__tree.get_y())
+        parent = np.array(self.__tree.get_parent())
+        target_old = self.__target_node
+
+        # s1: re-root at the nearest node, its parent is the new starting node, -1 in the old indices.
+        ind_root = self.__node_index.get_nearest(self.__loc_start)
+        node, child = ind_root, -1
+        while node >= 0:
+            node_next = parent[node]
+            parent[node] = child
+            child, node = node, node_next
+
+        # s2: prune level by level, keeping parents before their children.
+        levels = []
+        cnt = 0
+        frontier = np.array([ind_root])
+        while len(frontier) > 0 and cnt < self.__max_expansion_iteration:
+            locs = np.stack((x[frontier], y[frontier]), axis=1)
+            par = parent[frontier]
+            locs_parent = np.where((par < 0).reshape(-1, 1), self.__loc_start, np.stack((x[par], y[par]), axis=1))
+            legal = self.is_location_legal_many(locs) & self.is_path_legal_many(locs_parent, locs)
+            frontier = frontier[legal][:self.__max_expansion_iteration - cnt]
+            levels.append(frontier)
+            cnt += len(frontier)
+            frontier = np.where(np.isin(parent, frontier))[0]
+            frontier = frontier[frontier != target_old]
+        if cnt == 0:
+            return False
 
+        # s3: compact into the store, the starting node and the target node come first as in a cold start.
+        kept = np.concatenate(levels)
+        ind_new = np.full(len(parent), -1)
+        ind_new[kept] = np.arange(2, 2 + len(kept))
+        parent_new = np.where(parent[kept] < 0, 0, ind_new[parent[kept]])
+        self.__tree.clear()
+        self.__node_index.clear()
+        self.__starting_node = self.__tree.add(self.__loc_start)
+        self.__target_node = self.__tree.add(self.__loc_target)
+        self.__tree.add_many(np.stack((x[kept], y[kept]), axis=1), .0, parent_new)
+        self.__node_index.add(self.__loc_start, self.__starting_node)
+        for ind in ind_new[kept]:
+            self.__node_index.add(self.__tree.get_location(ind), ind)
+
+        # s4: recompute costs from the root down.
+        x, y = self.__tree.get_x(), self.__tree.get_y()
+        cost = self.__tree.get_cost()
+        parent = self.__tree.get_parent()
+        for level in levels:
+            ind = ind_new[level]
+            par = parent[ind]
+            locs = np.stack((x[ind], y[ind]), axis=1)
+            locs_parent = np.stack((x[par], y[par]), axis=1)
+            dist = np.sqrt(np.sum((locs - locs_parent) ** 2, axis=1))
+            cost_costvalley = self.__cost_valley.get_cost_along_paths(locs_parent, locs, self.__edge_cost_samples)
+            self.__tree.set_cost(ind, cost[par] + dist / self.__stepsize + cost_costvalley)
+
+        # s5: connect the target to the tree if it is already within reach.
+        ind = ind_new[kept]
+        dist = np.sqrt((x[ind] - self.__loc_target[0]) ** 2 + (y[ind] - self.__loc_target[1]) ** 2)
+        ind = ind[dist < self.__home_radius]
+        if len(ind) > 0:
+            cost_via = cost[ind] + self.__get_edge_costs(ind, self.__target_node)
+            self.__tree.set_parent(self.__target_node, ind[np.argmin(cost_via)])
+            self.__tree.set_cost(self.__target_node, np.amin(cost_via))
+        return True
+
+    def __expand_trees(self, max_expansion_iteration: int, deadline: float = None, version: int = None,
+                       rng: 'np.random.Generator' = None) -> int:
+        """
+        Expand the tree for max_expansion_iteration iterations. Stop early at the deadline, when stop_improvement is
+        called, or when the cost valley is no longer at version. Return the number of iterations run.
+        The random locations are drawn from rng, the generator of the planning calls by default.
+        """
         # s0: select a chunk of random locations.
-        ind_selected = np.random.randint(0, self.__N_random_locations, self.__max_expansion_iteration)
+        rng = rng if rng is not None else self.__rng
+        ind_selected = rng.integers(0, self.__N_random_locations, max_expansion_iteration)
         x_random = self.__random_locations[ind_selected, 0]
         y_random = self.__random_locations[ind_selected, 1]
         goal_indices = self.__goal_indices[ind_selected]
+        if self.__informed_sampling:
+            u_informed = rng.random(max_expansion_iteration)
+            cost_informed = np.inf
+            locations_informed = self.__random_locations
 
-        for i in range(self.__max_expansion_iteration):
+        for i in range(max_expansion_iteration):
             # print("tree: ", i)
-
-            # s1: get new location.
+            if self.__time_budget is not None:
+                self.__publish_waypoint()
+            if (self.__stop.is_set() or self.__cancelled.is_set() or
+                    (deadline is not None and time() >= deadline) or
+                    (version is not None and version != self.__cost_valley.get_version())):
+                return i
+
+            # s1: get new location, inside the informed ellipse once the target is reached.
             if goal_indices[i] <= self.__goal_sampling_rate:
                 self.__loc_new = self.__loc_target
+            elif self.__informed_sampling and self.__tree.get_parent()[self.__target_node] >= 0:
+                if self.__tree.get_cost()[self.__target_node] < cost_informed:
+                    cost_informed = self.__tree.get_cost()[self.__target_node]
+                    locations_informed = self.__get_informed_locations(cost_informed)
+                self.__loc_new = locations_informed[int(u_informed[i] * len(locations_informed))]
             else:
                 self.__loc_new = np.array([x_random[i], y_random[i]])
 
             # s2: get nearest node to the current location.
-            self.__get_nearest_node()
+            self.__nearest_node = self.__node_index.get_nearest(self.__loc_new)
 
             # s3: steer new location to get the nearest tree node to this new location.
-            if TreeNode.get_distance_between_nodes(self.__nearest_node, self.__new_node) > self.__stepsize:
-                xn, yn = self.__nearest_node.get_location()
+            xn = self.__tree.get_x()[self.__nearest_node]
+            yn = self.__tree.get_y()[self.__nearest_node]
+            loc = self.__loc_new
+            if np.sqrt((loc[0] - xn) ** 2 + (loc[1] - yn) ** 2) > self.__stepsize:
                 angle = np.math.atan2(self.__loc_new[0] - xn,
                                       self.__loc_new[1] - yn)
                 y = yn + self.__stepsize * np.cos(angle)
                 x = xn + self.__stepsize * np.sin(angle)
                 loc = np.array([x, y])
-                self.__new_node = TreeNode(loc, parent=self.__nearest_node)
 
             # s4: check if it is colliding.
-            if not self.is_location_legal(self.__new_node.get_location()):
+            if not self.is_location_legal(loc):
                 continue
+            self.__new_node = self.__tree.add(loc, parent=self.__nearest_node)
 
             # s5: rewire trees in the neighbourhood.
-            self.__rewire_trees()
+            has_children = self.__rewire_trees()
 
             # s6: check path possibility.
-            if not self.is_path_legal(self.__nearest_node.get_location(),
-                                      self.__new_node.get_location()):
+            if not self.is_path_legal(self.__tree.get_location(self.__nearest_node), loc):
+                if not has_children:
+                    self.__tree.pop()
                 continue
 
-            # s7: check connection to the goal node.
+            # s7: check connection to the goal node, in anytime mode only if it is cheaper.
             if self.__isarrived():
-                self.__target_node.set_parent(self.__new_node)
-                self.__target_node.set_cost(self.__get_cost_between_nodes(self.__target_node, self.__new_node))
+                cost = self.__get_cost_between_nodes(self.__new_node, self.__target_node)
+                if self.__time_budget is None:
+                    self.__tree.set_parent(self.__target_node, self.__new_node)
+                    self.__tree.set_cost(self.__target_node, cost)
+                elif (self.__tree.get_parent()[self.__target_node] < 0 or
+                      cost < self.__tree.get_cost()[self.__target_node]):
+                    self.__tree.set_parent(self.__target_node, self.__new_node)
+                    self.__tree.set_cost(self.__target_node, cost)
             else:
-                self.__nodes.append(self.__new_node)
-
-    def __get_nearest_node(self) -> None:
-        """ Return nearest node in the tree graph, only use distance. """
-        dist = []
-        self.__new_node = TreeNode(self.__loc_new)
-        for node in self.__nodes:
-            dist.append(TreeNode.get_distance_between_nodes(node, self.__new_node))
-        self.__nearest_node = self.__nodes[dist.index(min(dist))]
-        self.__new_node.set_parent(self.__nearest_node)
-
-    def __rewire_trees(self):
-        # s1: find cheapest node.
-        self.__get_neighbour_nodes()
-        for node in self.__neighbour_nodes:
-            if (self.__get_cost_between_nodes(node, self.__new_node) <
-                    self.__get_cost_between_nodes(self.__nearest_node, self.__new_node)):
-                self.__nearest_node = node
+                self.__node_index.add(loc, self.__new_node)
+        if self.__time_budget is not None:
+            self.__publish_waypoint()
+        return max_expansion_iteration
 
-            self.__new_node.set_parent(self.__nearest_node)
-            self.__new_node.set_cost(self.__get_cost_between_nodes(self.__nearest_node, self.__new_node))
+    def __get_informed_locations(self, cost_best: float) -> np.ndarray:
+        """
+        Return the pregenerated random locations that can lie on a path cheaper than cost_best, so the sampling
+        stays within the legal area.
+        Any path costs at least cost_rate_min per metre, distance cost plus the lowest cost valley value, so it is at
+        most cost_best / cost_rate_min long. The paths from start to target through a location are then bounded by
+        the ellipse with the start and the target as foci and that length as major axis.
+        """
+        length_max = cost_best / self.__cost_rate_min
+        locs = self.__random_locations
+        dist = (np.sqrt((locs[:, 0] - self.__loc_start[0]) ** 2 + (locs[:, 1] - self.__loc_start[1]) ** 2) +
+                np.sqrt((locs[:, 0] - self.__loc_target[0]) ** 2 + (locs[:, 1] - self.__loc_target[1]) ** 2))
+        locs = locs[dist <= length_max]
+        return locs if len(locs) > 0 else self.__random_locations
+
+    def __rewire_trees(self) -> bool:
+        """
+        Connect the new node to its cheapest neighbour and reconnect the neighbours that get cheaper through the new
+        node. All edge costs between the new node and its neighbours are computed in one batch.
+        Return True if any neighbour is reconnected to the new node.
+        """
+        # s0: edge costs between the new node and the nearest node followed by all the neighbours.
+        self.__get_neighbour_nodes()
+        if len(self.__neighbour_nodes) == 0:
+            return False
+        cost = self.__tree.get_cost()
+        ind_new = self.__new_node
+        candidates = np.append(self.__nearest_node, self.__neighbour_nodes)
+        cost_edges = self.__get_edge_costs(candidates, ind_new)
+
+        # s1: find cheapest node, ties go to the nearest node and then to the oldest neighbour.
+        cost_via_candidates = cost[candidates] + cost_edges
+        ind_best = np.argmin(cost_via_candidates)
+        self.__nearest_node = candidates[ind_best]
+        self.__tree.set_parent(ind_new, self.__nearest_node)
+        self.__tree.set_cost(ind_new, cost_via_candidates[ind_best])
 
         # s2: update other nodes.
-        for node in self.__neighbour_nodes:
-            cost_current_neighbour = self.__get_cost_between_nodes(self.__new_node, node)
-            if cost_current_neighbour < node.get_cost():
-                node.set_cost(cost_current_neighbour)
-                node.set_parent(self.__new_node)
+        cost_neighbours = cost[ind_new] + cost_edges[1:]
+        improved = cost_neighbours < cost[self.__neighbour_nodes]
+        if not np.any(improved):
+            return False
+        ind_improved = self.__neighbour_nodes[improved]
+        delta = cost_neighbours[improved] - cost[ind_improved]
+        self.__tree.set_cost(ind_improved, cost_neighbours[improved])
+        self.__tree.set_parent(ind_improved, ind_new)
+        if self.__cost_propagation:
+            self.__propagate_cost(ind_improved, delta)
+        return True
+
+    def __get_edge_costs(self, ind_from: np.ndarray, ind_to: int) -> np.ndarray:
+        """
+        Return the pure edge costs, distance cost plus cost valley cost, of the edges from nodes ind_from to node
+        ind_to in one batch.
+        """
+        x, y = self.__tree.get_x(), self.__tree.get_y()
+        dist = np.sqrt((x[ind_from] - x[ind_to]) ** 2 + (y[ind_from] - y[ind_to]) ** 2)
+        locs_from = np.stack((x[ind_from], y[ind_from]), axis=1)
+        cost_costvalley = self.__cost_valley.get_cost_along_paths(locs_from, self.__tree.get_location(ind_to),
+                                                                  self.__edge_cost_samples)
+        return dist / self.__stepsize + cost_costvalley
+
+    def __propagate_cost(self, ind: np.ndarray, delta: np.ndarray) -> None:
+        """
+        Shift the cost of all the descendants of nodes ind by their cost changes delta, one tree level at a time.
+        """
+        parent = self.__tree.get_parent()
+        cost = self.__tree.get_cost()
+        shift = np.zeros(len(parent))
+        shift[ind] = delta
+        frontier = ind
+        for i in range(len(parent)):
+            children = np.where(np.isin(parent, frontier))[0]
+            if len(children) == 0:
+                break
+            shift[children] = shift[parent[children]]
+            self.__tree.set_cost(children, cost[children] + shift[children])
+            frontier = children
 
     def __get_neighbour_nodes(self):
-        distance_between_nodes = []
-        for node in self.__nodes:
-            distance_between_nodes.append(TreeNode.get_distance_between_nodes(node, self.__new_node))
-        ind_neighbours = np.where(np.array(distance_between_nodes) <= self.__rrtstar_neighbour_radius)[0]
-        self.__neighbour_nodes = []
-        for idx in ind_neighbours:
-            self.__neighbour_nodes.append(self.__nodes[idx])
-
-    def __get_cost_between_nodes(self, n1: 'TreeNode', n2: 'TreeNode') -> float:
+        self.__neighbour_nodes = self.__node_index.get_within(self.__tree.get_location(self.__new_node),
+                                                              self.__rrtstar_neighbour_radius)
+
+    def __get_cost_between_nodes(self, n1: int, n2: int) -> float:
         """ Get cost between nodes. """
-        cost_distance = TreeNode.get_distance_between_nodes(n1, n2) / self.__stepsize
-        cost_costvalley = self.__cost_valley.get_cost_along_path(n1.get_location(), n2.get_location())
-        cost = n1.get_cost() + cost_distance + cost_costvalley
+        cost = self.__tree.get_cost()[n1] + self.__get_edge_costs(np.array([n1]), n2)[0]
         # cost = n1.get_cost() + cost_costvalley
-        return cost
+        return float(cost)
 
     def __isarrived(self) -> bool:
-        dist = TreeNode.get_distance_between_nodes(self.__new_node, self.__target_node)
+        x, y = self.__tree.get_x(), self.__tree.get_y()
+        dist = np.sqrt((x[self.__new_node] - x[self.__target_node]) ** 2 +
+                       (y[self.__new_node] - y[self.__target_node]) ** 2)
         if dist < self.__home_radius:
             return True
         else:
             return False
 
     def __get_shortest_trajectory(self):
-        wp_old = self.__target_node.get_location().reshape(1, -1)
+        wp_old = self.__tree.get_location(self.__target_node).reshape(1, -1)
         self.__trajectory = np.empty([0, 2])
         self.__trajectory = np.append(self.__trajectory, wp_old, axis=0)
-        self.__cost_trajectory = self.__target_node.get_cost()
+        self.__cost_trajectory = self.__tree.get_cost()[self.__target_node]
 
+        parent = self.__tree.get_parent()
         pointer_node = self.__target_node
         cnt = 0
-        while pointer_node.get_parent() is not None:
+        while parent[pointer_node] >= 0:
             cnt += 1
-            node = pointer_node.get_parent()
-            wp_new = pointer_node.get_location().reshape(1, -1)
+            node = parent[pointer_node]
+            wp_new = self.__tree.get_location(pointer_node).reshape(1, -1)
             self.__trajectory = np.append(self.__trajectory, wp_new, axis=0)
             self.__distance_trajectory += np.sqrt((wp_new[0, 0] - wp_old[0, 0])**2 +
                                                   (wp_new[0, 1] - wp_new[0, 1])**2)
@@ -256,15 +499,19 @@ class RRTStarCV:
             if cnt > self.__max_expansion_iteration:
                 break
 
-        wp_new = self.__starting_node.get_location().reshape(1, -1)
+        wp_new = self.__tree.get_location(self.__starting_node).reshape(1, -1)
         self.__trajectory = np.append(self.__trajectory, wp_new, axis=0)
-        self.__cost_trajectory += self.__starting_node.get_cost()
+        self.__cost_trajectory += self.__tree.get_cost()[self.__starting_node]
         self.__distance_trajectory += np.sqrt((wp_new[0, 0] - wp_old[0, 0]) ** 2 +
                                               (wp_new[0, 1] - wp_old[0, 1]) ** 2)
 
     def get_tree_nodes(self) -> list:
-        """ Return all the tree nodes. """
-        return self.__nodes
+        """ Return all the tree nodes as read-only node views. """
+        return [TreeNodeView(self.__tree, ind) for ind in self.__node_index.get_ids()]
+
+    def get_tree(self) -> 'TreeStore':
+        """ Return the array based tree store. """
+        return self.__tree
 
     def get_trajectory(self) -> np.ndarray:
         """ Return the trajectory from the starting location to the target location. """
@@ -279,25 +526,25 @@ class RRTStarCV:
 
     def is_location_legal(self, loc: np.ndarray) -> bool:
         x, y = loc
-        point = Point(x, y)
         islegal = True
         if self.__budget_mode:
-            if self.__polygon_obstacle_shapely.contains(point) or not self.__polygon_ellipse_shapely.contains(point):
+            if (self.__field.obstacle_contains(loc) or
+                    not self.__polygon_ellipse_shapely.contains(Point(x, y))):
                 islegal = False
         else:
-            if self.__polygon_obstacle_shapely.contains(point):
+            if self.__field.obstacle_contains(loc):
                 islegal = False
         return islegal
 
     def is_path_legal(self, loc1: np.ndarray, loc2: np.ndarray) -> bool:
         x1, y1 = loc1
         x2, y2 = loc2
-        line = LineString([(x1, y1), (x2, y2)])
         islegal = True
-        c1 = self.__line_border_shapely.intersects(line)  # TODO: tricky to detect, since cannot have points on border.
-        c2 = self.__line_obstacle_shapely.intersects(line)
+        # TODO: tricky to detect, since cannot have points on border.
+        c1 = self.__field.is_border_in_the_way(loc1, loc2)
+        c2 = self.__field.is_obstacle_in_the_way(loc1, loc2)
         if self.__budget_mode:
-            c3 = self.__line_ellipse_shapely.intersects(line)
+            c3 = self.__line_ellipse_shapely.intersects(LineString([(x1, y1), (x2, y2)]))
             if c1 or c2 or c3:
                 islegal = False
         else:
@@ -305,6 +552,24 @@ class RRTStarCV:
                 islegal = False
         return islegal
 
+    def is_location_legal_many(self, locs: np.ndarray) -> np.ndarray:
+        """ Batch version of is_location_legal, locs: (N, 2) array. """
+        locs = np.asarray(locs).reshape(-1, 2)
+        islegal = ~self.__field.obstacle_contains_many(locs)
+        if self.__budget_mode:
+            islegal &= shapely.contains_xy(self.__polygon_ellipse_shapely, locs[:, 0], locs[:, 1])
+        return islegal
+
+    def is_path_legal_many(self, locs1: np.ndarray, locs2: np.ndarray) -> np.ndarray:
+        """ Batch version of is_path_legal, locs1, locs2: (N, 2) arrays. """
+        locs1 = np.asarray(locs1).reshape(-1, 2)
+        locs2 = np.asarray(locs2).reshape(-1, 2)
+        islegal = ~self.__field.segments_intersect_many(locs1, locs2)
+        if self.__budget_mode:
+            lines = shapely.linestrings(np.stack((locs1, locs2), axis=1))
+            islegal &= ~shapely.intersects(self.__line_ellipse_shapely, lines)
+        return islegal
+
     def get_CostValley(self) -> 'CostValley':
         return self.__cost_valley
 
@@ -324,6 +589,60 @@ class RRTStarCV:
         """ Set the neighbour radius for tree searching. """
         self.__rrtstar_neighbour_radius = value
 
+    def set_cost_propagation(self, value: bool) -> None:
+        """ Set if rewiring cost changes are propagated to the descendants of the rewired nodes. """
+        self.__cost_propagation = value
+
+    def set_edge_cost_samples(self, value: int) -> None:
+        """ Set the number of samples along each edge for the cost valley path integral. """
+        self.__edge_cost_samples = value
+
+    def set_warm_start(self, value: bool) -> None:
+        """ Set if the tree of the previous waypoint is reused, see __reuse_tree. """
+        self.__warm_start = value
+
+    def set_warm_start_iteraions(self, value: int) -> None:
+        """ Set the expansion iterations on a reused tree. """
+        self.__warm_start_iteration = value
+
+    def set_time_budget(self, value: float) -> None:
+        """ Set the planning time in seconds per call for anytime mode, None to always run all iterations. """
+        self.__time_budget = value
+
+    def set_background_improvement(self, value: bool) -> None:
+        """ Set if anytime mode keeps expanding in the background after the deadline. """
+        self.__background_improvement = value
+
+    def set_waypoint_callback(self, callback) -> None:
+        """ Set the function called with (waypoint, cost) when anytime mode finds a cheaper trajectory. """
+        self.__waypoint_callback = callback
+
+    def set_cancelled(self, value: bool) -> None:
+        """
+        Set to stop the tree expansion at once, from another thread, so get_next_waypoint returns with the best
+        trajectory so far. It stays cancelled until it is set back to False.
+        """
+        if value:
+            self.__cancelled.set()
+        else:
+            self.__cancelled.clear()
+
+    def set_random_seed(self, value: int) -> None:
+        """
+        Seed the generators of the random locations, None for a fresh seed. The planning calls and the background
+        improvement get independent generators spawned from the seed, so the planning calls are reproducible however
+        long the background improvement runs.
+        """
+        self.__rng, self.__rng_background = [np.random.default_rng(s) for s in np.random.SeedSequence(value).spawn(2)]
+
+    def set_informed_sampling(self, value: bool) -> None:
+        """ Set if the samples are drawn from the informed ellipse once the target is reached. """
+        self.__informed_sampling = value
+
+    def set_Budget(self, budget: 'Budget') -> None:
+        """ Set the budget whose ellipse bounds the tree, by default the one of the cost valley. """
+        self.__Budget = budget
+
     def set_home_radius(self, value: float) -> None:
         """ Set the home radius for path convergence. """
         self.__home_radius = value
@@ -344,6 +663,34 @@ class RRTStarCV:
         """ Get the neighbour radius for tree searching. """
         return self.__rrtstar_neighbour_radius
 
+    def get_warm_start(self) -> bool:
+        """ Get if the tree of the previous waypoint is reused. """
+        return self.__warm_start
+
+    def get_warm_start_iteraions(self) -> int:
+        """ Get the expansion iterations on a reused tree. """
+        return self.__warm_start_iteration
+
+    def get_informed_sampling(self) -> bool:
+        """ Get if the samples are drawn from the informed ellipse once the target is reached. """
+        return self.__informed_sampling
+
+    def get_time_budget(self) -> float:
+        """ Get the planning time in seconds per call for anytime mode. """
+        return self.__time_budget
+
+    def get_background_improvement(self) -> bool:
+        """ Get if anytime mode keeps expanding in the background after the deadline. """
+        return self.__background_improvement
+
+    def get_planning_log(self) -> list:
+        """ Return time, iterations, background iterations and trajectory cost for each call. """
+        return self.__planning_log
+
+    def get_edge_cost_samples(self) -> int:
+        """ Get the number of samples along each edge for the cost valley path integral. """
+        return self.__edge_cost_samples
+
     def get_home_radius(self) -> float:
         """ Get the home radius for path convergence. """
         return self.__home_radius
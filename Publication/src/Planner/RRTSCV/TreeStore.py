@@ -0,0 +1,125 @@
+"""
+TreeStore holds the RRT* tree as a struct of arrays instead of one TreeNode object per node.
+
+Each node is a row index into preallocated arrays:
+- x, y: float64 location.
+- cost: float64 cost from the root.
+- parent: int32 row index of the parent, -1 for no parent.
+
+Adding a node writes one row, and the arrays double in size when they are full, so growing the tree does not allocate
+per node and the rewiring math can work on whole index arrays at once.
+TreeNodeView wraps a row with the TreeNode getters for the visualisers.
+"""
+import numpy as np
+
+
+class TreeStore:
+    """
+    Array backed tree storage.
+    """
+    def __init__(self, capacity: int = 2048) -> None:
+        self.__x = np.empty(capacity)
+        self.__y = np.empty(capacity)
+        self.__cost = np.empty(capacity)
+        self.__parent = np.empty(capacity, dtype=np.int32)
+        self.__size = 0
+
+    def clear(self) -> None:
+        """ Remove all nodes. """
+        self.__size = 0
+
+    def add(self, loc: np.ndarray, cost: float = .0, parent: int = -1) -> int:
+        """ Add a node and return its index. """
+        if self.__size == len(self.__x):
+            self.__grow()
+        ind = self.__size
+        self.__x[ind], self.__y[ind] = loc
+        self.__cost[ind] = cost
+        self.__parent[ind] = parent
+        self.__size += 1
+        return ind
+
+    def add_many(self, locs: np.ndarray, cost: np.ndarray, parent: np.ndarray) -> np.ndarray:
+        """ Add nodes in one batch and return their indices, locs: (N, 2) array. """
+        locs = np.asarray(locs).reshape(-1, 2)
+        n = len(locs)
+        while self.__size + n > len(self.__x):
+            self.__grow()
+        ind = np.arange(self.__size, self.__size + n)
+        self.__x[ind] = locs[:, 0]
+        self.__y[ind] = locs[:, 1]
+        self.__cost[ind] = cost
+        self.__parent[ind] = parent
+        self.__size += n
+        return ind
+
+    def pop(self) -> None:
+        """ Remove the last added node. """
+        self.__size -= 1
+
+    def __grow(self) -> None:
+        capacity = 2 * len(self.__x)
+        for name in ("x", "y", "cost", "parent"):
+            old = getattr(self, "_TreeStore__" + name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.__size] = old[:self.__size]
+            setattr(self, "_TreeStore__" + name, new)
+
+    def set_cost(self, ind, value) -> None:
+        """ Set cost for one node or an index array of nodes. """
+        self.__cost[ind] = value
+
+    def set_parent(self, ind, parent) -> None:
+        """ Set parent for one node or an index array of nodes. """
+        self.__parent[ind] = parent
+
+    def get_location(self, ind: int) -> np.ndarray:
+        """ Return the location of one node. """
+        return np.array([self.__x[ind], self.__y[ind]])
+
+    def get_x(self) -> np.ndarray:
+        """ Return the x coordinates of all nodes. """
+        return self.__x[:self.__size]
+
+    def get_y(self) -> np.ndarray:
+        """ Return the y coordinates of all nodes. """
+        return self.__y[:self.__size]
+
+    def get_cost(self) -> np.ndarray:
+        """ Return the costs of all nodes. """
+        return self.__cost[:self.__size]
+
+    def get_parent(self) -> np.ndarray:
+        """ Return the parent indices of all nodes. """
+        return self.__parent[:self.__size]
+
+    def __len__(self) -> int:
+        return self.__size
+
+
+class TreeNodeView:
+    """
+    Read-only TreeNode interface over one row of a TreeStore.
+    """
+    def __init__(self, store: 'TreeStore', ind: int) -> None:
+        self.__store = store
+        self.__ind = ind
+
+    def get_location(self) -> np.ndarray:
+        """ Return the location associated with the tree node. """
+        return self.__store.get_location(self.__ind)
+
+    def get_cost(self) -> float:
+        """ Get cost associated with the tree node. """
+        return self.__store.get_cost()[self.__ind]
+
+    def get_parent(self):
+        """ Return the parent node of the tree node. """
+        parent = self.__store.get_parent()[self.__ind]
+        if parent < 0:
+            return None
+        return TreeNodeView(self.__store, parent)
+
+    def get_index(self) -> int:
+        """ Return the row index of the tree node in the store. """
+        return self.__ind
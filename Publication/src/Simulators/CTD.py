@@ -6,6 +6,7 @@ Email: geyaolin@gmail.com
 Date: 2023-08-24
 """
 from GRF.GRF import GRF
+from GRF.ScenarioContext import ScenarioContext
 import numpy as np
 from typing import Union
 
@@ -15,19 +16,24 @@ class CTD:
     CTD module handles the simulated truth value at each specific location.
     """
     def __init__(self, loc_start: np.ndarray = np.array([0, 0]), random_seed: int = 0,
-                 sigma: float = 1., nugget: float = .1):
+                 sigma: float = 1., nugget: float = .1, context: 'ScenarioContext' = None):
         # np.random.seed(0)
         """
         Set up the CTD simulated truth field.
+        With a scenario context, the truth is drawn from its shared prior and no GRF kernel is built here.
         TODO: Check the starting location, it can induce serious problems.
         """
         np.random.seed(random_seed)
 
-        self.grf = GRF(sigma=sigma, nugget=nugget)
-        self.field = self.grf.field
-        mu_prior = self.grf.get_mu()
-        Sigma_prior = self.grf.get_covariance_matrix()
-        self.mu_truth = mu_prior + np.linalg.cholesky(Sigma_prior) @ np.random.randn(len(mu_prior)).reshape(-1, 1)
+        if context is not None:
+            self.field = context.get_field()
+            self.mu_truth = context.get_truth(random_seed)
+        else:
+            self.grf = GRF(sigma=sigma, nugget=nugget)
+            self.field = self.grf.field
+            mu_prior = self.grf.get_mu()
+            L_prior = self.grf.get_cholesky_prior()
+            self.mu_truth = mu_prior + L_prior @ np.random.randn(len(mu_prior)).reshape(-1, 1)
 
         """
         Set up CTD data gathering
@@ -10,6 +10,7 @@ import datetime
 from WGS import WGS
 from Config import Config
 from GRF.GRF import GRF
+from Simulators.ResultStore import ResultStore
 from usr_func.checkfolder import checkfolder
 import numpy as np
 import matplotlib.pyplot as plt
@@ -137,6 +138,21 @@ class EDA:
         self.xticks = np.arange(0, self.num_steps, 20)
         self.xticklabels = ['{:d}'.format(i) for i in self.xticks]
 
+    def load_data_from_result_store(self, folderpath_store: str = folderpath + "store/") -> None:
+        """
+        Load the metrics from the result store written by the simulator, in the same layout as load_data.
+        Only the metrics used in the plots are read, the covariance snapshots are left on disk.
+        """
+        t0 = time()
+        store = ResultStore(folderpath_store)
+        planners = {'myopic': 'myopic', 'rrt': 'rrtstar'}
+        weights = {'eibv': 'EIBV', 'ivr': 'IVR', 'equal': 'Equal'}
+        for name, metric in zip(['trajectory', 'ibv', 'rmse', 'vr', 'mu', 'sigma', 'truth'],
+                                ['traj', 'ibv', 'rmse', 'vr', 'mu', 'sigma', 'truth']):
+            setattr(self, name, {planner: {item: store.get_metric(metric, planners[planner], weights[item])
+                                           for item in self.cv} for planner in self.planners})
+        print("Loading data from the result store takes {:.2f} seconds.".format(time() - t0))
+
     def print_metrics_summary_last_step_for_paper(self) -> None:
         for item in self.cv:
             for planner in self.planners:
@@ -0,0 +1,126 @@
+"""
+ReplicateScheduler runs the tasks of a replicate study in a process pool and tracks them in a manifest on disk.
+
+A task is one agent in one replicate with one weight set, e.g. the RRT* agent in replicate 7 with the EIBV weights.
+- The tasks are kept in datapath/manifest.json with their seed and status. The manifest is rewritten atomically as
+soon as a task finishes, so an interrupted study only loses the tasks that were running.
+- On restart, finished tasks are skipped and the seeds are taken from the manifest, so the replicates are the same.
+- The workers pull one task at a time, so fast myopic tasks fill the gaps left by slow RRT* tasks. The pending tasks
+are handed out longest first, estimated from the runtimes of the finished tasks of the same agent.
+- Failed tasks are recorded with their error and are run again on the next call.
+
+The worker is a plain function taking the task dict, which writes its own results. The pool is forked, so anything
+built before run is called, e.g. a ScenarioContext, is shared with the workers.
+"""
+from usr_func.checkfolder import checkfolder
+from multiprocessing import get_context
+from typing import Callable
+from time import time
+import numpy as np
+import json
+import os
+import tempfile
+
+
+def _run_task(item: tuple) -> tuple:
+    """ Run one task in a worker and return its name, runtime and error, None if it succeeded. """
+    worker, task = item
+    t0 = time()
+    try:
+        worker(task)
+        error = None
+    except Exception as e:
+        error = "{:s}: {:s}".format(type(e).__name__, str(e))
+    return task["name"], time() - t0, error
+
+
+class ReplicateScheduler:
+    """ Resumable replicate study in a process pool. """
+    __RUNTIME_DEFAULT = {"rrtstar": 10., "myopic": 1.}  # relative runtimes until a task of the agent has finished.
+
+    def __init__(self, datapath: str = os.getcwd() + "/npy/temporal/Synced/", num_workers: int = None) -> None:
+        self.__datapath = datapath
+        checkfolder(self.__datapath)
+        self.__filepath_manifest = self.__datapath + "manifest.json"
+        self.__num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.__tasks = dict()
+        if os.path.exists(self.__filepath_manifest):
+            with open(self.__filepath_manifest, "r") as f:
+                self.__tasks = json.load(f)["tasks"]
+
+    def add_replicates(self, seeds: np.ndarray, weight_set: np.ndarray,
+                       agents: tuple = ("rrtstar", "myopic")) -> None:
+        """
+        Add a task for every replicate, weight set and agent. Replicate i uses seeds[i]. Tasks already in the
+        manifest are kept as they are, including their seed.
+        """
+        for i, seed in enumerate(seeds):
+            for weight_eibv, weight_ivr in weight_set:
+                for agent in agents:
+                    name = "R_{:03d}/{:.2f}_{:.2f}/{:s}".format(i, weight_eibv, weight_ivr, agent)
+                    if name not in self.__tasks:
+                        self.__tasks[name] = {"name": name, "replicate_id": i, "seed": int(seed),
+                                              "weight_eibv": float(weight_eibv), "weight_ivr": float(weight_ivr),
+                                              "agent": agent, "status": "pending", "runtime": None, "error": None}
+        self.__save_manifest()
+
+    def run(self, worker: Callable) -> int:
+        """
+        Run all the pending and failed tasks with worker(task) in the pool and return the number of tasks that
+        succeeded. The manifest is updated as every task finishes.
+        """
+        tasks = self.get_pending_tasks()
+        if len(tasks) == 0:
+            return 0
+        num_workers = min(self.__num_workers, len(tasks))
+        print("Tasks: ", len(tasks), " pending of ", len(self.__tasks), " | Workers: ", num_workers)
+
+        num_done = 0
+        t0 = time()
+        with get_context("fork").Pool(num_workers) as pool:
+            for name, runtime, error in pool.imap_unordered(_run_task, [(worker, task) for task in tasks],
+                                                            chunksize=1):
+                task = self.__tasks[name]
+                task["runtime"] = runtime
+                task["error"] = error
+                task["status"] = "done" if error is None else "failed"
+                self.__save_manifest()
+                num_done += error is None
+                print("Task ", name, " ", task["status"], " in {:.1f} seconds".format(runtime),
+                      " | {:d} / {:d}".format(num_done, len(tasks)),
+                      " | Elapsed: {:.1f} min".format((time() - t0) / 60))
+                if error is not None:
+                    print("Task ", name, " failed with ", error)
+        return num_done
+
+    def get_pending_tasks(self) -> list:
+        """ Return the tasks that are not done, the longest expected first. """
+        runtime_agent = dict()
+        for task in self.__tasks.values():
+            if task["status"] == "done":
+                runtime_agent.setdefault(task["agent"], []).append(task["runtime"])
+        estimate = {agent: np.mean(runtimes) for agent, runtimes in runtime_agent.items()}
+        tasks = [task for task in self.__tasks.values() if task["status"] != "done"]
+        return sorted(tasks, key=lambda task: -estimate.get(task["agent"],
+                                                            self.__RUNTIME_DEFAULT.get(task["agent"], 1.)))
+
+    def reset(self) -> None:
+        """ Forget all the tasks and start the study from scratch, the result files are overwritten. """
+        self.__tasks = dict()
+        self.__save_manifest()
+
+    def __save_manifest(self) -> None:
+        """ Write the manifest to a temporary file first, so it is never left half written. """
+        fd, filepath_tmp = tempfile.mkstemp(dir=self.__datapath, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"tasks": self.__tasks}, f, indent=1)
+        os.replace(filepath_tmp, self.__filepath_manifest)
+
+    def get_tasks(self) -> dict:
+        return self.__tasks
+
+    def get_num_workers(self) -> int:
+        return self.__num_workers
+
+    def get_filepath_manifest(self) -> str:
+        return self.__filepath_manifest
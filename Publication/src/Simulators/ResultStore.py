@@ -0,0 +1,194 @@
+"""
+ResultStore keeps the results of a replicate study in compressed chunk files, one column per metric.
+
+The simulators used to save one npz file per replicate, weight set and planner with all the metrics in it, so reading
+the rmse of all replicates loaded every covariance snapshot as well. Here every metric is stored on its own, in a
+directory layout similar to Zarr:
+    <folder>/schema.json
+    <folder>/<metric>/<planner>/<weight>/<replicate>.<chunk>.npz
+Each chunk file holds a fixed number of consecutive entries of one metric for one replicate, compressed with zlib.
+An entry is the value of the metric at one step, e.g. the posterior mean, except for metrics that are only saved
+every few steps, e.g. the covariance, where entry k belongs to step k * every.
+
+The schema lists the planners, weights, number of replicates and steps, and the shape, dtype, chunk size and
+saving interval of every metric. Missing entries, e.g. of a replicate that has not finished yet, read as nan.
+
+Writing: append the metrics of every step, full chunks are written as soon as they are complete and flush writes the
+rest. Chunk files are written to a temporary file first and are never left half written.
+Reading: get_metric slices one metric across replicates and steps, and only reads the chunks it needs.
+A new study starts from an empty store: rotate_store moves the previous one aside instead of mixing their chunks.
+"""
+from usr_func.checkfolder import checkfolder
+from Config import Config
+from typing import Union
+import numpy as np
+from time import strftime
+import json
+import os
+import tempfile
+
+
+def make_schema(num_grid: int, num_steps: int, num_replicates: int, float32: bool = False,
+                cov_every: int = 15) -> dict:
+    """
+    Return the schema of the temporal replicate study. With float32, the fields on grid are stored in single
+    precision, the trajectory and the scalar metrics always use double precision.
+    """
+    dtype = "float32" if float32 else "float64"
+    return {
+        "planners": ["myopic", "rrtstar"],
+        "weights": ["EIBV", "IVR", "Equal"],
+        "num_replicates": num_replicates,
+        "num_steps": num_steps,
+        "metrics": {
+            "traj": {"shape": [2], "dtype": "float64", "chunk": 30, "every": 1},
+            "ibv": {"shape": [], "dtype": "float64", "chunk": 30, "every": 1},
+            "rmse": {"shape": [], "dtype": "float64", "chunk": 30, "every": 1},
+            "vr": {"shape": [], "dtype": "float64", "chunk": 30, "every": 1},
+            "mu": {"shape": [num_grid], "dtype": dtype, "chunk": 30, "every": 1},
+            "sigma": {"shape": [num_grid], "dtype": dtype, "chunk": 30, "every": 1},
+            "truth": {"shape": [num_grid], "dtype": dtype, "chunk": 30, "every": 1},
+            "cov": {"shape": [num_grid, num_grid], "dtype": dtype, "chunk": 1, "every": cov_every},
+        },
+    }
+
+
+def make_study_schema(num_grid: int) -> dict:
+    """
+    Return the schema of the temporal replicate study with the number of steps and replicates from the Config and
+    the fields on grid in single precision. The simulators and the study script all open the store with it.
+    """
+    config = Config()
+    return make_schema(num_grid, config.get_num_steps(), config.get_num_replicates(), float32=True)
+
+
+def rotate_store(folderpath: str) -> Union[str, None]:
+    """
+    Move the store in folderpath aside to folderpath.<date>-<time>/, so the next store there starts empty.
+    Return the new path of the previous store, or None if there is none.
+    """
+    folderpath = folderpath.rstrip("/")
+    if not os.path.exists(folderpath):
+        return None
+    folderpath_old = folderpath + "." + strftime("%Y%m%d-%H%M%S")
+    i = 1
+    while os.path.exists(folderpath_old):
+        folderpath_old = folderpath + "." + strftime("%Y%m%d-%H%M%S") + "_{:d}".format(i)
+        i += 1
+    os.rename(folderpath, folderpath_old)
+    return folderpath_old + "/"
+
+
+class ResultStore:
+    """ Chunked columnar store of the simulation results. """
+    def __init__(self, folderpath: str = os.getcwd() + "/npy/temporal/Synced/store/", schema: dict = None) -> None:
+        """
+        Open the store in folderpath. A new store needs a schema, an existing one is opened with its own schema, and
+        a different schema raises a ValueError.
+        """
+        self.__folderpath = folderpath
+        self.__filepath_schema = self.__folderpath + "schema.json"
+        if os.path.exists(self.__filepath_schema):
+            with open(self.__filepath_schema, "r") as f:
+                self.__schema = json.load(f)
+            if schema is not None and json.loads(json.dumps(schema)) != self.__schema:
+                raise ValueError("The store in " + self.__folderpath + " has a different schema.")
+        elif schema is not None:
+            checkfolder(self.__folderpath)
+            self.__schema = json.loads(json.dumps(schema))
+            self.__write_atomic(self.__filepath_schema, lambda f: f.write(json.dumps(self.__schema, indent=1)))
+        else:
+            raise ValueError("No store in " + self.__folderpath + ", a schema is needed to create one.")
+        self.__buffers = dict()  # (metric, planner, weight, replicate, chunk) -> chunk array being written.
+
+    def append(self, planner: str, weight: str, replicate: int, step: int, **values) -> None:
+        """
+        Append the values of the metrics at step, e.g. append("rrtstar", "EIBV", 0, 0, rmse=.3, mu=mu).
+        Metrics that are only saved every few steps are skipped at the other steps.
+        """
+        for metric, value in values.items():
+            spec = self.__get_spec(metric)
+            if step % spec["every"] != 0:
+                continue
+            entry = step // spec["every"]
+            ind_chunk, ind = divmod(entry, spec["chunk"])
+            key = (metric, planner, weight, replicate, ind_chunk)
+            if key not in self.__buffers:
+                self.__buffers[key] = self.__read_chunk(*key)
+            self.__buffers[key][ind] = np.asarray(value).reshape(spec["shape"])
+            if ind == spec["chunk"] - 1 or entry == self.__get_num_entries(metric) - 1:
+                self.__write_chunk(key, self.__buffers.pop(key))
+
+    def flush(self) -> None:
+        """ Write all the chunks that are not complete yet. """
+        for key in list(self.__buffers.keys()):
+            self.__write_chunk(key, self.__buffers.pop(key))
+
+    def get_metric(self, metric: str, planner: str, weight: str, replicates: Union[list, np.ndarray] = None,
+                   entries: slice = slice(None)) -> np.ndarray:
+        """
+        Return the entries of one metric for the given replicates, all of them by default, as an array of shape
+        (replicates, entries, *metric shape). Entry k of a metric saved every n steps belongs to step k * n.
+        Only the chunk files covering the entries are read.
+        """
+        spec = self.__get_spec(metric)
+        if replicates is None:
+            replicates = np.arange(self.__schema["num_replicates"])
+        ind_entries = np.arange(self.__get_num_entries(metric))[entries]
+        data = np.full((len(replicates), len(ind_entries)) + tuple(spec["shape"]), np.nan, dtype=spec["dtype"])
+        ind_chunks, ind_in_chunk = np.divmod(ind_entries, spec["chunk"])
+        for i, replicate in enumerate(replicates):
+            for ind_chunk in np.unique(ind_chunks):
+                mask = ind_chunks == ind_chunk
+                chunk = self.__read_chunk(metric, planner, weight, int(replicate), int(ind_chunk))
+                data[i, mask] = chunk[ind_in_chunk[mask]]
+        return data
+
+    def get_completed_replicates(self, planner: str, weight: str, metric: str = "rmse") -> np.ndarray:
+        """ Return the replicates whose last entry of metric is saved. """
+        num_entries = self.__get_num_entries(metric)
+        last = self.get_metric(metric, planner, weight, entries=slice(num_entries - 1, num_entries))
+        return np.where(~np.isnan(last.reshape(len(last), -1)).any(axis=1))[0]
+
+    def __read_chunk(self, metric: str, planner: str, weight: str, replicate: int, ind_chunk: int) -> np.ndarray:
+        """ Return the chunk from disk, or a chunk full of nan if it is not written yet. """
+        filepath = self.__get_filepath_chunk(metric, planner, weight, replicate, ind_chunk)
+        if os.path.exists(filepath):
+            with np.load(filepath) as chunk:
+                return chunk["data"]
+        spec = self.__get_spec(metric)
+        return np.full([spec["chunk"]] + spec["shape"], np.nan, dtype=spec["dtype"])
+
+    def __write_chunk(self, key: tuple, chunk: np.ndarray) -> None:
+        filepath = self.__get_filepath_chunk(*key)
+        checkfolder(os.path.dirname(filepath) + "/")
+        self.__write_atomic(filepath, lambda f: np.savez_compressed(f, data=chunk), mode="wb")
+
+    def __get_filepath_chunk(self, metric: str, planner: str, weight: str, replicate: int, ind_chunk: int) -> str:
+        if planner not in self.__schema["planners"] or weight not in self.__schema["weights"]:
+            raise ValueError("Unknown planner or weight: " + planner + ", " + weight)
+        return self.__folderpath + "{:s}/{:s}/{:s}/{:03d}.{:03d}.npz".format(metric, planner, weight,
+                                                                           replicate, ind_chunk)
+
+    def __get_spec(self, metric: str) -> dict:
+        if metric not in self.__schema["metrics"]:
+            raise ValueError("Unknown metric: " + metric)
+        return self.__schema["metrics"][metric]
+
+    def __get_num_entries(self, metric: str) -> int:
+        """ Return the number of entries of metric in one replicate, steps 0, every, 2 * every, ... """
+        every = self.__get_spec(metric)["every"]
+        return (self.__schema["num_steps"] + every - 1) // every
+
+    @staticmethod
+    def __write_atomic(filepath: str, write, mode: str = "w") -> None:
+        fd, filepath_tmp = tempfile.mkstemp(dir=os.path.dirname(filepath))
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(filepath_tmp, filepath)
+
+    def get_schema(self) -> dict:
+        return self.__schema
+
+    def get_folderpath(self) -> str:
+        return self.__folderpath
@@ -8,8 +8,10 @@ Date: 2023-09-06
 
 from Agents.AgentMyopic import Agent as AgentMyopic
 from Agents.AgentRRTStar import Agent as AgentRRTStar
+from GRF.ScenarioContext import ScenarioContext
+from Simulators.ResultStore import ResultStore, make_study_schema
 from Config import Config
-from usr_func.checkfolder import checkfolder
+from functools import partial
 import numpy as np
 import os
 from time import time
@@ -18,8 +20,18 @@ from time import time
 class Simulator:
 
     def __init__(self, weight_eibv: float = 1., weight_ivr: float = 1.,
-                 random_seed: int = 0, replicate_id: int = 0, debug: bool = False) -> None:
+                 random_seed: int = 0, replicate_id: int = 0, debug: bool = False,
+                 context: 'ScenarioContext' = None, agents: tuple = ("myopic", "rrtstar"),
+                 store: 'ResultStore' = None) -> None:
+        """
+        Set up the agents of one replicate. The prior is built once in the scenario context and shared by all the
+        agents, only their conditional fields are their own. Pass a context to share it across replicates as well.
+        Only the agents listed in agents are set up, so they can be run as separate tasks.
+        The agents append the results of every step to the result store, by default the one in
+        npy/temporal/Synced/store/ with the schema of the study.
+        """
         self.__random_seed = random_seed
+        self.__replicate_id = replicate_id
         self.__debug = debug
         self.__config = Config()
         self.__num_steps = self.__config.get_num_steps()
@@ -29,42 +41,41 @@ class Simulator:
             self.__name = "IVR"
         else:
             self.__name = "Equal"
-        self.__agent_myopic = AgentMyopic(weight_eibv=weight_eibv, weight_ivr=weight_ivr,
-                                          random_seed=self.__random_seed, debug=self.__debug, name=self.__name)
-        self.__agent_rrtstar = AgentRRTStar(weight_eibv=weight_eibv, weight_ivr=weight_ivr,
-                                            random_seed=self.__random_seed, debug=self.__debug, name=self.__name)
+        self.__context = context if context is not None else ScenarioContext()
+        self.__agent_myopic = None
+        self.__agent_rrtstar = None
+        if "myopic" in agents:
+            self.__agent_myopic = AgentMyopic(weight_eibv=weight_eibv, weight_ivr=weight_ivr,
+                                              random_seed=self.__random_seed, debug=self.__debug, name=self.__name,
+                                              context=self.__context)
+        if "rrtstar" in agents:
+            self.__agent_rrtstar = AgentRRTStar(weight_eibv=weight_eibv, weight_ivr=weight_ivr,
+                                                random_seed=self.__random_seed, debug=self.__debug, name=self.__name,
+                                                context=self.__context)
 
-        self.__datapath = os.getcwd() + "/npy/temporal/Synced/R_{:03d}/".format(replicate_id) + self.__name + "/"
-        checkfolder(self.__datapath)
+        if store is None:
+            store = ResultStore(os.getcwd() + "/npy/temporal/Synced/store/",
+                                make_study_schema(len(self.__context.get_grid())))
+        self.__store = store
 
     def run_myopic(self) -> None:
         """ Run the simulation for all the agents. """
         t0 = time()
-        self.__agent_myopic.run()
+        self.__agent_myopic.run(record=partial(self.__store.append, "myopic", self.__name, self.__replicate_id))
+        self.__store.flush()
         print("Myopic simulation takes {:.2f} seconds.".format(time() - t0))
 
-        t0 = time()
-        (traj_myopic, ibv_myopic, rmse_myopic, vr_myopic,
-         mu_data_myopic, cov_myopic, sigma_data_myopic, mu_truth_data_myopic) = self.__agent_myopic.get_metrics()
-
-        np.savez(self.__datapath + "myopic.npz", traj=traj_myopic, ibv=ibv_myopic, rmse=rmse_myopic, vr=vr_myopic,
-                    mu=mu_data_myopic, cov=cov_myopic, sigma=sigma_data_myopic, truth=mu_truth_data_myopic)
-        print("Saving data takes {:.2f} seconds.".format(time() - t0))
-
     def run_rrt(self) -> None:
         """ Run the simulation for all the agents. """
         t0 = time()
-        self.__agent_rrtstar.run()
+        self.__agent_rrtstar.run(record=partial(self.__store.append, "rrtstar", self.__name, self.__replicate_id))
+        self.__store.flush()
         print("RRT* simulation takes {:.2f} seconds.".format(time() - t0))
-
-        (traj_rrtstar, ibv_rrtstar, rmse_rrtstar, vr_rrtstar,
-         mu_data_rrtstar, cov_rrtstar, sigma_data_rrtstar, mu_truth_data_rrtstar) = self.__agent_rrtstar.get_metrics()
-
-        np.savez(self.__datapath + "rrtstar.npz", traj=traj_rrtstar, ibv=ibv_rrtstar, rmse=rmse_rrtstar, vr=vr_rrtstar,
-                    mu=mu_data_rrtstar, cov=cov_rrtstar, sigma=sigma_data_rrtstar, truth=mu_truth_data_rrtstar)
-        print("Saving data takes {:.2f} seconds.".format(time() - t0))
         print("Mission completed.")
 
+    def get_context(self) -> 'ScenarioContext':
+        return self.__context
+
 
 if __name__ == "__main__":
     s = Simulator()
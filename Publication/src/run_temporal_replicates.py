@@ -1,18 +1,27 @@
 """
 This script runs the replicate study using two different agents in the same field.
+Every agent, replicate and weight set is one task of the ReplicateScheduler, which keeps track of them in
+npy/temporal/Synced/manifest.json. If the study is interrupted, running the script again resumes it.
+The results are appended to the ResultStore in npy/temporal/Synced/store/. A new study moves the store of the
+previous one aside, see rotate_store.
 
 Author: Yaolin Ge
 Email: geyaolin@gmail.com
 Date: 2023-09-06
 """
 from Simulators.Simulator import Simulator
-from joblib import Parallel, delayed
+from Simulators.ReplicateScheduler import ReplicateScheduler
+from Simulators.ResultStore import ResultStore, make_study_schema, rotate_store
+from GRF.ScenarioContext import ScenarioContext
+from usr_func.set_resume_state import set_resume_state
+from usr_func.get_resume_state import get_resume_state
 from Config import Config
 import numpy as np
+import os
 
 
 config = Config()
-num_cores = config.get_num_cores()
+num_cores = os.cpu_count()  # the scheduler balances the tasks itself, so every core is used.
 num_steps = config.get_num_steps()
 num_replicates = config.get_num_replicates()
 
@@ -20,37 +29,51 @@ print("Number of cores: ", num_cores, " | Number of steps: ",
       num_steps, " | Number of replicates: ", num_replicates)
 
 debug = False
-seeds = np.random.choice(10000, num_replicates, replace=False)
+seeds = np.random.choice(10000, num_replicates, replace=False)  # only used for replicates not in the manifest yet.
 
 weight_set = np.array([[2., 0.],
                        [0., 2.],
                        [1., 1.]])
-seed_weight_set = []
-counter = 0
-for seed in seeds:
-    for weight in weight_set:
-        seed_weight_set.append([counter, seed, weight[0], weight[1]])
-    counter += 1
-seed_weight_set = np.array(seed_weight_set)
+context = None  # scenario context, built once before the workers are forked so they all share it.
+store = None  # result store of the study, shared with the simulators.
 
-print("Weight set: ")
-print(seed_weight_set)
 
-
-def run_replicates(sws: np.ndarray = np.array([0, 102, 1., 1.])):
+def run_task(task: dict) -> None:
     """
-    This function runs the replicate study using two different agents in the same field.
+    This function runs one agent in one replicate, the results are saved by the simulator.
     """
-    i = int(sws[0])
-    seed = int(sws[1])
-    weight_eibv = sws[2]
-    weight_ivr = sws[3]
-    print("Replicate: ", i, " | Seed: ", seed, " | Weight EIBV: ", weight_eibv, " | Weight IVR: ", weight_ivr)
-    simulator = Simulator(weight_eibv=weight_eibv, weight_ivr=weight_ivr,
-                          random_seed=seed, replicate_id=i, debug=debug)
-    simulator.run_myopic()
-    simulator.run_rrt()
+    print("Replicate: ", task["replicate_id"], " | Seed: ", task["seed"], " | Weight EIBV: ", task["weight_eibv"],
+          " | Weight IVR: ", task["weight_ivr"], " | Agent: ", task["agent"])
+    simulator = Simulator(weight_eibv=task["weight_eibv"], weight_ivr=task["weight_ivr"],
+                          random_seed=task["seed"], replicate_id=task["replicate_id"], debug=debug,
+                          context=context, agents=(task["agent"], ), store=store)
+    if task["agent"] == "myopic":
+        simulator.run_myopic()
+    else:
+        simulator.run_rrt()
 
 
 if __name__ == "__main__":
-    Parallel(n_jobs=num_cores)(delayed(run_replicates)(sws) for sws in seed_weight_set)
+    # s0: resume the study if the last one was interrupted, else start from scratch.
+    resume = os.path.exists("resume_flag.txt") and get_resume_state()
+    scheduler = ReplicateScheduler(num_workers=num_cores)
+    folderpath_store = os.getcwd() + "/npy/temporal/Synced/store/"
+    if not resume:
+        scheduler.reset()
+        folderpath_old = rotate_store(folderpath_store)
+        if folderpath_old is not None:
+            print("Results of the previous study moved to ", folderpath_old)
+    set_resume_state(True)
+    scheduler.add_replicates(seeds, weight_set)
+    print("Resume: ", resume, " | Pending tasks: ", len(scheduler.get_pending_tasks()))
+
+    # s1: run the pending tasks.
+    context = ScenarioContext()
+    store = ResultStore(folderpath_store, make_study_schema(len(context.get_grid())))
+    scheduler.run(run_task)
+
+    # s2: the next study starts from scratch once all the tasks are done.
+    if len(scheduler.get_pending_tasks()) == 0:
+        set_resume_state(False)
+    else:
+        print("Failed tasks are run again on the next call.")
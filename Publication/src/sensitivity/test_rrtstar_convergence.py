@@ -2,6 +2,7 @@
 This script tests the convergence rate of rrt star in different cost field.
 """
 from Planner.RRTSCV.RRTStarCV import RRTStarCV
+from Planner.RRTSCV.MultiTreeRRTStarCV import MultiTreeRRTStarCV
 from Config import Config
 from Visualiser.TreePlotter import TreePlotter
 import matplotlib.pyplot as plt
@@ -21,7 +22,7 @@ class RRTStarCase:
         self.tp = TreePlotter()
         self.cv = self.rrtstar.get_CostValley()
         self.field = self.cv.get_field()
-        self.grid = self.cv.get_grid()
+        self.grid = self.field.get_grid()
         self.polygon_border = self.config.get_polygon_border()
         self.polygon_obstacle = self.config.get_polygon_obstacle()
 
@@ -122,6 +123,90 @@ class RRTStarCase:
 
             self.distance_traj.append(self.dist_itr)
 
+    def check_informed_sampling_convergence(self, max_iterations: np.ndarray = np.array([250, 500, 1000, 2000, 4000]),
+                                            num_seeds: int = 5, weight: float = 1.) -> tuple:
+        """
+        Compare the trajectory cost of uniform and informed sampling against the number of expansion iterations.
+        The target keeps its cheapest connection, as in anytime mode, so the costs only go down with more iterations.
+        The cost valley weights are scaled by weight, the informed ellipse is tighter when the distance cost dominates.
+        """
+        self.cv.set_weight_eibv(weight)
+        self.cv.set_weight_ivr(weight)
+        self.cv.update_cost_valley()
+        self.rrtstar.set_time_budget(np.inf)
+        self.rrtstar.set_background_improvement(False)
+        loc_now = np.array([1000, -1000])
+        loc_end = np.array([4000, 200])
+
+        self.cost_uniform = np.zeros([num_seeds, len(max_iterations)])
+        self.cost_informed = np.zeros_like(self.cost_uniform)
+        self.time_uniform = np.zeros_like(self.cost_uniform)
+        self.time_informed = np.zeros_like(self.cost_uniform)
+        for informed, cost, runtime in [(False, self.cost_uniform, self.time_uniform),
+                                        (True, self.cost_informed, self.time_informed)]:
+            self.rrtstar.set_informed_sampling(informed)
+            for i in range(num_seeds):
+                for j in range(len(max_iterations)):
+                    self.rrtstar.set_max_expansion_iteraions(max_iterations[j])
+                    self.rrtstar.set_random_seed(i)
+                    t1 = time.time()
+                    self.rrtstar.get_next_waypoint(loc_now, loc_end)
+                    runtime[i, j] = time.time() - t1
+                    cost[i, j] = self.rrtstar.get_planning_log()[-1]["cost"]
+        self.rrtstar.set_time_budget(None)
+        self.rrtstar.set_informed_sampling(False)
+
+        print("Iterations: ", max_iterations)
+        print("Median cost, uniform: ", np.median(self.cost_uniform, axis=0))
+        print("Median cost, informed: ", np.median(self.cost_informed, axis=0))
+        print("Mean time, uniform: ", np.mean(self.time_uniform, axis=0))
+        print("Mean time, informed: ", np.mean(self.time_informed, axis=0))
+        return self.cost_uniform, self.cost_informed
+
+    def check_multi_tree_convergence(self, time_budgets: np.ndarray = np.array([.5, 1., 2., 4.]), num_trees: int = None,
+                                     num_seeds: int = 5) -> tuple:
+        """
+        Compare the trajectory cost of one tree and the best of num_trees trees at the same time budget per call.
+        The trees grow in parallel, so the wall time only matches with one core per tree. One short plan runs before
+        the workers are forked, which keeps the numba compilation and the fork out of the timings.
+        """
+        loc_now = np.array([1000, -1000])
+        loc_end = np.array([4000, 200])
+        self.rrtstar.set_background_improvement(False)
+        self.rrtstar.set_max_expansion_iteraions(10)
+        self.rrtstar.get_next_waypoint(loc_now, loc_end)
+        self.rrtstar.set_max_expansion_iteraions(100000)
+        multi = MultiTreeRRTStarCV(self.rrtstar, num_trees=num_trees)
+        multi.start()
+
+        self.cost_single = np.zeros([num_seeds, len(time_budgets)])
+        self.cost_multi = np.zeros_like(self.cost_single)
+        self.time_single = np.zeros_like(self.cost_single)
+        self.time_multi = np.zeros_like(self.cost_single)
+        for i in range(num_seeds):
+            for j in range(len(time_budgets)):
+                self.rrtstar.set_time_budget(time_budgets[j])
+                self.rrtstar.set_random_seed(i * multi.get_num_trees())
+                t1 = time.time()
+                self.rrtstar.get_next_waypoint(loc_now, loc_end)
+                self.time_single[i, j] = time.time() - t1
+                self.cost_single[i, j] = self.rrtstar.get_planning_log()[-1]["cost"]
+
+                multi.set_seed(i * multi.get_num_trees())
+                t1 = time.time()
+                multi.get_next_waypoint(loc_now, loc_end)
+                self.time_multi[i, j] = time.time() - t1
+                self.cost_multi[i, j] = multi.get_cost_along_trajectory()
+        multi.close()
+        self.rrtstar.set_time_budget(None)
+
+        print("Time budget: ", time_budgets, ", trees: ", multi.get_num_trees())
+        print("Median cost, single tree: ", np.median(self.cost_single, axis=0))
+        print("Median cost, best of trees: ", np.median(self.cost_multi, axis=0))
+        print("Mean time, single tree: ", np.mean(self.time_single, axis=0))
+        print("Mean time, best of trees: ", np.mean(self.time_multi, axis=0))
+        return self.cost_single, self.cost_multi
+
     def get_distance_along_trajectory(self, traj: np.ndarray) -> float:
         dist = .0
         for i in range(traj.shape[0]-1):
@@ -133,6 +218,9 @@ if __name__ == "__main__":
     r = RRTStarCase()
     # r.test_updating_parameters()
     r.check_convergence_for_rrtstar()
+    # r.check_informed_sampling_convergence()
+    # r.check_informed_sampling_convergence(weight=.01)
+    # r.check_multi_tree_convergence()
 
 #%%
 d = np.array(r.distance_traj)
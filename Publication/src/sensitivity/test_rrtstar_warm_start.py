@@ -0,0 +1,96 @@
+"""
+This script benchmarks the warm started rrt star against growing a new tree for every waypoint.
+
+Both planners follow the same simulated mission: at every step they plan from the same location towards the minimum
+cost location, the vehicle moves to the waypoint of the cold started planner, and the same CTD data is assimilated
+into both cost valleys. The path cost of each trajectory is evaluated on the cost valley it was planned on.
+"""
+from Planner.RRTSCV.RRTStarCV import RRTStarCV
+from Config import Config
+import matplotlib.pyplot as plt
+import numpy as np
+import time
+
+
+class WarmStartCase:
+
+    def __init__(self, num_steps: int = 30, random_seed: int = 0) -> None:
+        self.config = Config()
+        self.num_steps = num_steps
+        self.random_seed = random_seed
+
+        self.rrtstar_cold = RRTStarCV()
+        self.rrtstar_warm = RRTStarCV()
+        self.rrtstar_warm.set_warm_start(True)
+        self.planners = [self.rrtstar_cold, self.rrtstar_warm]
+        self.labels = ["Cold start", "Warm start"]
+
+        # simulated truth drawn from the prior.
+        np.random.seed(self.random_seed)
+        grf = self.rrtstar_cold.get_CostValley().get_grf_model()
+        self.field = grf.field
+        self.mu_truth = grf.get_mu() + grf.get_cholesky_prior() @ np.random.randn(len(grf.get_mu())).reshape(-1, 1)
+
+        self.runtime = np.zeros([self.num_steps, len(self.planners)])
+        self.cost = np.zeros_like(self.runtime)
+        self.num_nodes = np.zeros_like(self.runtime)
+
+    def run(self) -> None:
+        loc_now = self.config.get_loc_start()
+        for i in range(self.num_steps):
+            loc_end = self.rrtstar_cold.get_CostValley().get_minimum_cost_location()
+            wps = []
+            for j, planner in enumerate(self.planners):
+                planner.set_random_seed(self.random_seed + i)
+                t1 = time.time()
+                wps.append(planner.get_next_waypoint(loc_now, loc_end))
+                self.runtime[i, j] = time.time() - t1
+                self.cost[i, j] = self.get_cost_along_trajectory(planner)
+                self.num_nodes[i, j] = len(planner.get_tree())
+            print("Step {:d}: ".format(i) + ", ".join("{:s} {:.2f}s cost {:.2f}".format(
+                label, t, c) for label, t, c in zip(self.labels, self.runtime[i], self.cost[i])))
+
+            # s1: move to the waypoint of the cold started planner and assimilate the same data into both.
+            wp = wps[0]
+            x = np.linspace(loc_now[0], wp[0], 20)
+            y = np.linspace(loc_now[1], wp[1], 20)
+            ind = self.field.get_ind_from_location(np.stack((x, y), axis=1))
+            dataset = np.stack((x, y, self.mu_truth[ind].flatten()), axis=1)
+            for planner in self.planners:
+                planner.get_CostValley().get_grf_model().assimilate_data(dataset)
+                planner.get_CostValley().update_cost_valley(wp)
+            loc_now = wp
+
+    @staticmethod
+    def get_cost_along_trajectory(planner: 'RRTStarCV') -> float:
+        """ Distance cost plus cost valley integral along the trajectory, independent of the tree costs. """
+        traj = planner.get_trajectory()
+        dist = np.sqrt(np.sum(np.diff(traj, axis=0) ** 2, axis=1))
+        cost_costvalley = planner.get_CostValley().get_cost_along_paths(traj[:-1], traj[1:],
+                                                                        planner.get_edge_cost_samples())
+        return float(np.sum(dist / planner.get_stepsize() + cost_costvalley))
+
+    def plot_results(self) -> None:
+        fig = plt.figure(figsize=(15, 6))
+        ax = fig.add_subplot(121)
+        for j, label in enumerate(self.labels):
+            ax.plot(self.runtime[:, j], label=label)
+        ax.set_xlabel("Step")
+        ax.set_ylabel("Runtime [s]")
+        ax.legend()
+        ax = fig.add_subplot(122)
+        for j, label in enumerate(self.labels):
+            ax.plot(self.cost[:, j], label=label)
+        ax.set_xlabel("Step")
+        ax.set_ylabel("Path cost")
+        ax.legend()
+        plt.show()
+
+
+if __name__ == "__main__":
+    w = WarmStartCase()
+    w.run()
+    print("Mean runtime: ", dict(zip(w.labels, np.mean(w.runtime, axis=0))))
+    print("Mean path cost: ", dict(zip(w.labels, np.mean(w.cost, axis=0))))
+    print("Warm / cold path cost: ", np.median(w.cost[:, 1] / w.cost[:, 0]))
+    # w.plot_results()
@@ -0,0 +1,189 @@
+"""
+Unittest for the asynchronous planning service.
+The protocol is checked on a stub planner whose plan takes a set time and can be cancelled like rrt*, and the
+cancellation of a running rrt* on the real planner.
+"""
+from unittest import TestCase
+from Planner.AsyncPlanner import AsyncPlanner
+from Planner.Planner import Planner
+from threading import Event
+from time import time, sleep
+import numpy as np
+from numpy import testing
+
+
+class StubRRTStar:
+    """ The part of RRTStarCV used by AsyncPlanner, it doubles as the cost valley. """
+    def __init__(self) -> None:
+        self.cancelled = Event()
+
+    def get_CostValley(self) -> 'StubRRTStar':
+        return self
+
+    def get_minimum_cost_location(self) -> np.ndarray:
+        return np.array([1000., 0.])
+
+    def get_stepsize(self) -> float:
+        return 120.
+
+    def set_cancelled(self, value: bool) -> None:
+        self.cancelled.set() if value else self.cancelled.clear()
+
+    def stop_improvement(self) -> None:
+        pass
+
+    def is_location_legal_many(self, locs: np.ndarray) -> np.ndarray:
+        return np.ones(len(locs), dtype=bool)
+
+    def is_path_legal_many(self, locs1: np.ndarray, locs2: np.ndarray) -> np.ndarray:
+        return np.ones(len(locs1), dtype=bool)
+
+
+class StubPlanner:
+    """ Plans one step along x in duration seconds, publishing one step along y first if publish is set. """
+    def __init__(self, duration: float = 0., publish: bool = False) -> None:
+        self.rrtstar = StubRRTStar()
+        self.duration = duration
+        self.publish = publish
+        self.data = []
+        self.started = Event()
+        self.wp_next = np.array([0., 0.])
+        self.wp_pion = np.array([0., 120.])
+        self.num_published = 0
+
+    def update_pioneer_waypoint(self, ctd_data: np.ndarray) -> None:
+        self.data.append(ctd_data)
+        if self.publish:
+            self.wp_pion = self.wp_next + np.array([0., 120.])
+            self.num_published += 1
+        self.started.set()
+        t0 = time()
+        while time() - t0 < self.duration and not self.rrtstar.cancelled.is_set():
+            sleep(.001)
+        if not self.rrtstar.cancelled.is_set():
+            self.wp_pion = self.wp_next + np.array([120., 0.])
+
+    def update_planning_trackers(self) -> None:
+        self.wp_next = self.wp_pion
+
+    def set_pioneer_waypoint(self, wp: np.ndarray) -> None:
+        self.wp_pion = wp
+
+    def get_pioneer_waypoint(self) -> np.ndarray:
+        return self.wp_pion
+
+    def get_next_waypoint(self) -> np.ndarray:
+        return self.wp_next
+
+    def get_num_published(self) -> int:
+        return self.num_published
+
+    def get_rrtstarcv(self) -> 'StubRRTStar':
+        return self.rrtstar
+
+
+class TestAsyncPlanner(TestCase):
+
+    def setUp(self) -> None:
+        self.ctd = np.array([[1623450000, 0., 0., 25.]])
+
+    def test_plan_in_time(self) -> None:
+        planner = StubPlanner(duration=.01)
+        async_planner = AsyncPlanner(planner)
+        async_planner.update_planning_trackers()
+        async_planner.submit(self.ctd)
+
+        # c1: the plan is ready before the timeout, its waypoint is taken and no fallback is counted.
+        wp = async_planner.update_planning_trackers(timeout=10.)
+        testing.assert_array_equal(wp, [120., 120.])
+        testing.assert_array_equal(planner.get_next_waypoint(), [120., 120.])
+        self.assertEqual(async_planner.get_num_fallbacks(), 0)
+        self.assertEqual(len(planner.data), 1)
+        async_planner.shutdown()
+
+    def test_timeout(self) -> None:
+        planner = StubPlanner(duration=10.)
+        async_planner = AsyncPlanner(planner)
+        async_planner.update_planning_trackers()
+        async_planner.submit(self.ctd)
+        planner.started.wait()
+
+        # c1: with nothing published, the late plan gives the fallback towards the minimum cost location.
+        t0 = time()
+        wp = async_planner.update_planning_trackers(timeout=0)
+        self.assertLess(time() - t0, 5.)
+        heading = np.array([1000., 0.]) - [0., 120.]
+        testing.assert_array_almost_equal(wp, [0., 120.] + 120. * heading / np.linalg.norm(heading))
+        testing.assert_array_equal(wp, async_planner.get_fallback_waypoint())
+        self.assertEqual(async_planner.get_num_fallbacks(), 1)
+        self.assertFalse(planner.rrtstar.cancelled.is_set())
+
+        # c2: a waypoint published for the late plan is taken instead of the fallback.
+        planner.publish = True
+        planner.started.clear()
+        wp_next = planner.get_next_waypoint()
+        async_planner.submit(self.ctd)
+        planner.started.wait()
+        wp = async_planner.update_planning_trackers(timeout=0)
+        testing.assert_array_equal(wp, wp_next + [0., 120.])
+        self.assertEqual(async_planner.get_num_fallbacks(), 2)
+        async_planner.shutdown()
+
+    def test_cancel_before_start(self) -> None:
+        planner = StubPlanner()
+        async_planner = AsyncPlanner(planner)
+        # keep the worker busy, so the plan is still queued when it is cancelled.
+        busy = Event()
+        async_planner._AsyncPlanner__executor.submit(busy.wait)
+        future = async_planner.submit(self.ctd)
+        async_planner.cancel()
+        busy.set()
+
+        # c1: the data is never assimilated, the pioneer waypoint stays as it was.
+        self.assertTrue(future.cancelled())
+        self.assertTrue(async_planner.is_ready())
+        self.assertEqual(len(planner.data), 0)
+        testing.assert_array_equal(async_planner.get_pioneer_waypoint(), async_planner.get_fallback_waypoint())
+        async_planner.shutdown()
+        self.assertEqual(len(planner.data), 0)
+
+    def test_cancel_while_running(self) -> None:
+        planner = StubPlanner(duration=10.)
+        async_planner = AsyncPlanner(planner)
+        async_planner.submit(self.ctd)
+        planner.started.wait()
+
+        # c1: the running plan stops at once, its data is kept and the worker is idle again.
+        t0 = time()
+        async_planner.cancel()
+        self.assertLess(time() - t0, 5.)
+        self.assertTrue(async_planner.is_ready())
+        self.assertEqual(len(planner.data), 1)
+        self.assertFalse(planner.rrtstar.cancelled.is_set())
+        async_planner.shutdown()
+
+
+class TestAsyncPlannerRRTStar(TestCase):
+
+    def test_cancel_while_rrtstar_runs(self) -> None:
+        planner = Planner()
+        rrtstar = planner.get_rrtstarcv()
+        rrtstar.set_max_expansion_iteraions(100000)
+        async_planner = AsyncPlanner(planner)
+        wp_next = planner.get_next_waypoint()
+        async_planner.submit(np.array([[1623450000, wp_next[0], wp_next[1], 25.]]))
+        sleep(1.)
+
+        # c1: rrt* stops before its iterations run out and cancel returns once the worker is idle.
+        t0 = time()
+        async_planner.cancel()
+        self.assertLess(time() - t0, 5.)
+        self.assertTrue(async_planner.is_ready())
+        self.assertLess(rrtstar.get_planning_log()[-1]["iterations"], 100000)
+
+        # c2: the next plan runs in full.
+        rrtstar.set_max_expansion_iteraions(200)
+        async_planner.submit(np.array([[1623450600, wp_next[0], wp_next[1], 25.]]))
+        async_planner.get_pioneer_waypoint()
+        self.assertEqual(rrtstar.get_planning_log()[-1]["iterations"], 200)
+        async_planner.shutdown()
@@ -0,0 +1,50 @@
+"""
+Unittest for the cdf table lookup.
+"""
+from unittest import TestCase
+from GRF.CDFTable import CDFTable
+import numpy as np
+from numpy import testing
+
+
+class TestCDFTable(TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        self.z1 = np.linspace(-4, 4, 41)
+        self.z2 = np.linspace(-4, 4, 41)
+        self.rho = np.linspace(-1, 0, 21)
+        self.cdf = np.random.rand(41, 41, 21)
+        self.z1_q = np.random.uniform(-5, 5, 500)
+        self.z2_q = np.random.uniform(-5, 5, 500)
+        self.rho_q = np.random.uniform(-1.2, .2, 500)
+
+    def get_argmin_lookup(self, z1, z2, rho, cdf) -> np.ndarray:
+        values = []
+        for a, b, c in zip(self.z1_q, self.z2_q, self.rho_q):
+            values.append(cdf[np.argmin(np.abs(a - z1)), np.argmin(np.abs(b - z2)), np.argmin(np.abs(c - rho))])
+        return np.array(values)
+
+    def test_nearest_lookup_matches_argmin(self) -> None:
+        # c1: uniform axes
+        table = CDFTable(self.z1, self.z2, self.rho, self.cdf)
+        expected = self.get_argmin_lookup(self.z1, self.z2, self.rho, self.cdf)
+        testing.assert_array_equal(table.lookup(self.z1_q, self.z2_q, self.rho_q), expected)
+
+        # c2: non-uniform axis falls back to searchsorted
+        z1 = np.sort(np.append(self.z1, [.05, .13]))
+        cdf = np.random.rand(len(z1), 41, 21)
+        table = CDFTable(z1, self.z2, self.rho, cdf)
+        expected = self.get_argmin_lookup(z1, self.z2, self.rho, cdf)
+        testing.assert_array_equal(table.lookup(self.z1_q, self.z2_q, self.rho_q), expected)
+
+    def test_trilinear_lookup(self) -> None:
+        table = CDFTable(self.z1, self.z2, self.rho, self.cdf, interpolate=True)
+        # c1: exact at the table nodes
+        testing.assert_allclose(table.lookup(self.z1[[3, 7]], self.z2[[5, 40]], self.rho[[0, 20]]),
+                                self.cdf[[3, 7], [5, 40], [0, 20]])
+
+        # c2: linear in between two nodes
+        z1 = (self.z1[3] + self.z1[4]) / 2
+        value = table.lookup(np.array([z1]), self.z2[[5]], self.rho[[2]])
+        testing.assert_allclose(value, (self.cdf[3, 5, 2] + self.cdf[4, 5, 2]) / 2)
@@ -0,0 +1,82 @@
+"""
+Unittest for the cost raster.
+It checks the interpolation and the path integrals on a linear field, where both are exact.
+"""
+from unittest import TestCase
+from CostValley.CostRaster import CostRaster
+from multiprocessing import get_context
+import numpy as np
+from numpy import testing
+
+
+_raster = None  # raster inherited by the forked processes.
+
+
+def _get_values(locs: np.ndarray) -> np.ndarray:
+    return _raster.get_values(locs)
+
+
+class TestCostRaster(TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        x, y = np.meshgrid(np.arange(0, 2000, 100), np.arange(0, 2000, 100))
+        self.grid = np.stack((x.flatten(), y.flatten()), axis=1) + np.random.uniform(-20, 20, (x.size, 2))
+        self.raster = CostRaster(self.grid, resolution=25.)
+        self.a, self.b, self.c = .3, -.2, 4.
+        self.raster.set_values(self.linear(self.grid))
+
+    def linear(self, locs: np.ndarray) -> np.ndarray:
+        return self.a + self.b * locs[..., 0] / 1000 + self.c * locs[..., 1] / 1000
+
+    def test_interpolation(self) -> None:
+        locs = np.random.uniform(200, 1700, (500, 2))
+        testing.assert_allclose(self.raster.get_values(locs), self.linear(locs))
+
+    def test_cost_along_paths(self) -> None:
+        starts = np.random.uniform(200, 1700, (500, 2))
+        ends = starts + np.random.uniform(-150, 150, (500, 2))
+        dist = np.linalg.norm(ends - starts, axis=1)
+        expected = (self.linear(starts) + self.linear(ends)) / 2 * dist
+        for n_samples in [2, 5, 11]:
+            testing.assert_allclose(self.raster.get_cost_along_paths(starts, ends, n_samples), expected)
+
+        # c2: a single end location is shared by all the paths.
+        cost = self.raster.get_cost_along_paths(starts, ends[0], 5)
+        testing.assert_allclose(cost, self.raster.get_cost_along_paths(starts, np.tile(ends[0], (500, 1)), 5))
+
+    def test_outside_raster(self) -> None:
+        # c1: samples outside the raster take the value at its border, the same as the point lookup.
+        starts = np.random.uniform(-1000, 3000, (50, 2))
+        ends = np.random.uniform(-1000, 3000, (50, 2))
+        t = np.linspace(0, 1, 5)
+        samples = starts[:, np.newaxis, :] + t[:, np.newaxis] * (ends - starts)[:, np.newaxis, :]
+        w = np.array([.5, 1, 1, 1, .5]) / 4
+        expected = self.raster.get_values(samples) @ w * np.linalg.norm(ends - starts, axis=1)
+        testing.assert_allclose(self.raster.get_cost_along_paths(starts, ends, 5), expected)
+
+    def test_infinite_cost(self) -> None:
+        values = np.zeros(len(self.grid))
+        values[0] = np.inf
+        self.raster.set_values(values)
+        cost = self.raster.get_cost_along_paths(self.grid[:50], self.grid[50:100], 5)
+        self.assertFalse(np.any(np.isnan(cost)))
+        self.assertGreater(self.raster.get_cost_along_paths(self.grid[1], self.grid[0], 5)[0], 1e100)
+
+    def test_shared_raster(self) -> None:
+        global _raster
+        locs = np.random.uniform(200, 1700, (50, 2))
+        values = self.raster.get_values(locs)
+        self.raster.share()
+        self.assertTrue(self.raster.is_shared())
+        testing.assert_array_equal(self.raster.get_values(locs), values)
+
+        # c2: a process forked before the update reads the updated raster.
+        _raster = self.raster
+        with get_context("fork").Pool(1) as pool:
+            self.raster.set_values(2 * self.linear(self.grid))
+            testing.assert_allclose(pool.apply(_get_values, (locs, )), 2 * values)
+
+        self.raster.release()
+        self.assertFalse(self.raster.is_shared())
+        testing.assert_allclose(self.raster.get_values(locs), 2 * values)
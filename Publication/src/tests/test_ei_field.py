@@ -0,0 +1,106 @@
+"""
+Unittest for the batched EI field engine.
+It checks the batched computation against the per-node outer product formulation.
+"""
+from unittest import TestCase
+from GRF.EIField import EIField
+from GRF.CDFTable import CDFTable
+from scipy.spatial.distance import cdist
+from scipy.stats import norm
+import numpy as np
+from numpy import testing
+
+
+class TestEIField(TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        self.threshold = 26.8
+        self.nugget = .1
+        grid = np.random.uniform(0, 1000, (60, 2))
+        eta = 4.5 / 700
+        dm = cdist(grid, grid)
+        self.Sigma = .5 ** 2 * (1 + eta * dm) * np.exp(-eta * dm)
+        self.mu = self.threshold + np.random.randn(len(grid), 1) * .5
+        self.ei = EIField(threshold=self.threshold, nugget=self.nugget, approximate_eibv=True)
+
+    def test_ei_field_matches_outer_product(self) -> None:
+        N = self.Sigma.shape[0]
+        eibv_ref = np.zeros(N)
+        ivr_ref = np.zeros(N)
+        for i in range(N):
+            SF = self.Sigma[:, i].reshape(-1, 1)
+            VR = SF @ SF.T / (self.Sigma[i, i] + self.nugget)
+            sigma_diag = np.diag(self.Sigma - VR).reshape(-1, 1)
+            p = norm.cdf(self.threshold, self.mu, np.sqrt(sigma_diag))
+            eibv_ref[i] = np.sum(p * (1 - p))
+            ivr_ref[i] = np.sum(np.diag(VR))
+
+        eibv, ivr = self.ei.get_ei_field(self.mu, self.Sigma)
+        testing.assert_allclose(eibv, eibv_ref)
+        testing.assert_allclose(ivr, ivr_ref)
+
+    def test_exact_eibv_matches_outer_product(self) -> None:
+        # s1: a small synthetic cdf table, uniform in z1 and z2 and non-uniform in rho.
+        cdf_z1 = np.linspace(-4, 4, 41)
+        cdf_z2 = np.linspace(-4, 4, 41)
+        cdf_rho = -np.linspace(1, 0, 21) ** 2
+        cdf_table = np.random.uniform(0, .25, (len(cdf_z1), len(cdf_z2), len(cdf_rho)))
+        ei = EIField(threshold=self.threshold, nugget=self.nugget)
+        ei.set_cdf_table(CDFTable(cdf_z1, cdf_z2, cdf_rho, cdf_table))
+
+        # s2: the per-node outer product with the argmin lookup in the table.
+        N = self.Sigma.shape[0]
+        eibv_ref = np.zeros(N)
+        ivr_ref = np.zeros(N)
+        for i in range(N):
+            SF = self.Sigma[:, i].reshape(-1, 1)
+            VR = SF @ SF.T / (self.Sigma[i, i] + self.nugget)
+            sigma_diag = np.diag(self.Sigma - VR)
+            vr_diag = np.diag(VR)
+            for j in range(N):
+                mur = (self.threshold - self.mu[j, 0]) / np.sqrt(sigma_diag[j])
+                rho = -vr_diag[j] / (sigma_diag[j] + vr_diag[j])
+                ind1 = np.argmin(np.abs(mur - cdf_z1))
+                ind2 = np.argmin(np.abs(-mur - cdf_z2))
+                ind3 = np.argmin(np.abs(rho - cdf_rho))
+                eibv_ref[i] += cdf_table[ind1][ind2][ind3]
+            ivr_ref[i] = np.sum(vr_diag)
+
+        # c1: the batched table lookup gives the same fields.
+        eibv, ivr = ei.get_ei_field(self.mu, self.Sigma)
+        testing.assert_allclose(eibv, eibv_ref)
+        testing.assert_allclose(ivr, ivr_ref)
+
+    def test_incremental_matches_full_recompute(self) -> None:
+        # s1: a larger field, so that a local update leaves most of the candidates untouched.
+        x, y = np.meshgrid(np.arange(0, 6000, 200), np.arange(0, 6000, 200))
+        grid = np.stack((x.flatten(), y.flatten()), axis=1)
+        eta = 4.5 / 700
+        dm = cdist(grid, grid)
+        Sigma = .5 ** 2 * (1 + eta * dm) * np.exp(-eta * dm)
+        mu = self.threshold + np.random.randn(len(grid), 1) * .5
+        ei_full = EIField(threshold=self.threshold, nugget=self.nugget, approximate_eibv=True)
+        ei_incr = EIField(threshold=self.threshold, nugget=self.nugget, approximate_eibv=True)
+        ei_incr.set_incremental(True)
+
+        # c1: the first update recomputes all candidates.
+        eibv, ivr = ei_incr.get_ei_field(mu, Sigma)
+        testing.assert_allclose(eibv, ei_full.get_ei_field(mu, Sigma)[0])
+        self.assertEqual(ei_incr.get_recomputed_fraction(), 1.)
+
+        # c2: assimilate at a few nodes, one at a time, and compare with the full recompute.
+        for ind in [0, 1, 31, 450, 451, 899]:
+            SF = Sigma[:, ind].reshape(-1, 1)
+            C = Sigma[ind, ind] + self.nugget
+            mu = mu + SF / C * (self.threshold - mu[ind])
+            Sigma = Sigma - SF @ SF.T / C
+            eibv, ivr = ei_incr.get_ei_field(mu, Sigma)
+            eibv_ref, ivr_ref = ei_full.get_ei_field(mu, Sigma)
+            testing.assert_allclose(eibv, eibv_ref, rtol=1e-6)
+            testing.assert_allclose(ivr, ivr_ref)
+            self.assertLess(ei_incr.get_recomputed_fraction(), .5)
+
+        # c3: nothing changed, nothing is recomputed.
+        testing.assert_allclose(ei_incr.get_ei_field(mu, Sigma)[0], eibv_ref, rtol=1e-6)
+        self.assertEqual(ei_incr.get_recomputed_fraction(), 0.)
@@ -46,6 +46,23 @@ class TestField(TestCase):
                 break
         self.assertTrue(s)
 
+    def test_grid_lattice(self):
+        """ Test the vectorized lattice follows the staggered double loop order and is cached. """
+        f = Field(neighbour_distance=240)
+        xlim, ylim = f.get_border_limits()
+        xgap = 240 * np.sin(np.radians(60))
+        ygap = 240 * np.cos(np.radians(60)) * 2
+        gx = np.arange(xlim[0], xlim[1], xgap)
+        gy = np.arange(ylim[0], ylim[1], ygap)
+        grid = []
+        for i in range(len(gx)):
+            for j in range(len(gy)):
+                loc = np.array([gx[i], gy[j] + ygap / 2 if i % 2 == 0 else gy[j]])
+                if f.border_contains(loc) and not f.obstacle_contains(loc):
+                    grid.append(loc)
+        self.assertTrue(np.array_equal(f.get_grid(), np.array(grid)))
+        self.assertTrue(np.array_equal(Field(neighbour_distance=240).get_grid(), f.get_grid()))
+
     def test_get_locations_from_ind(self):
         # c1: empty ind
         wp = self.f.get_location_from_ind([])
@@ -139,6 +156,28 @@ class TestField(TestCase):
         c = self.f.is_border_in_the_way(np.array([x1, y1]), np.array([x2, y2]))
         self.assertFalse(c)
 
+    def test_contains_many(self):
+        """ Test batch containment matches the scalar checks. """
+        xlim, ylim = self.f.get_border_limits()
+        locs = np.stack((np.random.uniform(xlim[0], xlim[1], 200), np.random.uniform(ylim[0], ylim[1], 200)), axis=1)
+        c = self.f.contains_many(locs)
+        for i in range(len(locs)):
+            self.assertEqual(c[i], self.f.border_contains(locs[i]) and not self.f.obstacle_contains(locs[i]))
+        self.assertTrue(np.all(self.f.contains_many(self.grid)))
+
+    def test_segments_intersect_many(self):
+        """ Test batch segment checks match the scalar checks. """
+        starts = np.array([[0, 0], [0, 0], [0, 0]])
+        ends = np.array([[5000, 0], [5000, 10], [1000, 1000]])
+        c = self.f.segments_intersect_many(starts, ends)
+        self.assertEqual(list(c), [True, True, False])
+        ends = self.grid[np.random.randint(0, len(self.grid), 100)]
+        starts = np.tile(self.grid[0], (len(ends), 1))
+        c = self.f.segments_intersect_many(starts, ends)
+        for i in range(len(ends)):
+            self.assertEqual(c[i], self.f.is_border_in_the_way(starts[i], ends[i]) or
+                             self.f.is_obstacle_in_the_way(starts[i], ends[i]))
+
     def test_get_neighbours(self):
         # c1: get one neighbour
         N = len(self.grid)
@@ -164,7 +203,23 @@ class TestField(TestCase):
                                (loc[1] - loc_now[1]) ** 2)
                 self.assertLess(dist, nd + .01*nd)
 
-        # c3: multiple neighbour test.
+        # c3: neighbour table against brute force distances.
+        dist = cdist(self.grid, self.grid)
+        for ind in np.random.randint(0, N, 20):
+            expected = np.where((dist[ind] <= nd + .01 * nd) * (dist[ind] >= nd - .01 * nd))[0]
+            self.assertTrue(np.array_equal(self.f.get_neighbour_indices(int(ind)), expected))
+
+        # c4: neighbours of several nodes are gathered and unique.
+        ind = np.random.randint(0, N, 10)
+        expected = np.unique(np.concatenate([self.f.get_neighbour_indices(i) for i in ind]))
+        self.assertTrue(np.array_equal(self.f.get_neighbour_indices(ind), expected))
+
+        # c5: edges of several nodes keep the shared neighbours apart.
+        pos, indn = self.f.get_neighbour_edges(ind)
+        for i in range(len(ind)):
+            self.assertTrue(np.array_equal(indn[pos == i], self.f.get_neighbour_indices(int(ind[i]))))
+
+        # c6: multiple neighbour test.
         # loc = np.array([6000, 8000])
         # ind = self.f.get_ind_from_location(loc)
         # indn = self.f.get_neighbour_indices(ind)
@@ -0,0 +1,46 @@
+"""
+Unittest for the rasterized legality map, all the answers have to match shapely exactly.
+"""
+from unittest import TestCase
+from Config import Config
+from LegalityMap import LegalityMap
+from shapely.geometry import Point, LineString
+import numpy as np
+from numpy import testing
+
+
+class TestLegalityMap(TestCase):
+
+    def setUp(self) -> None:
+        self.c = Config()
+        self.lm = LegalityMap(self.c.get_polygon_border(), self.c.get_polygon_obstacle())
+        np.random.seed(0)
+        xmin, ymin, xmax, ymax = self.c.get_polygon_border_shapely().bounds
+        self.starts = np.stack((np.random.uniform(xmin - 100, xmax + 100, 2000),
+                                np.random.uniform(ymin - 100, ymax + 100, 2000)), axis=1)
+        angle = np.random.uniform(0, 2 * np.pi, 2000)
+        length = np.random.uniform(0, 300, 2000)
+        self.ends = self.starts + np.stack((length * np.sin(angle), length * np.cos(angle)), axis=1)
+        # points on the outline have to go through the exact fallback.
+        self.starts[:20] = self.c.get_polygon_border()[:20]
+
+    def test_points(self) -> None:
+        border = np.array([self.c.get_polygon_border_shapely().contains(Point(p)) for p in self.starts])
+        obstacle = np.array([self.c.get_polygon_obstacle_shapely().contains(Point(p)) for p in self.starts])
+        testing.assert_array_equal(self.lm.border_contains_many(self.starts), border)
+        testing.assert_array_equal(self.lm.obstacle_contains_many(self.starts), obstacle)
+        testing.assert_array_equal([self.lm.border_contains(p) for p in self.starts], border)
+        testing.assert_array_equal([self.lm.obstacle_contains(p) for p in self.starts], obstacle)
+        testing.assert_array_equal(self.lm.is_location_legal_many(self.starts), border & ~obstacle)
+
+    def test_segments(self) -> None:
+        lines = [LineString([p1, p2]) for p1, p2 in zip(self.starts, self.ends)]
+        border = np.array([self.c.get_line_border_shapely().intersects(line) for line in lines])
+        obstacle = np.array([self.c.get_line_obstacle_shapely().intersects(line) for line in lines])
+        testing.assert_array_equal(self.lm.is_border_in_the_way_many(self.starts, self.ends), border)
+        testing.assert_array_equal(self.lm.is_obstacle_in_the_way_many(self.starts, self.ends), obstacle)
+        testing.assert_array_equal([self.lm.is_border_in_the_way(p1, p2) for p1, p2 in zip(self.starts, self.ends)],
+                                   border)
+        testing.assert_array_equal([self.lm.is_obstacle_in_the_way(p1, p2)
+                                    for p1, p2 in zip(self.starts, self.ends)], obstacle)
+        testing.assert_array_equal(self.lm.is_path_legal_many(self.starts, self.ends), ~border & ~obstacle)
@@ -0,0 +1,76 @@
+"""
+Unittest for the best of K rrt* trees grown in a process pool.
+"""
+from unittest import TestCase
+from Planner.RRTSCV.RRTStarCV import RRTStarCV
+from Planner.RRTSCV.MultiTreeRRTStarCV import MultiTreeRRTStarCV
+import numpy as np
+from numpy import testing
+
+
+class TestMultiTreeRRTStar(TestCase):
+
+    def setUp(self) -> None:
+        self.loc_start = np.array([2000., -1000.])
+        self.loc_target = np.array([4000., 1000.])
+        self.rrtstar = RRTStarCV()
+        self.rrtstar.set_max_expansion_iteraions(400)
+        self.multi = MultiTreeRRTStarCV(self.rrtstar, num_trees=3)
+
+    def tearDown(self) -> None:
+        self.multi.close()
+
+    def test_best_of_trees(self) -> None:
+        # s1: the seed 0 tree on its own, before the workers are forked.
+        self.rrtstar.set_random_seed(0)
+        self.rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+        cost_single = self.rrtstar.get_planning_log()[-1]["cost"]
+
+        # c1: the first tree is the seed 0 tree, the cheapest of the trees is kept.
+        self.multi.set_seed(0)
+        wp = self.multi.get_next_waypoint(self.loc_start, self.loc_target)
+        costs = self.multi.get_costs()
+        self.assertEqual(len(costs), 3)
+        self.assertAlmostEqual(costs[0], cost_single)
+        self.assertLessEqual(self.multi.get_cost_along_trajectory(), cost_single)
+        self.assertEqual(self.multi.get_cost_along_trajectory(), np.amin(costs))
+        self.assertAlmostEqual(np.linalg.norm(wp - self.loc_start), self.rrtstar.get_stepsize())
+        testing.assert_array_equal(self.multi.get_iterations(), [400, 400, 400])
+
+        # c2: the spread of the call is in the planning log.
+        record = self.multi.get_planning_log()[-1]
+        self.assertEqual(record["iterations"], 1200)
+        self.assertEqual((record["cost"], record["cost_median"], record["cost_max"]), self.multi.get_cost_spread())
+
+    def test_reproducible(self) -> None:
+        self.multi.set_seed(5)
+        wp = self.multi.get_next_waypoint(self.loc_start, self.loc_target)
+        costs = self.multi.get_costs()
+        trajectory = self.multi.get_trajectory()
+
+        # c1: the next call moves on to the next seeds.
+        self.multi.get_next_waypoint(self.loc_start, self.loc_target)
+        self.assertFalse(np.array_equal(self.multi.get_costs(), costs))
+
+        # c2: the same seed gives the same trees.
+        self.multi.set_seed(5)
+        testing.assert_array_equal(self.multi.get_next_waypoint(self.loc_start, self.loc_target), wp)
+        testing.assert_array_equal(self.multi.get_costs(), costs)
+        testing.assert_array_equal(self.multi.get_trajectory(), trajectory)
+
+    def test_close(self) -> None:
+        raster = self.rrtstar.get_CostValley().get_cost_raster()
+        values = raster.get_raster().copy()
+
+        # c1: the raster is shared while the workers run, and back in private memory after close.
+        self.multi.start()
+        self.assertTrue(raster.is_shared())
+        self.multi.close()
+        self.assertFalse(raster.is_shared())
+        testing.assert_array_equal(raster.get_raster(), values)
+
+        # c2: the workers are forked again on the next call.
+        self.multi.get_next_waypoint(self.loc_start, self.loc_target)
+        self.assertTrue(raster.is_shared())
+        self.multi.close()
+        self.assertFalse(raster.is_shared())
@@ -9,12 +9,38 @@ from Config import Config
 from Field import Field
 from unittest import TestCase
 from Planner.Myopic2D.Myopic2D import Myopic2D
+from unittest.mock import patch
 import matplotlib.pyplot as plt
 import numpy as np
+from numpy import testing
 # from matplotlib.cm import get_cmap
 from matplotlib.pyplot import get_cmap
 
 
+def get_lookahead_costs_brute_force(field: 'Field', cost_valley: 'CostValley', wp_candidates: np.ndarray,
+                                    depth: int, revisit: bool = False) -> np.ndarray:
+    """ Cheapest path of depth waypoints from each candidate, by enumerating all of them one by one. """
+    grid = field.get_grid()
+
+    def cheapest(loc: np.ndarray, visited: list, level: int) -> float:
+        if level == depth:
+            return 0.
+        best = np.inf
+        for ind in field.get_neighbour_indices(int(visited[-1])):
+            if (not revisit and ind in visited) or field.is_border_in_the_way(loc, grid[ind]) or \
+                    field.is_obstacle_in_the_way(loc, grid[ind]):
+                continue
+            cost = cost_valley.get_cost_at_locations(grid[ind].reshape(1, 2))[0]
+            best = min(best, cost + cheapest(grid[ind], visited + [ind], level + 1))
+        return best
+
+    costs = np.zeros(len(wp_candidates))
+    for i, wp in enumerate(wp_candidates):
+        ind = int(np.asarray(field.get_ind_from_location(wp)).ravel()[0])
+        costs[i] = cost_valley.get_cost_at_locations(wp.reshape(1, 2))[0] + cheapest(wp, [ind], 1)
+    return costs
+
+
 class TestMyopic2D(TestCase):
     def setUp(self) -> None:
         self.c = Config()
@@ -23,6 +49,46 @@ class TestMyopic2D(TestCase):
         self.field = Field()
         self.polygon_border = self.c.get_polygon_border()
 
+    def get_candidates_around(self, loc: np.ndarray) -> np.ndarray:
+        wp_candidates = self.myopic.get_waypoints_around(loc, np.linspace(0, 2 * np.pi, 7)[:-1])
+        legal = self.myopic.is_location_legal_many(wp_candidates) & self.myopic.is_path_legal_many(loc, wp_candidates)
+        return wp_candidates[legal]
+
+    def test_lookahead_costs(self) -> None:
+        graph = Field(neighbour_distance=self.c.get_waypoint_distance())
+        for loc in [self.c.get_loc_start(), np.array([2000., -1000.]), np.array([3500., 500.])]:
+            wp_candidates = self.get_candidates_around(loc)
+
+            # c1: the costs match the enumeration of all the paths, which never revisit a node.
+            for depth in [3, 2, 1]:
+                self.myopic.set_lookahead(depth)
+                expected = get_lookahead_costs_brute_force(graph, self.cv, wp_candidates, depth)
+                testing.assert_allclose(self.myopic.get_lookahead_costs(wp_candidates), expected)
+            testing.assert_allclose(expected, self.cv.get_cost_at_locations(wp_candidates))
+
+            # c2: the beam keeps the beam_width cheapest paths at every level, a beam wider than all of them drops none.
+            expected = get_lookahead_costs_brute_force(graph, self.cv, wp_candidates, 3)
+            with_revisits = get_lookahead_costs_brute_force(graph, self.cv, wp_candidates, 3, revisit=True)
+            self.assertTrue(np.any(with_revisits < expected))  # so c1 does check that revisits are excluded.
+            for beam_width in [1, 4]:
+                self.myopic.set_lookahead(3, beam_width=beam_width)
+                costs = self.myopic.get_lookahead_costs(wp_candidates)
+                self.assertLessEqual(np.sum(np.isfinite(costs)), beam_width)
+                self.assertGreater(np.sum(np.isfinite(costs)), 0)
+                self.assertTrue(np.all(costs[np.isfinite(costs)] >= expected[np.isfinite(costs)] - 1e-9))
+            self.myopic.set_lookahead(3, beam_width=10000)
+            testing.assert_allclose(self.myopic.get_lookahead_costs(wp_candidates), expected)
+
+    def test_lookahead_fallback(self) -> None:
+        # c1: if the lookahead cuts off all the paths, the candidates are scored by their own cost.
+        self.myopic.set_lookahead(3)
+        wp_curr = self.myopic.get_current_waypoint()
+        ctd = np.array([[1623450000, wp_curr[0], wp_curr[1], 25.]])
+        with patch.object(self.myopic, "get_lookahead_costs", side_effect=lambda wp: np.full(len(wp), np.inf)):
+            wp_next = self.myopic.update_next_waypoint(ctd)
+        wp_candidates = np.array(self.myopic.get_loc_cand())
+        testing.assert_array_equal(wp_next, wp_candidates[np.argmin(self.cv.get_cost_at_locations(wp_candidates))])
+
     def test_get_next_waypoint(self) -> None:
         figpath = "/Users/yaolin/Downloads/fig/"
 
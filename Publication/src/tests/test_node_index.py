@@ -0,0 +1,34 @@
+"""
+Unittest for the spatial index over the RRT* tree nodes.
+"""
+from unittest import TestCase
+from Planner.RRTSCV.NodeIndex import NodeIndex
+import numpy as np
+from numpy import testing
+
+
+class TestNodeIndex(TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        self.locations = np.random.uniform(0, 5000, (3000, 2))
+        self.index = NodeIndex(capacity=16)
+        for loc in self.locations:
+            self.index.add(loc)
+        self.queries = np.random.uniform(-1000, 6000, (200, 2))
+
+    def test_nearest_matches_brute_force(self) -> None:
+        for loc in self.queries:
+            dist = np.linalg.norm(self.locations - loc, axis=1)
+            self.assertEqual(self.index.get_nearest(loc), np.argmin(dist))
+
+    def test_within_matches_brute_force(self) -> None:
+        for loc in self.queries:
+            dist = np.linalg.norm(self.locations - loc, axis=1)
+            testing.assert_array_equal(self.index.get_within(loc, 270.), np.where(dist <= 270.)[0])
+
+    def test_clear(self) -> None:
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.add(np.array([1., 2.])), 0)
+        self.assertEqual(self.index.get_nearest(np.array([1000., 1000.])), 0)
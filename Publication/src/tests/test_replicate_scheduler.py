@@ -0,0 +1,58 @@
+"""
+Unittest for the resumable replicate scheduler.
+"""
+from unittest import TestCase
+from Simulators.ReplicateScheduler import ReplicateScheduler
+from functools import partial
+import numpy as np
+import json
+import os
+import shutil
+import tempfile
+
+
+def _write_result(datapath: str, task: dict) -> None:
+    np.save(datapath + "{:d}_{:s}.npy".format(task["seed"], task["agent"]), np.array([task["seed"]]))
+
+
+def _fail_myopic(task: dict) -> None:
+    if task["agent"] == "myopic":
+        raise ValueError("myopic is broken")
+
+
+class TestReplicateScheduler(TestCase):
+
+    def setUp(self) -> None:
+        self.datapath = tempfile.mkdtemp() + "/"
+        self.seeds = np.array([11, 22])
+        self.weight_set = np.array([[2., 0.], [1., 1.]])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.datapath, ignore_errors=True)
+
+    def test_run_and_resume(self) -> None:
+        scheduler = ReplicateScheduler(self.datapath, num_workers=2)
+        scheduler.add_replicates(self.seeds, self.weight_set)
+        self.assertEqual(len(scheduler.get_tasks()), 8)
+        # the longest tasks come first.
+        self.assertEqual([task["agent"] for task in scheduler.get_pending_tasks()], 4 * ["rrtstar"] + 4 * ["myopic"])
+
+        # c1: failed tasks are recorded in the manifest and stay pending.
+        self.assertEqual(scheduler.run(_fail_myopic), 4)
+        with open(scheduler.get_filepath_manifest(), "r") as f:
+            tasks = json.load(f)["tasks"]
+        self.assertEqual(sorted(task["status"] for task in tasks.values()), 4 * ["done"] + 4 * ["failed"])
+
+        # c2: a new scheduler resumes from the manifest with the same seeds and only runs the pending tasks.
+        scheduler = ReplicateScheduler(self.datapath, num_workers=2)
+        scheduler.add_replicates(np.array([33, 44]), self.weight_set)
+        self.assertEqual(len(scheduler.get_pending_tasks()), 4)
+        worker = partial(_write_result, self.datapath)
+        self.assertEqual(scheduler.run(worker), 4)
+        self.assertEqual(scheduler.run(worker), 0)
+        self.assertEqual(sorted(f for f in os.listdir(self.datapath) if f.endswith(".npy")),
+                         ["11_myopic.npy", "22_myopic.npy"])
+
+        # c3: reset starts from scratch.
+        scheduler.reset()
+        self.assertEqual(len(scheduler.get_tasks()), 0)
@@ -0,0 +1,96 @@
+"""
+Unittest for the chunked columnar result store.
+"""
+from unittest import TestCase
+from Simulators.ResultStore import ResultStore, make_schema, make_study_schema, rotate_store
+from Config import Config
+from functools import partial
+import numpy as np
+from numpy import testing
+import os
+import shutil
+import tempfile
+
+
+class TestResultStore(TestCase):
+
+    def setUp(self) -> None:
+        self.folderpath = tempfile.mkdtemp() + "/store/"
+        self.schema = make_schema(num_grid=4, num_steps=45, num_replicates=3, float32=True)
+        self.store = ResultStore(self.folderpath, self.schema)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(os.path.dirname(self.folderpath[:-1]), ignore_errors=True)
+
+    def test_append_and_slice(self) -> None:
+        for replicate in [0, 2]:
+            for step in range(45):
+                self.store.append("rrtstar", "EIBV", replicate, step, rmse=replicate + step,
+                                  mu=np.full(4, step), cov=np.eye(4) * step, traj=np.array([step, -step]))
+        self.store.flush()
+
+        # c1: one metric across all replicates, the missing replicate reads as nan.
+        rmse = self.store.get_metric("rmse", "rrtstar", "EIBV")
+        self.assertEqual(rmse.shape, (3, 45))
+        testing.assert_array_equal(rmse[0], np.arange(45))
+        testing.assert_array_equal(rmse[2], 2 + np.arange(45))
+        self.assertTrue(np.all(np.isnan(rmse[1])))
+        testing.assert_array_equal(self.store.get_completed_replicates("rrtstar", "EIBV"), [0, 2])
+
+        # c2: slice of entries, fields are stored in single precision.
+        mu = self.store.get_metric("mu", "rrtstar", "EIBV", replicates=[2], entries=slice(28, 33))
+        self.assertEqual(mu.dtype, np.float32)
+        testing.assert_array_equal(mu[0, :, 0], np.arange(28, 33))
+        traj = self.store.get_metric("traj", "rrtstar", "EIBV", replicates=[0])
+        testing.assert_array_equal(traj[0, 3], [3, -3])
+
+        # c3: the covariance is only kept every 15 steps, entry k is step 15 k.
+        cov = self.store.get_metric("cov", "rrtstar", "EIBV", replicates=[0])
+        self.assertEqual(cov.shape, (1, 3, 4, 4))
+        testing.assert_array_equal(cov[0, :, 1, 1], [0, 15, 30])
+
+        # c4: every metric is a column of its own.
+        self.assertEqual(sorted(os.listdir(self.folderpath + "rmse/rrtstar/EIBV/")),
+                         ["000.000.npz", "000.001.npz", "002.000.npz", "002.001.npz"])
+
+    def test_schema(self) -> None:
+        self.assertEqual(ResultStore(self.folderpath).get_schema()["num_steps"], 45)
+        with self.assertRaises(ValueError):
+            ResultStore(self.folderpath, make_schema(num_grid=5, num_steps=45, num_replicates=3))
+        with self.assertRaises(ValueError):
+            self.store.append("rrtstar", "EIBV", 0, 0, speed=1.)
+
+    def test_study_schema(self) -> None:
+        # c1: the simulators and the study script open the same store with the one study schema.
+        config = Config()
+        schema = make_study_schema(4)
+        self.assertEqual(schema, make_schema(4, config.get_num_steps(), config.get_num_replicates(), float32=True))
+        folderpath = os.path.dirname(self.folderpath[:-1]) + "/study/"
+        ResultStore(folderpath, make_study_schema(4))
+        store = ResultStore(folderpath, make_study_schema(4))
+
+        # c2: an agent records every step as it goes, the covariance only every 15 steps.
+        record = partial(store.append, "myopic", "IVR", 1)
+        for step in range(config.get_num_steps()):
+            record(step, traj=np.array([step, 0.]), ibv=1., rmse=step, vr=1., mu=np.zeros(4), sigma=np.ones(4),
+                   truth=np.zeros(4), cov=np.eye(4) * step)
+        store.flush()
+        testing.assert_array_equal(store.get_completed_replicates("myopic", "IVR"), [1])
+        testing.assert_array_equal(store.get_metric("rmse", "myopic", "IVR", [1])[0], np.arange(config.get_num_steps()))
+        cov = store.get_metric("cov", "myopic", "IVR", [1])
+        testing.assert_array_equal(cov[0, :, 0, 0], np.arange(0, config.get_num_steps(), 15))
+
+    def test_rotate(self) -> None:
+        self.store.append("rrtstar", "EIBV", 0, 0, rmse=1.)
+        self.store.flush()
+
+        # c1: the previous store is moved aside with its results, a new store with another schema starts empty.
+        folderpath_old = rotate_store(self.folderpath)
+        self.assertFalse(os.path.exists(self.folderpath))
+        self.assertEqual(ResultStore(folderpath_old).get_metric("rmse", "rrtstar", "EIBV", [0], slice(0, 1))[0, 0], 1.)
+        store = ResultStore(self.folderpath, make_schema(num_grid=5, num_steps=45, num_replicates=3))
+        self.assertTrue(np.all(np.isnan(store.get_metric("rmse", "rrtstar", "EIBV"))))
+
+        # c2: rotating twice in the same second keeps both, and there is nothing to rotate without a store.
+        self.assertNotEqual(rotate_store(self.folderpath), folderpath_old)
+        self.assertIsNone(rotate_store(self.folderpath))
@@ -10,12 +10,14 @@ from Planner.RRTSCV.RRTStarCV import RRTStarCV
 from Config import Config
 import matplotlib.pyplot as plt
 import numpy as np
+from numpy import testing
 from Visualiser.TreePlotter import TreePlotter
 from Visualiser.Visualiser import plotf_vector
 # from matplotlib.cm import get_cmap
 from matplotlib.pyplot import get_cmap
 from matplotlib.patches import Ellipse
 import math
+import time
 
 
 class TestRRTStar(TestCase):
@@ -157,3 +159,70 @@ class TestRRTStar(TestCase):
         # plt.savefig(os.getcwd() + "/../../fig/trees/rrtcv.png")
         plt.show()
 
+
+class TestRRTStarAnytime(TestCase):
+    """ Anytime mode with background improvement, on the planner's own seeded generators. """
+
+    def setUp(self) -> None:
+        self.loc_start = np.array([2000., -1000.])
+        self.loc_target = np.array([4000., 1000.])
+        self.rrtstar = RRTStarCV(random_seed=3)
+        self.rrtstar.set_max_expansion_iteraions(600)
+        self.published = []
+        self.rrtstar.set_waypoint_callback(lambda wp, cost: self.published.append((wp, cost)))
+
+    def tearDown(self) -> None:
+        self.rrtstar.stop_improvement()
+
+    def wait_for_background(self, record: dict, timeout: float = 60.) -> None:
+        t0 = time.time()
+        while "cost_background" not in record and time.time() - t0 < timeout:
+            time.sleep(.05)
+
+    def test_deadline_and_background(self) -> None:
+        self.rrtstar.set_time_budget(.01)
+        wp = self.rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+        record = self.rrtstar.get_planning_log()[-1]
+
+        # c1: the waypoint is one step away from the start, the deadline stopped the expansion early.
+        self.assertAlmostEqual(np.linalg.norm(wp - self.loc_start), self.rrtstar.get_stepsize())
+        self.assertTrue(self.rrtstar.is_location_legal(wp))
+        self.assertLess(record["iterations"], 600)
+
+        # c2: the background runs the iterations left, every improvement is published at a lower cost.
+        self.wait_for_background(record)
+        self.assertEqual(record["iterations"] + record["iterations_background"], 600)
+        self.assertGreater(len(self.published), 0)
+        costs = [cost for wp, cost in self.published]
+        self.assertTrue(np.all(np.diff(costs) < 0))
+        self.assertEqual(costs[-1], record["cost_background"])
+        for wp, cost in self.published:
+            self.assertAlmostEqual(np.linalg.norm(wp - self.loc_start), self.rrtstar.get_stepsize())
+
+        # c3: stop_improvement stops the background before its iterations run out.
+        self.rrtstar.set_max_expansion_iteraions(100000)
+        self.rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+        self.rrtstar.stop_improvement()
+        record = self.rrtstar.get_planning_log()[-1]
+        self.assertIn("cost_background", record)
+        self.assertLess(record["iterations"] + record["iterations_background"], 100000)
+
+    def test_reproducible(self) -> None:
+        # c1: the background draws do not shift the draws of the next call.
+        self.rrtstar.set_time_budget(.01)
+        self.rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+        self.wait_for_background(self.rrtstar.get_planning_log()[-1])
+        self.rrtstar.set_time_budget(None)
+        wp = self.rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+
+        rrtstar = RRTStarCV(random_seed=3)
+        rrtstar.set_max_expansion_iteraions(600)
+        rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+        testing.assert_array_equal(rrtstar.get_next_waypoint(self.loc_start, self.loc_target), wp)
+        testing.assert_array_equal(rrtstar.get_trajectory(), self.rrtstar.get_trajectory())
+
+        # c2: reseeding repeats the call.
+        rrtstar.set_random_seed(3)
+        wp = rrtstar.get_next_waypoint(self.loc_start, self.loc_target)
+        rrtstar.set_random_seed(3)
+        testing.assert_array_equal(rrtstar.get_next_waypoint(self.loc_start, self.loc_target), wp)
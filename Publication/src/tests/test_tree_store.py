@@ -0,0 +1,50 @@
+"""
+Unittest for the array based RRT* tree store.
+"""
+from unittest import TestCase
+from Planner.RRTSCV.TreeStore import TreeStore, TreeNodeView
+import numpy as np
+from numpy import testing
+
+
+class TestTreeStore(TestCase):
+
+    def setUp(self) -> None:
+        self.tree = TreeStore(capacity=2)
+
+    def test_add_and_grow(self) -> None:
+        for i in range(10):
+            ind = self.tree.add(np.array([i, 2 * i]), cost=.5 * i, parent=i - 1)
+            self.assertEqual(ind, i)
+        self.assertEqual(len(self.tree), 10)
+        testing.assert_array_equal(self.tree.get_x(), np.arange(10))
+        testing.assert_array_equal(self.tree.get_y(), 2 * np.arange(10))
+        testing.assert_array_equal(self.tree.get_cost(), .5 * np.arange(10))
+        testing.assert_array_equal(self.tree.get_parent(), np.arange(-1, 9))
+        self.tree.pop()
+        self.assertEqual(len(self.tree), 9)
+
+    def test_add_many(self) -> None:
+        self.tree.add(np.array([0., 0.]))
+        ind = self.tree.add_many(np.arange(10).reshape(5, 2), np.arange(5.), np.array([0, 1, 1, 2, 4]))
+        testing.assert_array_equal(ind, np.arange(1, 6))
+        testing.assert_array_equal(self.tree.get_x(), [0, 0, 2, 4, 6, 8])
+        testing.assert_array_equal(self.tree.get_cost(), [0, 0, 1, 2, 3, 4])
+        testing.assert_array_equal(self.tree.get_parent(), [-1, 0, 1, 1, 2, 4])
+
+    def test_batch_update(self) -> None:
+        for i in range(5):
+            self.tree.add(np.array([i, i]))
+        self.tree.set_parent(np.array([2, 3, 4]), 1)
+        self.tree.set_cost(np.array([2, 3, 4]), np.array([1., 2., 3.]))
+        testing.assert_array_equal(self.tree.get_parent(), [-1, -1, 1, 1, 1])
+        testing.assert_array_equal(self.tree.get_cost(), [0, 0, 1, 2, 3])
+
+    def test_node_view(self) -> None:
+        self.tree.add(np.array([0., 0.]))
+        self.tree.add(np.array([1., 2.]), cost=3., parent=0)
+        node = TreeNodeView(self.tree, 1)
+        testing.assert_array_equal(node.get_location(), [1., 2.])
+        self.assertEqual(node.get_cost(), 3.)
+        testing.assert_array_equal(node.get_parent().get_location(), [0., 0.])
+        self.assertIsNone(node.get_parent().get_parent())